@@ -1,8 +1,8 @@
-from flask import Flask
+from flask import Flask, has_app_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from flask_migrate import Migrate
-from celery import Celery
+from celery import Celery, Task
 import logging
 
 # Configure logging
@@ -12,16 +12,48 @@ logging.basicConfig(
 )
 
 # Initialize extensions
-db = SQLAlchemy()
+from .db_routing import RoutingSession, replica_binds
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 login_manager = LoginManager()
 migrate = Migrate()
-celery = Celery(__name__, broker='redis://redis:6379/0')
 
-def create_app():
+# Flask app of worker processes, built on their first task
+_flask_app = None
+
+def get_flask_app() -> Flask:
+    """Get the Flask app that Celery tasks run in, creating it on first use."""
+    global _flask_app
+    if _flask_app is None:
+        _flask_app = create_app()
+    return _flask_app
+
+class ContextTask(Task):
+    """Celery task that runs inside a Flask application context."""
+    
+    def __call__(self, *args, **kwargs):
+        # Calls run directly like Flask's Celery pattern; super().__call__
+        # would replace the request of eagerly applied tasks
+        if has_app_context():
+            # Tasks called from a request or a test already have one
+            return self.run(*args, **kwargs)
+        with get_flask_app().app_context():
+            return self.run(*args, **kwargs)
+
+celery = Celery(__name__, broker='redis://redis:6379/0', task_cls=ContextTask)
+# Workers and beat import this module without calling create_app; tasks
+# build the app on first use
+celery.config_from_object('config.Config')
+
+def create_app(config_object='config.DevelopmentConfig'):
     app = Flask(__name__, 
                 template_folder='templates',  # Explicitly set template folder
                 static_folder='static')       # Explicitly set static folder
-    app.config.from_object('config.DevelopmentConfig')
+    app.config.from_object(config_object)
+    # Read replicas are extra binds that RoutingSession picks for reads
+    app.config['SQLALCHEMY_BINDS'] = {
+        **app.config.get('SQLALCHEMY_BINDS', {}),
+        **replica_binds(app.config.get('SQLALCHEMY_REPLICA_URLS', []))
+    }
     app.logger.setLevel('INFO')  # Set logging level to INFO for debugging
     
     # Initialize extensions
@@ -37,11 +69,17 @@ def create_app():
     app.register_blueprint(bots_bp)
     app.register_blueprint(setup_bp)
     
+    from .cli import register_commands
+    register_commands(app)
+    
     # Initialize database and admin interface
     with app.app_context():
         from .models import User, TelegramBot
         db.create_all()
         
+        from .setup_state import register_listeners
+        register_listeners(User)
+        
         from .admin import init_admin
         init_admin(app)
     
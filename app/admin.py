@@ -3,6 +3,7 @@ from flask_admin.contrib.sqla import ModelView
 from flask_login import current_user
 from flask import redirect, url_for
 from app.models import User, TelegramBot
+from app.user_cache import invalidate_user
 from app import db
 
 class SecureModelView(ModelView):
@@ -14,6 +15,8 @@ class SecureModelView(ModelView):
 
 class UserModelView(SecureModelView):
     column_exclude_list = ['password_hash']
+    column_default_sort = ('id', True)
+    simple_list_pager = True
     column_searchable_list = ['username']
     column_filters = ['is_admin']
     form_excluded_columns = ['password_hash', 'bots']
@@ -21,11 +24,25 @@ class UserModelView(SecureModelView):
     def on_model_change(self, form, model, is_created):
         if form.password.data:
             model.set_password(form.password.data)
+    
+    # Invalidate after commit so other workers cannot re-cache the old record
+    def after_model_change(self, form, model, is_created):
+        invalidate_user(model.id)
+    
+    def after_model_delete(self, model):
+        invalidate_user(model.id)
 
 class BotModelView(SecureModelView):
     column_list = ['bot_username', 'owner', 'status', 'bot_type', 'last_activity']
     column_searchable_list = ['bot_username', 'bot_type']
     column_filters = ['status', 'bot_type']
+    # The owner column is joined into the list query instead of loaded per row
+    column_select_related_list = [TelegramBot.owner]
+    # Newest first along the primary key, without a COUNT(*) per page view
+    column_default_sort = ('id', True)
+    simple_list_pager = True
+    page_size = 50
+    can_set_page_size = True
     form_excluded_columns = ['last_activity', 'created_at', 'updated_at', 'webhook_url', 'error_message']
     
     def on_model_change(self, form, model, is_created):
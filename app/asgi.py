@@ -0,0 +1,238 @@
+"""
+ASGI application serving the bot JSON API asynchronously.
+
+Status and stats polls are answered from Redis through redis.asyncio, so a
+single worker process keeps thousands of pollers in flight instead of one
+per gunicorn worker. Requests are authenticated with the Flask session
+cookie, and bot ownership lookups are cached in memory. Everything outside
+API_PREFIX, including the Flask UI, is passed to the Flask app through a
+WSGI adapter, so the application can run on its own or behind a reverse
+proxy that only routes API_PREFIX to it.
+
+Endpoints:
+    GET  /api/bots/<id>/status
+    GET  /api/bots/<id>/stats
+    POST /api/bots/<id>/control/<action>   (JSON request, see _control)
+
+Run with:
+    uvicorn app.asgi:application --host 0.0.0.0 --port 8000
+"""
+
+import os
+import re
+import json
+import asyncio
+import logging
+from http.cookies import SimpleCookie
+from typing import Dict, Optional, Tuple
+from a2wsgi import WSGIMiddleware
+from werkzeug.http import parse_etags, quote_etag
+from app import create_app, db
+from app.models import TelegramBot
+from app.lifecycle import ACTIONS
+from app.routes.bots import (
+    STATS_CACHE_MAX_AGE, STATUS_CACHE_MAX_AGE, cache_control, control,
+    status_etag, status_payload
+)
+from app.bot_framework.bot_monitor import BotMonitor
+from app.bot_framework.cache import TTLCache
+from app.bot_framework.keys import alive_key, status_key
+from app.bot_framework.redis_client import get_async_redis
+
+logger = logging.getLogger(__name__)
+
+API_PREFIX = '/api/bots/'
+
+_ROUTE = re.compile(r'^/api/bots/(\d+)/(status|stats|control/(\w+))$')
+
+# Bot id -> (owner id, token fingerprint) lookups; also caches unknown ids
+_NOT_FOUND = (None, None)
+
+class BotAPI:
+    """
+    ASGI application for bot status, stats and control.
+
+    Attributes:
+        flask_app: Flask application providing configuration and the UI
+        owners (TTLCache): Cached bot ownership lookups
+    """
+
+    def __init__(self, flask_app, redis_client=None):
+        """
+        Initialize the application.
+
+        Args:
+            flask_app: Flask application whose session cookies are accepted
+            redis_client: Async Redis client, defaults to the shared client
+        """
+        self.flask_app = flask_app
+        self._redis = redis_client
+        self.owners = TTLCache(
+            maxsize=int(os.getenv('API_OWNER_CACHE_SIZE', '10000')),
+            ttl=float(os.getenv('API_OWNER_CACHE_TTL', '60'))
+        )
+        self.session_cookie = flask_app.config['SESSION_COOKIE_NAME']
+        self.session_max_age = int(flask_app.permanent_session_lifetime.total_seconds())
+        self.serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+        self.wsgi = WSGIMiddleware(flask_app, workers=int(os.getenv('API_WSGI_THREADS', '10')))
+
+    @property
+    def redis(self):
+        """Async Redis client, created on first use inside the event loop."""
+        if self._redis is None:
+            self._redis = get_async_redis()
+        return self._redis
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http' and scope['path'].startswith(API_PREFIX):
+            await self._handle(scope, send)
+        else:
+            await self.wsgi(scope, receive, send)
+
+    async def _lifespan(self, receive, send) -> None:
+        """Handle server startup and shutdown."""
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self._redis is not None:
+                    await self._redis.aclose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _handle(self, scope, send) -> None:
+        """Route an API request."""
+        headers = {key.decode('latin-1').lower(): value.decode('latin-1') for key, value in scope['headers']}
+        try:
+            match = _ROUTE.match(scope['path'])
+            if not match:
+                return await self._json(send, 404, {'error': 'Not found'})
+
+            user_id = self._session_user(headers.get('cookie'))
+            if user_id is None:
+                return await self._json(send, 401, {'error': 'Authentication required'})
+
+            bot_id = int(match.group(1))
+            owner_id, fingerprint = await self._lookup_bot(bot_id)
+            if owner_id != user_id:
+                return await self._json(send, 404, {'error': 'Bot not found'})
+
+            if match.group(3) is not None:
+                if scope['method'] != 'POST':
+                    return await self._json(send, 405, {'error': 'Method not allowed'})
+                return await self._control(send, headers, bot_id, match.group(3))
+            if scope['method'] != 'GET':
+                return await self._json(send, 405, {'error': 'Method not allowed'})
+            if match.group(2) == 'status':
+                return await self._status(send, headers, bot_id, fingerprint)
+            return await self._stats(send, headers, bot_id, fingerprint)
+        except Exception as e:
+            logger.error(f"Error handling {scope['method']} {scope['path']}: {str(e)}")
+            return await self._json(send, 500, {'error': 'Internal error'})
+
+    def _session_user(self, cookie_header: Optional[str]) -> Optional[int]:
+        """Get the logged in user id from the Flask session cookie."""
+        if not cookie_header:
+            return None
+        cookie = SimpleCookie()
+        cookie.load(cookie_header)
+        morsel = cookie.get(self.session_cookie)
+        if morsel is None:
+            return None
+        try:
+            session = self.serializer.loads(morsel.value, max_age=self.session_max_age)
+            return int(session['_user_id'])
+        except Exception:
+            return None
+
+    async def _lookup_bot(self, bot_id: int) -> Tuple[Optional[int], Optional[str]]:
+        """Get the owner id and token fingerprint of a bot, cached."""
+        owner = self.owners.get(bot_id)
+        if owner is None:
+            owner = await asyncio.to_thread(self._load_bot, bot_id)
+            self.owners.set(bot_id, owner)
+        return owner
+
+    def _load_bot(self, bot_id: int) -> Tuple[Optional[int], Optional[str]]:
+        """Load bot ownership from the database (runs in a thread)."""
+        with self.flask_app.app_context():
+            bot = db.session.get(TelegramBot, bot_id)
+            return (bot.user_id, bot.token_fingerprint) if bot else _NOT_FOUND
+
+    async def _status(self, send, headers: Dict[str, str], bot_id: int, fingerprint: str) -> None:
+        """Answer a status poll."""
+        status = BotMonitor.parse_status(await self.redis.hgetall(status_key(fingerprint)))
+        await self._conditional_json(
+            send, headers, status_etag(bot_id, status),
+            lambda: status_payload(status), STATUS_CACHE_MAX_AGE
+        )
+
+    async def _stats(self, send, headers: Dict[str, str], bot_id: int, fingerprint: str) -> None:
+        """Answer a runtime stats poll."""
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.hmget(status_key(fingerprint), 'version', 'last_heartbeat', 'loop_lag_ms', 'queue_depth')
+            pipe.exists(alive_key(fingerprint))
+            (version, last_heartbeat, loop_lag_ms, queue_depth), alive = await pipe.execute()
+
+        def decode(value):
+            return value.decode() if value else None
+
+        await self._conditional_json(
+            send, headers, f"stats-{bot_id}-{decode(version) or 0}-{bool(alive)}",
+            lambda: {
+                'alive': bool(alive),
+                'last_heartbeat': decode(last_heartbeat),
+                'loop_lag_ms': decode(loop_lag_ms),
+                'queue_depth': decode(queue_depth)
+            },
+            STATS_CACHE_MAX_AGE
+        )
+
+    async def _control(self, send, headers: Dict[str, str], bot_id: int, action: str) -> None:
+        """
+        Submit a lifecycle command.
+
+        Only JSON requests are accepted: browsers do not send them across
+        origins without a CORS preflight, which protects the
+        cookie-authenticated endpoint against cross-site requests.
+        """
+        if not headers.get('content-type', '').startswith('application/json'):
+            return await self._json(send, 415, {'error': 'Content-Type must be application/json'})
+        if action not in ACTIONS:
+            return await self._json(send, 400, {'error': f'Invalid action: {action}'})
+        message = await asyncio.to_thread(self._run_control, bot_id, action)
+        await self._json(send, 202, {'bot_id': bot_id, 'action': action, 'message': message})
+
+    def _run_control(self, bot_id: int, action: str) -> Optional[str]:
+        """Apply a control action in the database (runs in a thread)."""
+        with self.flask_app.app_context():
+            return control(db.session.get(TelegramBot, bot_id), action)
+
+    async def _conditional_json(self, send, headers: Dict[str, str], etag: str, build, max_age: int) -> None:
+        """Send 304 if the client's ETag is current, else the JSON payload."""
+        extra = [
+            (b'etag', quote_etag(etag).encode()),
+            (b'cache-control', cache_control(max_age).encode()),
+            (b'vary', b'Cookie')
+        ]
+        if parse_etags(headers.get('if-none-match')).contains(etag):
+            await send({'type': 'http.response.start', 'status': 304, 'headers': extra})
+            await send({'type': 'http.response.body', 'body': b''})
+            return
+        await self._json(send, 200, build(), extra)
+
+    @staticmethod
+    async def _json(send, status: int, payload: Dict, extra_headers=None) -> None:
+        """Send a JSON response."""
+        body = json.dumps(payload).encode()
+        headers = [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode())
+        ] + (extra_headers or [])
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': body})
+
+application = BotAPI(create_app())
@@ -3,8 +3,11 @@ Base class for all Telegram bots in the system.
 Provides common functionality and structure for bot implementation.
 """
 
+import time
+import asyncio
 import logging
 import inspect
+import functools
 from typing import Dict, List, Optional, Any, Callable
 from telegram import Update
 from telegram.ext import (
@@ -13,12 +16,23 @@ from telegram.ext import (
     MessageHandler,
     CallbackQueryHandler,
     ContextTypes,
+    TypeHandler,
     filters
 )
 from .exceptions import BotInitializationError, BotConfigError
+from .metrics import BotMetrics
+from .scheduler import SendScheduler
+from .state import StateStore, create_state_store
 
 logger = logging.getLogger(__name__)
 
+# Update kinds counted by the metrics, in order of precedence
+UPDATE_TYPES = (
+    'message', 'edited_message', 'callback_query', 'inline_query',
+    'chosen_inline_result', 'channel_post', 'edited_channel_post',
+    'my_chat_member', 'chat_member', 'chat_join_request'
+)
+
 class BaseTelegramBot:
     """
     Base class for all Telegram bots in the system.
@@ -31,9 +45,13 @@ class BaseTelegramBot:
         config (dict): Bot configuration
         commands (dict): Registered bot commands
         handlers (dict): Registered event handlers
+        metrics (BotMetrics): Update, command, error and latency counters
+        state (StateStore): Persistent state namespaces
+        scheduler (SendScheduler): Delayed sends, persisted in the state
     """
     
-    def __init__(self, token: str, name: str, description: str = "", config: Optional[Dict] = None):
+    def __init__(self, token: str, name: str, description: str = "", config: Optional[Dict] = None,
+                 state: Optional[StateStore] = None):
         """
         Initialize the bot.
         
@@ -42,6 +60,7 @@ class BaseTelegramBot:
             name (str): Bot name
             description (str): Bot description
             config (dict, optional): Additional bot configuration
+            state (StateStore, optional): State store, built from the config if None
         """
         self.token = token
         self.name = name
@@ -50,6 +69,9 @@ class BaseTelegramBot:
         self.commands = {}
         self.handlers = {}
         self.application = None
+        self.metrics = BotMetrics()
+        self.state = state or create_state_store(token, self.config)
+        self.scheduler = SendScheduler(self.state.namespace('scheduled_sends'), self._send_scheduled)
         self._initialize()
     
     def _initialize(self) -> None:
@@ -63,6 +85,9 @@ class BaseTelegramBot:
     
     def _register_methods(self) -> None:
         """Register all decorated methods as commands or handlers."""
+        # Runs before every other handler group without consuming the update
+        self.application.add_handler(TypeHandler(Update, self._count_update), group=-1)
+        self.application.add_error_handler(self._on_error)
         for name, method in inspect.getmembers(self, inspect.ismethod):
             if hasattr(method, '_bot_command'):
                 self._register_command(method)
@@ -78,7 +103,7 @@ class BaseTelegramBot:
             'admin_only': method._admin_only
         }
         self.application.add_handler(
-            CommandHandler(command, method)
+            CommandHandler(command, self._instrumented(method, f"commands.{command}"))
         )
         logger.debug(f"Registered command /{command} for bot {self.name}")
     
@@ -88,14 +113,15 @@ class BaseTelegramBot:
         pattern = method._pattern
         priority = method._priority
         
+        callback = self._instrumented(method)
         if event_type == "message":
             handler = MessageHandler(
                 filters.TEXT & (filters.Regex(pattern) if pattern else filters.ALL),
-                method
+                callback
             )
         elif event_type == "callback_query":
             handler = CallbackQueryHandler(
-                method,
+                callback,
                 pattern=pattern
             )
         else:
@@ -104,6 +130,63 @@ class BaseTelegramBot:
         self.application.add_handler(handler, group=priority)
         logger.debug(f"Registered {event_type} handler for bot {self.name}")
     
+    def _instrumented(self, method: Callable, metric: Optional[str] = None) -> Callable:
+        """Wrap a handler to record its latency and optionally count its calls."""
+        @functools.wraps(method)
+        async def wrapper(update, context):
+            started = time.perf_counter()
+            try:
+                return await method(update, context)
+            finally:
+                if metric:
+                    self.metrics.incr(metric)
+                self.metrics.observe_latency((time.perf_counter() - started) * 1000)
+        return wrapper
+    
+    async def _count_update(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Count incoming updates by kind."""
+        kind = next((name for name in UPDATE_TYPES if getattr(update, name, None)), 'other')
+        self.metrics.incr(f"updates.{kind}")
+    
+    async def _on_error(self, update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Count and log errors raised by handlers."""
+        self.metrics.incr('errors')
+        logger.error(f"Error handling update in bot {self.name}: {context.error}", exc_info=context.error)
+    
+    async def on_state_loaded(self) -> None:
+        """Hook run after persisted state is loaded, before updates are handled."""
+    
+    def schedule_send(self, delay: float, method: str = 'send_message', **kwargs) -> str:
+        """
+        Call a Bot API method after a delay without blocking the handler.
+        
+        Args:
+            delay (float): Seconds to wait
+            method (str): Bot method name, e.g. send_message or send_photo
+            **kwargs: JSON serializable method arguments, e.g. chat_id and text
+            
+        Returns:
+            str: Job id for cancel_scheduled()
+        """
+        return self.scheduler.schedule(delay, method, **kwargs)
+    
+    def cancel_scheduled(self, job_id: str) -> bool:
+        """
+        Cancel a scheduled send.
+        
+        Args:
+            job_id (str): Job id returned by schedule_send()
+            
+        Returns:
+            bool: True if the send was still pending
+        """
+        return self.scheduler.cancel(job_id)
+    
+    async def _send_scheduled(self, method: str, kwargs: Dict[str, Any]) -> None:
+        """Run a scheduled Bot API call."""
+        self.metrics.incr('scheduled_sends')
+        await getattr(self.application.bot, method)(**kwargs)
+    
     async def is_admin(self, user_id: int) -> bool:
         """
         Check if a user is an admin.
@@ -120,8 +203,14 @@ class BaseTelegramBot:
     async def start(self) -> None:
         """Start the bot."""
         try:
+            # Load persisted state before any update is handled
+            await asyncio.get_running_loop().run_in_executor(None, self.state.load)
+            await self.on_state_loaded()
+            self.state.start()
             await self.application.initialize()
             await self.application.start()
+            # Sends restored from the state need the started application
+            self.scheduler.start()
             await self.application.update_bot_commands([
                 (cmd, info['description'])
                 for cmd, info in self.commands.items()
@@ -134,10 +223,14 @@ class BaseTelegramBot:
     async def stop(self) -> None:
         """Stop the bot."""
         try:
+            await self.scheduler.stop()
             await self.application.stop()
             logger.info(f"Bot {self.name} stopped successfully")
         except Exception as e:
             logger.error(f"Error stopping bot {self.name}: {str(e)}")
+        finally:
+            # Write the remaining state changes even if stopping failed
+            await self.state.stop()
     
     def get_command_list(self) -> List[Dict[str, str]]:
         """
@@ -2,67 +2,330 @@
 Bot monitoring service.
 """
 
+import os
 import logging
-import redis
 import json
+import threading
+import time
 from datetime import datetime
-from typing import Dict, Optional
+from itertools import islice
+from typing import Dict, List, Optional, Set
+from .cache import TTLCache
+from .heartbeat import DEFAULT_HEARTBEAT_INTERVAL, HEARTBEAT_TTL_FACTOR
+from .keys import (
+    LAST_SEEN_INDEX, STATUS_EVENTS_CHANNEL, alive_key, state_key, state_namespaces_key, status_key
+)
+from .redis_client import get_redis
+from .status_index import StatusIndex
 
 logger = logging.getLogger(__name__)
 
+# Seconds to wait before resubscribing after the invalidation listener fails
+LISTENER_RETRY_DELAY = 30
+
+# Seconds close() waits for the invalidation listener thread to exit
+LISTENER_JOIN_TIMEOUT = 2
+
 class BotMonitor:
-    """Monitor external bot instances."""
+    """
+    Monitor external bot instances.
     
-    def __init__(self, redis_url: str = 'redis://redis:6379/0'):
-        """Initialize bot monitor."""
-        self.redis = redis.from_url(redis_url)
+    Status reads go through a local TTL cache. Entries are dropped as soon
+    as a transition is announced on the status events channel, so the TTL
+    only bounds staleness of heartbeat fields and of missed events.
+    """
     
-    def get_bot_status(self, bot_token: str) -> Dict:
+    def __init__(self, redis_url: Optional[str] = None, cache_ttl: Optional[float] = None,
+                 cache_size: Optional[int] = None, invalidate: bool = True):
+        """
+        Initialize bot monitor.
+        
+        Args:
+            redis_url: Redis URL, defaults to REDIS_URL
+            cache_ttl: Status cache TTL in seconds (BOT_STATUS_CACHE_TTL)
+            cache_size: Maximum cached statuses (BOT_STATUS_CACHE_SIZE)
+            invalidate: Subscribe to status events to invalidate the cache
+        """
+        self.redis = get_redis(redis_url)
+        self.index = StatusIndex(self.redis)
+        self.cache = TTLCache(
+            maxsize=cache_size or int(os.getenv('BOT_STATUS_CACHE_SIZE', '4096')),
+            ttl=cache_ttl if cache_ttl is not None else float(os.getenv('BOT_STATUS_CACHE_TTL', '5'))
+        )
+        self.invalidate = invalidate
+        self._listener = None
+        self._listener_retry_at = 0.0
+        self._listener_lock = threading.Lock()
+    
+    def get_bot_status(self, fingerprint: str) -> Dict:
         """
         Get bot status from Redis.
         
         Args:
-            bot_token: Bot API token
+            fingerprint: Bot token fingerprint
             
         Returns:
             Dict with bot status information
         """
+        self._ensure_listener()
+        cached = self.cache.get(fingerprint)
+        if cached is not None:
+            return dict(cached)
+        
         try:
-            status = self.redis.hgetall(f"bot:{bot_token}")
-            if status:
-                return {
-                    'status': status.get(b'status', b'unknown').decode(),
-                    'error': status.get(b'error', b'').decode(),
-                    'webhook_url': status.get(b'webhook_url', b'').decode(),
-                    'last_update': status.get(b'last_update', b'').decode(),
-                    'type': status.get(b'type', b'').decode()
-                }
+            result = self.parse_status(self.redis.hgetall(status_key(fingerprint)))
+            self.cache.set(fingerprint, result)
+            return dict(result)
         except Exception as e:
             logger.error(f"Error getting bot status: {e}")
         
+        return self._unknown_status()
+    
+    def get_bot_statuses(self, fingerprints: List[str]) -> Dict[str, Dict]:
+        """
+        Get fresh statuses of many bots in one pipelined round trip.
+        
+        The local cache is bypassed so reconciliation always sees the
+        latest reported state.
+        
+        Args:
+            fingerprints: Bot token fingerprints
+            
+        Returns:
+            Dict mapping bot fingerprints to status information
+        """
+        pipe = self.redis.pipeline(transaction=False)
+        for fingerprint in fingerprints:
+            pipe.hgetall(status_key(fingerprint))
+        return {
+            fingerprint: self.parse_status(raw)
+            for fingerprint, raw in zip(fingerprints, pipe.execute())
+        }
+    
+    @classmethod
+    def parse_status(cls, status: Dict) -> Dict:
+        """Convert a raw status hash into status information."""
+        if not status:
+            return cls._unknown_status()
+        return {
+            'status': status.get(b'status', b'unknown').decode(),
+            'error': status.get(b'error', b'').decode(),
+            'webhook_url': status.get(b'webhook_url', b'').decode(),
+            'last_update': status.get(b'last_update', b'').decode(),
+            'type': status.get(b'type', b'').decode(),
+            'loop_lag_ms': status.get(b'loop_lag_ms', b'').decode(),
+            'queue_depth': status.get(b'queue_depth', b'').decode(),
+            'version': int(status.get(b'version', 0))
+        }
+    
+    @staticmethod
+    def _unknown_status() -> Dict:
+        """Get the status reported for bots without a status hash."""
         return {
             'status': 'unknown',
             'error': '',
             'webhook_url': '',
             'last_update': '',
-            'type': ''
+            'type': '',
+            'loop_lag_ms': '',
+            'queue_depth': '',
+            'version': 0
         }
     
-    def get_bot_state(self, bot_token: str) -> Dict:
+    def get_bot_state(self, fingerprint: str, limit: int = 100) -> Dict:
         """
-        Get bot state from Redis.
+        Get persisted bot state from Redis.
         
         Args:
-            bot_token: Bot API token
+            fingerprint: Bot token fingerprint
+            limit: Maximum number of entries read per namespace
             
         Returns:
-            Dict with bot state
+            Dict mapping state namespaces to their size and first entries
         """
         try:
-            state = self.redis.get(f"bot_state:{bot_token}")
-            if state:
-                return json.loads(state)
+            state = {}
+            for namespace in sorted(n.decode() for n in self.redis.smembers(state_namespaces_key(fingerprint))):
+                key = state_key(fingerprint, namespace)
+                entries = islice(self.redis.hscan_iter(key, count=limit), limit)
+                state[namespace] = {
+                    'size': self.redis.hlen(key),
+                    'entries': {field.decode(): json.loads(value) for field, value in entries}
+                }
+            return state
         except Exception as e:
             logger.error(f"Error getting bot state: {e}")
         
-        return {}
\ No newline at end of file
+        return {}
+    
+    def cache_stats(self) -> Dict:
+        """
+        Get status cache statistics.
+        
+        Returns:
+            Dict with cache size, hits, misses, evictions and hit rate
+        """
+        stats = self.cache.stats()
+        stats['invalidation'] = self._listener is not None
+        return stats
+    
+    def _ensure_listener(self) -> None:
+        """Start the cache invalidation listener if it is not running."""
+        if not self.invalidate or self._listener is not None:
+            return
+        if time.time() < self._listener_retry_at:
+            return
+        with self._listener_lock:
+            if self._listener is not None:
+                return
+            try:
+                pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(**{STATUS_EVENTS_CHANNEL: self._on_status_event})
+                self._listener = pubsub.run_in_thread(
+                    sleep_time=1,
+                    daemon=True,
+                    exception_handler=self._on_listener_error
+                )
+            except Exception as e:
+                logger.warning(f"Status cache invalidation unavailable: {e}")
+                self._listener_retry_at = time.time() + LISTENER_RETRY_DELAY
+    
+    def close(self) -> None:
+        """Stop the invalidation listener and release its connection."""
+        with self._listener_lock:
+            # Closed monitors do not subscribe again
+            self.invalidate = False
+            listener, self._listener = self._listener, None
+        if listener is not None:
+            listener.stop()
+            listener.join(timeout=LISTENER_JOIN_TIMEOUT)
+            listener.pubsub.close()
+        self.cache.clear()
+    
+    def _on_status_event(self, message: Dict) -> None:
+        """Drop the cached status of a bot that changed."""
+        fingerprint = message['data']
+        self.cache.pop(fingerprint.decode() if isinstance(fingerprint, bytes) else fingerprint)
+    
+    def _on_listener_error(self, exc, pubsub, thread) -> None:
+        """Stop the failed listener; events may have been missed."""
+        logger.warning(f"Status cache invalidation listener failed: {exc}")
+        thread.stop()
+        pubsub.close()
+        self._listener = None
+        self._listener_retry_at = time.time() + LISTENER_RETRY_DELAY
+        self.cache.clear()
+    
+    def get_fleet_status(self) -> Dict[str, Dict[str, int]]:
+        """
+        Get fleet-wide bot counts from the Redis status indexes.
+        
+        Returns:
+            Dict with counts by status and by bot type
+        """
+        try:
+            return {
+                'status': self.index.status_counts(),
+                'type': self.index.type_counts()
+            }
+        except Exception as e:
+            logger.error(f"Error getting fleet status: {e}")
+            return {'status': {}, 'type': {}}
+    
+    def is_alive(self, fingerprint: str) -> bool:
+        """
+        Check whether a bot runner is sending heartbeats.
+        
+        Args:
+            fingerprint: Bot token fingerprint
+            
+        Returns:
+            True if the liveness key has not expired
+        """
+        try:
+            return bool(self.redis.exists(alive_key(fingerprint)))
+        except Exception as e:
+            logger.error(f"Error checking bot liveness: {e}")
+            return False
+    
+    def get_last_seen(self, fingerprint: str) -> Optional[float]:
+        """
+        Get the time of the last heartbeat of a bot.
+        
+        Args:
+            fingerprint: Bot token fingerprint
+            
+        Returns:
+            Unix timestamp of the last heartbeat or None if never seen
+        """
+        try:
+            return self.redis.zscore(LAST_SEEN_INDEX, fingerprint)
+        except Exception as e:
+            logger.error(f"Error getting bot last seen time: {e}")
+            return None
+    
+    def get_stale_bots(self, max_age: Optional[float] = None, limit: Optional[int] = None) -> List[str]:
+        """
+        Get bots whose last heartbeat is older than max_age.
+        
+        Args:
+            max_age: Age in seconds, defaults to the liveness TTL
+            limit: Maximum number of fingerprints to return
+            
+        Returns:
+            List of bot fingerprints, oldest first
+        """
+        if max_age is None:
+            max_age = DEFAULT_HEARTBEAT_INTERVAL * HEARTBEAT_TTL_FACTOR
+        return self._range_last_seen('-inf', time.time() - max_age, limit)
+    
+    def get_live_bots(self, max_age: Optional[float] = None, limit: Optional[int] = None) -> List[str]:
+        """
+        Get bots that sent a heartbeat within max_age.
+        
+        Args:
+            max_age: Age in seconds, defaults to the liveness TTL
+            limit: Maximum number of fingerprints to return
+            
+        Returns:
+            List of bot fingerprints, oldest first
+        """
+        if max_age is None:
+            max_age = DEFAULT_HEARTBEAT_INTERVAL * HEARTBEAT_TTL_FACTOR
+        return self._range_last_seen(f"({time.time() - max_age}", '+inf', limit)
+    
+    def get_live_among(self, fingerprints: List[str], max_age: Optional[float] = None) -> Set[str]:
+        """
+        Get which of the given bots sent a heartbeat within max_age.
+        
+        Args:
+            fingerprints: Bot token fingerprints to check
+            max_age: Age in seconds, defaults to the liveness TTL
+            
+        Returns:
+            Set of live fingerprints among the given ones
+        """
+        if max_age is None:
+            max_age = DEFAULT_HEARTBEAT_INTERVAL * HEARTBEAT_TTL_FACTOR
+        cutoff = time.time() - max_age
+        try:
+            scores = self.redis.zmscore(LAST_SEEN_INDEX, fingerprints)
+        except Exception as e:
+            logger.error(f"Error querying last seen index: {e}")
+            return set()
+        return {
+            fingerprint for fingerprint, score in zip(fingerprints, scores)
+            if score is not None and score > cutoff
+        }
+    
+    def _range_last_seen(self, min_score, max_score, limit: Optional[int]) -> List[str]:
+        """Query the last-seen index by score range."""
+        try:
+            if limit is not None:
+                members = self.redis.zrangebyscore(LAST_SEEN_INDEX, min_score, max_score, start=0, num=limit)
+            else:
+                members = self.redis.zrangebyscore(LAST_SEEN_INDEX, min_score, max_score)
+            return [m.decode() if isinstance(m, bytes) else m for m in members]
+        except Exception as e:
+            logger.error(f"Error querying last seen index: {e}")
+            return []
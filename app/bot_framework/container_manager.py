@@ -6,10 +6,13 @@ import os
 import json
 import logging
 import docker
-import redis
 from typing import Dict, Optional, List
 from docker.models.containers import Container
 from .exceptions import BotFrameworkError
+from .heartbeat import clear_heartbeat
+from .keys import status_key, token_fingerprint
+from .redis_client import get_redis, get_redis_url
+from .status_index import StatusIndex
 
 logger = logging.getLogger(__name__)
 
@@ -19,7 +22,8 @@ class ContainerManager:
     def __init__(self):
         """Initialize the container manager."""
         self.docker = docker.from_env()
-        self.redis = redis.from_url(os.getenv('REDIS_URL', 'redis://redis:6379/0'))
+        self.redis = get_redis()
+        self.status_index = StatusIndex(self.redis)
         self.base_port = int(os.getenv('BOT_BASE_PORT', '8443'))
         self.webhook_host = os.getenv('WEBHOOK_HOST', 'localhost')
     
@@ -39,11 +43,35 @@ class ContainerManager:
             port += 1
         return port
     
-    def _get_container_name(self, bot_token: str) -> str:
-        """Generate container name from bot token."""
-        # Use last 8 characters of token to avoid collisions
+    def get_container_name(self, fingerprint: str) -> str:
+        """Generate container name from the bot token fingerprint."""
+        return f"bot_{fingerprint}"
+    
+    @staticmethod
+    def get_legacy_container_name(bot_token: str) -> str:
+        """Container name used before fingerprints, from the token's last 8 characters."""
         return f"bot_{bot_token[-8:]}"
     
+    def remove_legacy_container(self, bot_token: str) -> bool:
+        """
+        Stop and remove a bot container named after the raw token.
+        
+        Args:
+            bot_token: Bot API token
+            
+        Returns:
+            True if a legacy container was removed
+        """
+        container_name = self.get_legacy_container_name(bot_token)
+        try:
+            container = self.docker.containers.get(container_name)
+        except docker.errors.NotFound:
+            return False
+        # The old runner uses raw token keys, so it cannot be renamed into place
+        container.remove(force=True)
+        logger.info(f"Removed legacy container {container_name}")
+        return True
+    
     def start_bot(self, bot_token: str, bot_type: str) -> Dict:
         """
         Start a bot in a new container.
@@ -57,12 +85,13 @@ class ContainerManager:
         """
         try:
             # Check if bot is already running
-            container_name = self._get_container_name(bot_token)
+            fingerprint = token_fingerprint(bot_token)
+            container_name = self.get_container_name(fingerprint)
             try:
                 existing = self.docker.containers.get(container_name)
                 if existing.status == 'running':
                     logger.info(f"Bot container {container_name} already running")
-                    return self.get_bot_status(bot_token)
+                    return self.get_bot_status(fingerprint)
                 else:
                     existing.remove(force=True)
             except docker.errors.NotFound:
@@ -78,7 +107,8 @@ class ContainerManager:
                 'WEBHOOK_HOST': self.webhook_host,
                 'WEBHOOK_PORT': str(port),
                 'CONTAINER_NAME': container_name,
-                'REDIS_URL': os.getenv('REDIS_URL', 'redis://redis:6379/0')
+                'REDIS_URL': get_redis_url(),
+                'STATE_BACKEND': os.getenv('BOT_STATE_BACKEND', 'redis')
             }
             
             # Start container
@@ -95,26 +125,25 @@ class ContainerManager:
             logger.info(f"Started bot container {container_name} on port {port}")
             
             # Wait for bot to start and return status
-            return self.get_bot_status(bot_token)
+            return self.get_bot_status(fingerprint)
             
         except Exception as e:
             error_msg = f"Failed to start bot container: {str(e)}"
             logger.error(error_msg)
-            self.redis.hset(
-                f"bot:{bot_token}",
-                mapping={'status': 'error', 'error': error_msg}
+            self.status_index.transition(
+                token_fingerprint(bot_token), 'error', bot_type=bot_type, fields={'error': error_msg}
             )
             raise BotFrameworkError(error_msg) from e
     
-    def stop_bot(self, bot_token: str) -> None:
+    def stop_bot(self, fingerprint: str) -> None:
         """
         Stop a bot container.
         
         Args:
-            bot_token: Bot API token
+            fingerprint: Bot token fingerprint
         """
         try:
-            container_name = self._get_container_name(bot_token)
+            container_name = self.get_container_name(fingerprint)
             try:
                 container = self.docker.containers.get(container_name)
                 container.stop()
@@ -124,22 +153,20 @@ class ContainerManager:
                 logger.warning(f"Container {container_name} not found")
             
             # Update Redis status
-            self.redis.hset(
-                f"bot:{bot_token}",
-                mapping={'status': 'stopped', 'error': ''}
-            )
+            self.status_index.transition(fingerprint, 'stopped', fields={'error': ''})
+            clear_heartbeat(self.redis, fingerprint)
             
         except Exception as e:
             error_msg = f"Failed to stop bot container: {str(e)}"
             logger.error(error_msg)
             raise BotFrameworkError(error_msg) from e
     
-    def get_bot_status(self, bot_token: str, timeout: int = 30) -> Dict:
+    def get_bot_status(self, fingerprint: str, timeout: int = 30) -> Dict:
         """
         Get bot status from Redis.
         
         Args:
-            bot_token: Bot API token
+            fingerprint: Bot token fingerprint
             timeout: How long to wait for status (seconds)
             
         Returns:
@@ -149,7 +176,7 @@ class ContainerManager:
         start_time = time.time()
         
         while time.time() - start_time < timeout:
-            status = self.redis.hgetall(f"bot:{bot_token}")
+            status = self.redis.hgetall(status_key(fingerprint))
             if status:
                 return {
                     'status': status.get(b'status', b'unknown').decode(),
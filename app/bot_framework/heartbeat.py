@@ -0,0 +1,152 @@
+"""
+Heartbeat reporting for bot runners.
+
+Runners periodically refresh a TTL liveness key, the status hash and a
+last-seen sorted set. The monitor side can then tell a crashed runner from
+an idle one and find stale bots with a single range query.
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Callable, Dict, Optional
+from .keys import LAST_SEEN_INDEX, alive_key, status_key
+from .metrics import BotMetrics, flush_metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HEARTBEAT_INTERVAL = 10.0
+
+# A bot is considered dead after missing this many heartbeats
+HEARTBEAT_TTL_FACTOR = 3
+
+def heartbeat_ttl(interval: float) -> int:
+    """Get the liveness key TTL (seconds) for a heartbeat interval."""
+    return max(1, int(interval * HEARTBEAT_TTL_FACTOR))
+
+def write_heartbeat(client, fingerprint: str, interval: float = DEFAULT_HEARTBEAT_INTERVAL,
+                    loop_lag_ms: float = 0.0, queue_depth: int = 0,
+                    now: Optional[float] = None) -> None:
+    """
+    Record a heartbeat for a bot.
+
+    Args:
+        client: Redis client
+        fingerprint: Bot token fingerprint
+        interval: Heartbeat interval used to derive the liveness TTL
+        loop_lag_ms: Measured event loop lag in milliseconds
+        queue_depth: Number of updates waiting to be processed
+        now: Heartbeat time (unix seconds), defaults to current time
+    """
+    now = time.time() if now is None else now
+    pipe = client.pipeline()
+    pipe.hset(status_key(fingerprint), mapping={
+        'last_update': datetime.utcfromtimestamp(now).isoformat(),
+        'last_heartbeat': f"{now:.3f}",
+        'loop_lag_ms': f"{loop_lag_ms:.1f}",
+        'queue_depth': str(queue_depth)
+    })
+    pipe.hincrby(status_key(fingerprint), 'version', 1)
+    pipe.set(alive_key(fingerprint), f"{now:.3f}", ex=heartbeat_ttl(interval))
+    pipe.zadd(LAST_SEEN_INDEX, {fingerprint: now})
+    pipe.execute()
+
+def clear_heartbeat(client, fingerprint: str) -> None:
+    """Remove liveness information for a bot that was stopped on purpose."""
+    pipe = client.pipeline()
+    pipe.delete(alive_key(fingerprint))
+    pipe.zrem(LAST_SEEN_INDEX, fingerprint)
+    pipe.execute()
+
+class HeartbeatSender:
+    """
+    Periodically reports liveness of a running bot.
+
+    Event loop lag is measured as the overshoot of the heartbeat sleep, so a
+    loop blocked by a slow handler shows up directly in the reported value.
+    """
+
+    def __init__(self, client, fingerprint: str, interval: float = DEFAULT_HEARTBEAT_INTERVAL,
+                 queue_depth: Optional[Callable[[], int]] = None, metrics: Optional[BotMetrics] = None):
+        """
+        Initialize the heartbeat sender.
+
+        Args:
+            client: Redis client
+            fingerprint: Bot token fingerprint
+            interval: Seconds between heartbeats
+            queue_depth: Callable returning the current update queue depth
+            metrics: Bot counters flushed to Redis with every heartbeat
+        """
+        self.client = client
+        self.fingerprint = fingerprint
+        self.interval = interval
+        self.queue_depth = queue_depth or (lambda: 0)
+        self.metrics = metrics
+        self._task: Optional[asyncio.Task] = None
+
+    def beat(self, loop_lag_ms: float = 0.0, counters: Optional[Dict[str, float]] = None) -> None:
+        """
+        Send a single heartbeat.
+
+        Args:
+            loop_lag_ms: Measured event loop lag in milliseconds
+            counters: Metrics already drained on the event loop, drained here if None
+        """
+        try:
+            write_heartbeat(
+                self.client,
+                self.fingerprint,
+                interval=self.interval,
+                loop_lag_ms=loop_lag_ms,
+                queue_depth=self.queue_depth()
+            )
+        finally:
+            self.flush_metrics(counters)
+
+    def flush_metrics(self, counters: Optional[Dict[str, float]] = None) -> None:
+        """Move accumulated bot counters to Redis, keeping them if that fails."""
+        if self.metrics is None:
+            return
+        if counters is None:
+            counters = self.metrics.drain()
+        try:
+            flush_metrics(self.client, self.fingerprint, counters)
+        except Exception:
+            self.metrics.restore(counters)
+            raise
+
+    async def run(self) -> None:
+        """Send heartbeats until cancelled."""
+        loop = asyncio.get_running_loop()
+        lag_ms = 0.0
+        while True:
+            # Drain on the loop so handlers never race the executor thread
+            counters = self.metrics.drain() if self.metrics else None
+            try:
+                await loop.run_in_executor(None, self.beat, lag_ms, counters)
+            except Exception as e:
+                logger.error(f"Error sending heartbeat: {e}")
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            lag_ms = max(0.0, loop.time() - started - self.interval) * 1000
+
+    def start(self) -> asyncio.Task:
+        """Start sending heartbeats in the background."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+        return self._task
+
+    async def stop(self) -> None:
+        """Stop sending heartbeats."""
+        task, self._task = self._task, None
+        if task is None:
+            return
+        task.cancel()
+        # The runner's signal handler stops the bot from a fresh event loop
+        if task.get_loop() is asyncio.get_running_loop():
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
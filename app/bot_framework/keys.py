@@ -0,0 +1,67 @@
+"""
+Redis key layout shared by bot runners and the management application.
+
+Bots are addressed by the fingerprint of their token rather than the raw
+token, keeping keys short and tokens out of Redis key names and indexes.
+"""
+
+import hashlib
+
+# Hex digits of the token hash kept as the fingerprint (64 bits)
+FINGERPRINT_LENGTH = 16
+
+def token_fingerprint(bot_token: str) -> str:
+    """Get the stable short identifier of a bot token."""
+    return hashlib.sha256(bot_token.encode()).hexdigest()[:FINGERPRINT_LENGTH]
+
+# Sorted set of bot fingerprints scored by the unix time of their last heartbeat
+LAST_SEEN_INDEX = "bots:last_seen"
+
+def status_key(fingerprint: str) -> str:
+    """Hash holding the reported status of a bot."""
+    return f"bot:{fingerprint}"
+
+def state_key(fingerprint: str, namespace: str) -> str:
+    """Hash of the persisted entries of one bot state namespace."""
+    return f"bot_state:{fingerprint}:{namespace}"
+
+def state_namespaces_key(fingerprint: str) -> str:
+    """Set of the state namespaces a bot has persisted."""
+    return f"bot_state:{fingerprint}"
+
+def alive_key(fingerprint: str) -> str:
+    """Liveness key refreshed by every heartbeat and expiring when they stop."""
+    return f"bot_alive:{fingerprint}"
+
+# Fleet indexes maintained by StatusIndex
+STATUS_COUNTS = "bots:counts:status"
+TYPE_COUNTS = "bots:counts:type"
+
+# Pub/sub channel announcing the fingerprint of every bot whose status changed
+STATUS_EVENTS_CHANNEL = "bots:status_events"
+
+def status_index_key(status: str) -> str:
+    """Set of bot fingerprints currently in a status."""
+    return f"bots:status:{status}"
+
+def type_index_key(bot_type: str) -> str:
+    """Set of bot fingerprints of a bot type."""
+    return f"bots:type:{bot_type}"
+
+# Sorted set of per-minute metrics buckets waiting to be flushed, scored by minute
+METRICS_PENDING = "metrics:pending"
+
+def metrics_key(fingerprint: str, minute: int) -> str:
+    """Hash of a bot's metric counters for the minute starting at a unix time."""
+    return f"metrics:{minute}:{fingerprint}"
+
+def parse_metrics_key(key: str) -> tuple:
+    """Split a metrics bucket key into (bot fingerprint, minute)."""
+    _, minute, fingerprint = key.split(':', 2)
+    return fingerprint, int(minute)
+
+def leaderboard_key(fingerprint: str, window: str, period: int = 0) -> str:
+    """Sorted set of member scores of a bot leaderboard window and period."""
+    if window == 'all':
+        return f"leaderboard:{fingerprint}:all"
+    return f"leaderboard:{fingerprint}:{window}:{period}"
@@ -0,0 +1,222 @@
+"""
+Windowed leaderboards for bots.
+
+Scores are kept in sorted sets per window: all-time, the current day and
+the current week. Adding points updates every window incrementally, and
+top-N and rank lookups are O(log n) instead of sorting all members on
+every request. The Redis backend is shared by every instance of a bot;
+the in-memory backend is used when a bot has no Redis.
+
+Days start at the bot's reset hour (UTC) and weeks on Monday. Windowed
+sets expire on their own once their period is over.
+"""
+
+import os
+import time
+import bisect
+import logging
+from typing import Dict, List, Optional, Tuple
+from .keys import leaderboard_key, token_fingerprint
+
+logger = logging.getLogger(__name__)
+
+WINDOWS = ('all', 'daily', 'weekly')
+
+# Members written per ZADD when seeding a Redis leaderboard
+SEED_BATCH = 10000
+
+# Seconds a windowed set is kept after its period started
+WINDOW_TTL = {
+    'daily': 2 * 86400,
+    'weekly': 14 * 86400
+}
+
+def day_index(timestamp: float, reset_hour: int = 0) -> int:
+    """Get the number of the game day containing a unix timestamp."""
+    return int((timestamp - reset_hour * 3600) // 86400)
+
+def week_index(day: int) -> int:
+    """Get the number of the Monday-based week containing a game day."""
+    # Day 0 (1970-01-01) was a Thursday
+    return (day + 3) // 7
+
+def window_period(window: str, timestamp: float, reset_hour: int = 0) -> int:
+    """
+    Get the period of a window containing a unix timestamp.
+
+    Raises:
+        ValueError: If the window is unknown
+    """
+    if window == 'all':
+        return 0
+    day = day_index(timestamp, reset_hour)
+    if window == 'daily':
+        return day
+    if window == 'weekly':
+        return week_index(day)
+    raise ValueError(f"Invalid leaderboard window: {window}")
+
+class RedisLeaderboard:
+    """Leaderboard stored in Redis sorted sets."""
+
+    def __init__(self, client, fingerprint: str, reset_hour: int = 0):
+        """
+        Initialize the leaderboard.
+
+        Args:
+            client: Async Redis client
+            fingerprint: Bot token fingerprint
+            reset_hour: Hour (UTC) at which game days start
+        """
+        self.client = client
+        self.fingerprint = fingerprint
+        self.reset_hour = reset_hour
+
+    def _key(self, window: str, now: Optional[float]) -> str:
+        period = window_period(window, time.time() if now is None else now, self.reset_hour)
+        return leaderboard_key(self.fingerprint, window, period)
+
+    async def add(self, member: int, points: float, now: Optional[float] = None) -> None:
+        """Add points to a member in every window."""
+        async with self.client.pipeline(transaction=False) as pipe:
+            for window in WINDOWS:
+                key = self._key(window, now)
+                pipe.zincrby(key, points, member)
+                if window in WINDOW_TTL:
+                    pipe.expire(key, WINDOW_TTL[window])
+            await pipe.execute()
+
+    async def seed(self, scores: Dict[int, float]) -> None:
+        """
+        Raise all-time scores to persisted totals, e.g. scores kept before the leaderboard existed.
+
+        Uses ZADD GT, so members missing from the set are added and a
+        score that is already higher (written before the state was saved)
+        is kept. Safe to repeat on every start.
+        """
+        key = self._key('all', None)
+        items = [(member, score) for member, score in scores.items() if score]
+        for i in range(0, len(items), SEED_BATCH):
+            await self.client.zadd(key, dict(items[i:i + SEED_BATCH]), gt=True)
+
+    async def top(self, window: str = 'all', limit: int = 10, now: Optional[float] = None) -> List[Tuple[int, float]]:
+        """Get the highest scoring members of a window as (member, score) pairs."""
+        entries = await self.client.zrevrange(self._key(window, now), 0, limit - 1, withscores=True)
+        return [(int(member), score) for member, score in entries]
+
+    async def rank(self, member: int, window: str = 'all',
+                   now: Optional[float] = None) -> Optional[Tuple[int, float]]:
+        """Get the 1-based rank and score of a member, or None if unranked."""
+        key = self._key(window, now)
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.zrevrank(key, member)
+            pipe.zscore(key, member)
+            rank, score = await pipe.execute()
+        return None if rank is None else (rank + 1, score)
+
+    async def size(self, window: str = 'all', now: Optional[float] = None) -> int:
+        """Get the number of ranked members of a window."""
+        return await self.client.zcard(self._key(window, now))
+
+class _SortedScores:
+    """Scores of one period kept sorted for bisection."""
+
+    def __init__(self):
+        self.scores: Dict[int, float] = {}
+        # (-score, member), so ascending order is the ranking
+        self.order: List[Tuple[float, int]] = []
+
+    def add(self, member: int, points: float) -> None:
+        old = self.scores.get(member)
+        if old is not None:
+            del self.order[bisect.bisect_left(self.order, (-old, member))]
+        score = (old or 0) + points
+        self.scores[member] = score
+        bisect.insort(self.order, (-score, member))
+
+    def rank(self, member: int) -> Optional[Tuple[int, float]]:
+        score = self.scores.get(member)
+        if score is None:
+            return None
+        return bisect.bisect_left(self.order, (-score, member)) + 1, score
+
+class MemoryLeaderboard:
+    """
+    Leaderboard of a single bot process.
+
+    Lookups bisect a sorted list; updates also pay a list insertion, which
+    is a memmove and cheap at the sizes a single process holds.
+    """
+
+    def __init__(self, reset_hour: int = 0):
+        """
+        Initialize the leaderboard.
+
+        Args:
+            reset_hour: Hour (UTC) at which game days start
+        """
+        self.reset_hour = reset_hour
+        self._boards: Dict[Tuple[str, int], _SortedScores] = {}
+
+    def _board(self, window: str, now: Optional[float], create: bool = False) -> Optional[_SortedScores]:
+        period = window_period(window, time.time() if now is None else now, self.reset_hour)
+        board = self._boards.get((window, period))
+        if board is None and create:
+            # Earlier periods of the window are over
+            for key in [key for key in self._boards if key[0] == window]:
+                del self._boards[key]
+            board = self._boards[(window, period)] = _SortedScores()
+        return board
+
+    def seed(self, scores: Dict[int, float]) -> None:
+        """Rebuild the all-time window, e.g. from persisted player scores."""
+        board = _SortedScores()
+        board.scores = {member: score for member, score in scores.items() if score}
+        board.order = sorted((-score, member) for member, score in board.scores.items())
+        self._boards[('all', 0)] = board
+
+    async def add(self, member: int, points: float, now: Optional[float] = None) -> None:
+        """Add points to a member in every window."""
+        for window in WINDOWS:
+            self._board(window, now, create=True).add(member, points)
+
+    async def top(self, window: str = 'all', limit: int = 10, now: Optional[float] = None) -> List[Tuple[int, float]]:
+        """Get the highest scoring members of a window as (member, score) pairs."""
+        board = self._board(window, now)
+        return [(member, -score) for score, member in board.order[:limit]] if board else []
+
+    async def rank(self, member: int, window: str = 'all',
+                   now: Optional[float] = None) -> Optional[Tuple[int, float]]:
+        """Get the 1-based rank and score of a member, or None if unranked."""
+        board = self._board(window, now)
+        return board.rank(member) if board else None
+
+    async def size(self, window: str = 'all', now: Optional[float] = None) -> int:
+        """Get the number of ranked members of a window."""
+        board = self._board(window, now)
+        return len(board.scores) if board else 0
+
+def create_leaderboard(bot_token: str, config: Optional[Dict] = None):
+    """
+    Build the leaderboard of a bot from its configuration.
+
+    Args:
+        bot_token: Bot API token
+        config: Bot configuration; leaderboard_backend overrides
+            LEADERBOARD_BACKEND (redis or memory, defaults to redis when
+            STATE_BACKEND is redis) and reset_hour sets the day start
+
+    Returns:
+        Redis or in-memory leaderboard
+    """
+    config = config or {}
+    backend = (
+        config.get('leaderboard_backend')
+        or os.getenv('LEADERBOARD_BACKEND')
+        or ('redis' if (config.get('state_backend') or os.getenv('STATE_BACKEND')) == 'redis' else 'memory')
+    )
+    reset_hour = config.get('reset_hour', 0)
+    if backend == 'redis':
+        from .redis_client import get_async_redis
+        return RedisLeaderboard(get_async_redis(), token_fingerprint(bot_token), reset_hour)
+    return MemoryLeaderboard(reset_hour)
@@ -0,0 +1,116 @@
+"""
+Per-bot runtime metrics.
+
+Bots count updates, commands, errors and handler latency in memory. The
+runner drains the counters into per-minute Redis hashes with every
+heartbeat, and a periodic task in the management application moves closed
+minutes into the database (see app.metrics_store).
+"""
+
+import time
+import logging
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+from .keys import METRICS_PENDING, metrics_key, parse_metrics_key
+
+logger = logging.getLogger(__name__)
+
+# Redis minute buckets expire if they are never flushed to the database
+METRICS_KEY_TTL = 6 * 3600
+
+# Seconds a minute stays open after it ended, covering runner clock skew
+METRICS_GRACE = 60
+
+class BotMetrics:
+    """
+    In-memory counters of a running bot.
+
+    Metric names are dotted, e.g. ``updates.message``, ``commands.roll``,
+    ``errors`` and ``latency_ms.sum`` / ``latency_ms.count``.
+    """
+
+    def __init__(self):
+        self._counters: Dict[str, float] = defaultdict(float)
+
+    def incr(self, metric: str, amount: float = 1) -> None:
+        """Increment a counter."""
+        self._counters[metric] += amount
+
+    def observe_latency(self, latency_ms: float) -> None:
+        """Record the duration of one handler call."""
+        self._counters['latency_ms.sum'] += latency_ms
+        self._counters['latency_ms.count'] += 1
+
+    def drain(self) -> Dict[str, float]:
+        """Take all counters accumulated since the last drain."""
+        counters, self._counters = self._counters, defaultdict(float)
+        return dict(counters)
+
+    def restore(self, counters: Dict[str, float]) -> None:
+        """Put back counters that could not be flushed."""
+        for metric, amount in counters.items():
+            self._counters[metric] += amount
+
+    def snapshot(self) -> Dict[str, float]:
+        """Get the counters accumulated since the last drain."""
+        return dict(self._counters)
+
+def minute_start(timestamp: float) -> int:
+    """Get the start of the minute containing a unix timestamp."""
+    return int(timestamp // 60 * 60)
+
+def flush_metrics(client, fingerprint: str, counters: Dict[str, float], now: Optional[float] = None) -> None:
+    """
+    Add counters to the bot's current minute bucket in Redis.
+
+    Args:
+        client: Redis client
+        fingerprint: Bot token fingerprint
+        counters: Counters drained from BotMetrics
+        now: Time of the counters (unix seconds), defaults to current time
+    """
+    if not counters:
+        return
+    minute = minute_start(time.time() if now is None else now)
+    key = metrics_key(fingerprint, minute)
+    pipe = client.pipeline()
+    for metric, amount in counters.items():
+        pipe.hincrbyfloat(key, metric, amount)
+    pipe.expire(key, METRICS_KEY_TTL)
+    pipe.zadd(METRICS_PENDING, {key: minute})
+    pipe.execute()
+
+def closed_buckets(client, now: Optional[float] = None, limit: int = 1000) -> List[Tuple[str, str, int]]:
+    """
+    Get minute buckets that no longer receive writes.
+
+    Args:
+        client: Redis client
+        now: Current time (unix seconds)
+        limit: Maximum number of buckets returned
+
+    Returns:
+        List of (key, bot fingerprint, minute start) tuples, oldest first
+    """
+    cutoff = minute_start(time.time() if now is None else now) - METRICS_GRACE
+    keys = client.zrangebyscore(METRICS_PENDING, '-inf', f"({cutoff}", start=0, num=limit)
+    return [(key.decode(),) + parse_metrics_key(key.decode()) for key in keys]
+
+def read_buckets(client, keys: Iterable[str]) -> List[Dict[str, float]]:
+    """Read minute buckets in one round trip."""
+    pipe = client.pipeline(transaction=False)
+    for key in keys:
+        pipe.hgetall(key)
+    return [
+        {metric.decode(): float(value) for metric, value in raw.items()}
+        for raw in pipe.execute()
+    ]
+
+def delete_buckets(client, keys: List[str]) -> None:
+    """Remove flushed minute buckets."""
+    if not keys:
+        return
+    pipe = client.pipeline()
+    pipe.delete(*keys)
+    pipe.zrem(METRICS_PENDING, *keys)
+    pipe.execute()
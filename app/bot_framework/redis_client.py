@@ -0,0 +1,127 @@
+"""
+Process-wide Redis client factory.
+
+All components share one client (and therefore one connection pool) per
+Redis URL instead of building a new pool for every monitor, manager or
+request.
+"""
+
+import os
+import logging
+import threading
+from typing import Dict, Optional
+from urllib.parse import urlparse
+import redis
+import redis.asyncio
+from redis.backoff import ExponentialBackoff
+from redis.retry import Retry
+from redis.asyncio.retry import Retry as AsyncRetry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REDIS_URL = 'redis://redis:6379/0'
+
+_clients: Dict[str, redis.Redis] = {}
+_async_clients: Dict[str, redis.asyncio.Redis] = {}
+_lock = threading.Lock()
+
+def get_redis_url() -> str:
+    """Get the configured Redis URL."""
+    return os.getenv('REDIS_URL', DEFAULT_REDIS_URL)
+
+def _pool_options() -> Dict:
+    """Build connection pool options from the environment."""
+    return {
+        'max_connections': int(os.getenv('REDIS_MAX_CONNECTIONS', '50')),
+        'timeout': float(os.getenv('REDIS_POOL_TIMEOUT', '5')),
+        'socket_keepalive': True,
+        'socket_timeout': float(os.getenv('REDIS_SOCKET_TIMEOUT', '5')),
+        'socket_connect_timeout': float(os.getenv('REDIS_CONNECT_TIMEOUT', '5')),
+        'health_check_interval': int(os.getenv('REDIS_HEALTH_CHECK_INTERVAL', '30')),
+        'retry_on_timeout': True,
+        'retry': Retry(ExponentialBackoff(cap=1.0, base=0.05), int(os.getenv('REDIS_RETRIES', '3')))
+    }
+
+def get_redis(url: Optional[str] = None) -> redis.Redis:
+    """
+    Get the shared Redis client for a URL.
+
+    Args:
+        url: Redis URL, defaults to REDIS_URL from the environment
+
+    Returns:
+        Redis client backed by a shared blocking connection pool
+    """
+    url = url or get_redis_url()
+    client = _clients.get(url)
+    if client is None:
+        with _lock:
+            client = _clients.get(url)
+            if client is None:
+                pool = redis.BlockingConnectionPool.from_url(url, **_pool_options())
+                client = redis.Redis(connection_pool=pool)
+                _clients[url] = client
+                logger.info(f"Created Redis connection pool for {_mask_url(url)}")
+    return client
+
+def get_async_redis(url: Optional[str] = None) -> redis.asyncio.Redis:
+    """
+    Get the shared asyncio Redis client for a URL.
+
+    The client must only be used from one event loop, which is the case
+    for each ASGI worker process.
+
+    Args:
+        url: Redis URL, defaults to REDIS_URL from the environment
+
+    Returns:
+        Async Redis client backed by a shared blocking connection pool
+    """
+    url = url or get_redis_url()
+    client = _async_clients.get(url)
+    if client is None:
+        options = _pool_options()
+        # Every in-flight request of an async worker may hold a connection
+        options['max_connections'] = int(os.getenv('REDIS_ASYNC_MAX_CONNECTIONS', '200'))
+        options['retry'] = AsyncRetry(ExponentialBackoff(cap=1.0, base=0.05), int(os.getenv('REDIS_RETRIES', '3')))
+        pool = redis.asyncio.BlockingConnectionPool.from_url(url, **options)
+        client = redis.asyncio.Redis(connection_pool=pool)
+        _async_clients[url] = client
+        logger.info(f"Created async Redis connection pool for {_mask_url(url)}")
+    return client
+
+def get_pool_stats() -> Dict[str, Dict[str, int]]:
+    """
+    Get utilization of all connection pools in this process.
+
+    Returns:
+        Dict mapping masked Redis URLs to pool statistics
+    """
+    stats = {}
+    for url, client in list(_clients.items()):
+        pool = client.connection_pool
+        created = len(pool._connections)
+        idle = sum(1 for conn in list(pool.pool.queue) if conn is not None)
+        stats[_mask_url(url)] = {
+            'max_connections': pool.max_connections,
+            'created': created,
+            'in_use': created - idle,
+            'idle': idle
+        }
+    return stats
+
+def reset_redis_clients() -> None:
+    """Disconnect and forget all shared clients."""
+    with _lock:
+        for client in _clients.values():
+            client.connection_pool.disconnect()
+        _clients.clear()
+        # Async pools are disconnected by their event loop, see app.asgi
+        _async_clients.clear()
+
+def _mask_url(url: str) -> str:
+    """Hide the password in a Redis URL."""
+    parsed = urlparse(url)
+    if parsed.password:
+        return url.replace(f":{parsed.password}@", ":****@")
+    return url
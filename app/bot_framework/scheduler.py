@@ -0,0 +1,139 @@
+"""
+Deferred Bot API calls for bots.
+
+Handlers schedule a send (e.g. a reply after an animation) and return
+at once instead of sleeping. Pending sends live in a heap of (due, job id)
+pairs served by a single event loop timer armed for the earliest one.
+The jobs are kept in a state namespace, so they survive a restart and
+are sent late, or dropped once they are too late. Cancelled jobs are
+removed from the namespace and skipped when they reach the top of the heap.
+
+Delivery is at most once: a job is removed before it is sent.
+"""
+
+import os
+import time
+import heapq
+import asyncio
+import logging
+import secrets
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from .state import StateMap
+
+logger = logging.getLogger(__name__)
+
+class SendScheduler:
+    """
+    Timer-driven queue of delayed Bot API calls.
+
+    Attributes:
+        jobs (StateMap): Pending jobs by id, {"due", "method", "kwargs"}
+        max_lateness (float): Seconds after which an overdue job is dropped
+    """
+
+    def __init__(self, jobs: StateMap, send: Callable[[str, Dict[str, Any]], Awaitable[Any]],
+                 max_lateness: Optional[float] = None):
+        """
+        Initialize the scheduler.
+
+        Args:
+            jobs: State namespace persisting the pending jobs
+            send: Coroutine function calling a Bot API method with keyword arguments
+            max_lateness: Seconds an overdue job may still be sent (SCHEDULER_MAX_LATENESS)
+        """
+        self.jobs = jobs
+        self.send = send
+        self.max_lateness = max_lateness or float(os.getenv('SCHEDULER_MAX_LATENESS', '600'))
+        self._heap: List[Tuple[float, str]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._timer_due: Optional[float] = None
+        self._sending: Set[asyncio.Task] = set()
+        self._running = False
+
+    def __len__(self) -> int:
+        return len(self.jobs)
+
+    def schedule(self, delay: float, method: str, **kwargs) -> str:
+        """
+        Schedule a Bot API call.
+
+        Args:
+            delay: Seconds to wait
+            method: Bot method name, e.g. send_message
+            **kwargs: JSON serializable method arguments
+
+        Returns:
+            Job id for cancel()
+        """
+        job_id = secrets.token_hex(6)
+        due = time.time() + delay
+        self.jobs[job_id] = {'due': due, 'method': method, 'kwargs': kwargs}
+        heapq.heappush(self._heap, (due, job_id))
+        self._arm()
+        return job_id
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a pending job; returns False if it was already sent or unknown."""
+        if job_id not in self.jobs:
+            return False
+        # The heap entry is skipped when it comes up
+        del self.jobs[job_id]
+        return True
+
+    def start(self) -> None:
+        """Rebuild the heap from persisted jobs and start the timer (needs a running loop)."""
+        self._heap = [(job['due'], job_id) for job_id, job in self.jobs.items()]
+        heapq.heapify(self._heap)
+        self._running = True
+        if self._heap:
+            logger.info(f"Restored {len(self._heap)} scheduled sends")
+        self._arm()
+
+    async def stop(self) -> None:
+        """Stop the timer and wait for sends in progress; pending jobs stay persisted."""
+        self._running = False
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = self._timer_due = None
+        if self._sending:
+            await asyncio.gather(*self._sending, return_exceptions=True)
+
+    def _arm(self) -> None:
+        """Point the timer at the earliest pending job."""
+        # Drop cancelled entries so the timer does not wake up for them
+        while self._heap and self._heap[0][1] not in self.jobs:
+            heapq.heappop(self._heap)
+        if not self._running or not self._heap:
+            return
+        due = self._heap[0][0]
+        if self._timer is not None:
+            if self._timer_due <= due:
+                return
+            self._timer.cancel()
+        loop = asyncio.get_running_loop()
+        self._timer = loop.call_later(max(0.0, due - time.time()), self._fire)
+        self._timer_due = due
+
+    def _fire(self) -> None:
+        """Start every due job and re-arm the timer."""
+        self._timer = self._timer_due = None
+        now = time.time()
+        while self._heap and self._heap[0][0] <= now:
+            _, job_id = heapq.heappop(self._heap)
+            job = self.jobs.pop(job_id, None)
+            if job is None:
+                continue
+            if now - job['due'] > self.max_lateness:
+                logger.warning(f"Dropped scheduled {job['method']} {now - job['due']:.0f}s overdue")
+                continue
+            task = asyncio.ensure_future(self._send(job))
+            self._sending.add(task)
+            task.add_done_callback(self._sending.discard)
+        self._arm()
+
+    async def _send(self, job: Dict[str, Any]) -> None:
+        """Run one job, logging failures."""
+        try:
+            await self.send(job['method'], job['kwargs'])
+        except Exception as e:
+            logger.error(f"Scheduled {job['method']} failed: {str(e)}")
@@ -0,0 +1,389 @@
+"""
+Persistent bot state with write-behind flushing.
+
+Bots keep their state in StateMap namespaces, in-memory mappings that
+handlers read and write without any I/O. Changed keys are marked dirty and
+written to the backend in batches by a background task, at most
+flush_interval seconds later or sooner once max_dirty keys are waiting,
+and a last time when the bot stops. Every entry is stored as its own JSON
+record, so a flush only writes what changed.
+
+Backends:
+    memory: Nothing is persisted (tests and development)
+    redis: One hash per namespace, see keys.state_key
+    sqlite: One row per entry in a local database file
+"""
+
+import os
+import json
+import sqlite3
+import asyncio
+import logging
+import threading
+from collections import defaultdict
+from collections.abc import MutableMapping
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Optional, Set, Tuple
+from .exceptions import BotConfigError
+from .keys import state_key, state_namespaces_key, token_fingerprint
+
+logger = logging.getLogger(__name__)
+
+# Namespace -> (encoded entries to write, keys to delete)
+Batch = Dict[str, Tuple[Dict[str, str], List[str]]]
+
+def _json_default(value: Any) -> Any:
+    """Encode dates and datetimes as ISO strings."""
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def encode_json(value: Any) -> str:
+    """Default state entry encoder."""
+    return json.dumps(value, default=_json_default, separators=(',', ':'))
+
+class MemoryStateBackend:
+    """Keeps encoded entries in process memory only."""
+
+    def __init__(self):
+        self.data: Dict[str, Dict[str, str]] = defaultdict(dict)
+
+    def load(self, namespace: str) -> Dict[str, str]:
+        """Get all encoded entries of a namespace."""
+        return dict(self.data[namespace])
+
+    def write(self, namespace: str, upserts: Dict[str, str], deletes: List[str]) -> None:
+        """Store changed entries and remove deleted ones."""
+        self.data[namespace].update(upserts)
+        for key in deletes:
+            self.data[namespace].pop(key, None)
+
+class RedisStateBackend:
+    """Stores each namespace of a bot as a Redis hash."""
+
+    def __init__(self, client, fingerprint: str):
+        """
+        Initialize the backend.
+
+        Args:
+            client: Redis client
+            fingerprint: Bot token fingerprint
+        """
+        self.client = client
+        self.fingerprint = fingerprint
+
+    def load(self, namespace: str) -> Dict[str, str]:
+        """Get all encoded entries of a namespace."""
+        raw = self.client.hgetall(state_key(self.fingerprint, namespace))
+        return {key.decode(): value.decode() for key, value in raw.items()}
+
+    def write(self, namespace: str, upserts: Dict[str, str], deletes: List[str]) -> None:
+        """Store changed entries and remove deleted ones in one round trip."""
+        key = state_key(self.fingerprint, namespace)
+        pipe = self.client.pipeline()
+        if upserts:
+            pipe.hset(key, mapping=upserts)
+        if deletes:
+            pipe.hdel(key, *deletes)
+        pipe.sadd(state_namespaces_key(self.fingerprint), namespace)
+        pipe.execute()
+
+class SQLiteStateBackend:
+    """Stores entries as rows of a local SQLite database."""
+
+    def __init__(self, path: str):
+        """
+        Initialize the backend, creating the database if needed.
+
+        Args:
+            path: Database file path
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS bot_state ('
+                'namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, '
+                'PRIMARY KEY (namespace, key))'
+            )
+
+    def load(self, namespace: str) -> Dict[str, str]:
+        """Get all encoded entries of a namespace."""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT key, value FROM bot_state WHERE namespace = ?', (namespace,)
+            ).fetchall()
+        return dict(rows)
+
+    def write(self, namespace: str, upserts: Dict[str, str], deletes: List[str]) -> None:
+        """Store changed entries and remove deleted ones in one transaction."""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO bot_state (namespace, key, value) VALUES (?, ?, ?)',
+                [(namespace, key, value) for key, value in upserts.items()]
+            )
+            self._conn.executemany(
+                'DELETE FROM bot_state WHERE namespace = ? AND key = ?',
+                [(namespace, key) for key in deletes]
+            )
+
+class StateMap(MutableMapping):
+    """
+    Mapping of one state namespace.
+
+    Assigning or deleting a key marks it for persisting. Values changed in
+    place (e.g. a field of a stored dict) must be marked with touch().
+    """
+
+    def __init__(self, store: "StateStore", name: str, encode: Optional[Callable[[Any], str]] = None,
+                 decode: Optional[Callable[[str], Any]] = None, key_type: Callable[[str], Hashable] = str):
+        """
+        Initialize the namespace.
+
+        Args:
+            store: Owning state store
+            name: Namespace name
+            encode: Value to string encoder, JSON by default
+            decode: String to value decoder, JSON by default
+            key_type: Converts stored string keys back, e.g. int for user ids
+        """
+        self.store = store
+        self.name = name
+        self.encode = encode or encode_json
+        self.decode = decode or json.loads
+        self.key_type = key_type
+        self._data: Dict[Hashable, Any] = {}
+
+    def __getitem__(self, key: Hashable) -> Any:
+        return self._data[key]
+
+    def __setitem__(self, key: Hashable, value: Any) -> None:
+        self._data[key] = value
+        self.store.mark_dirty(self.name, key)
+
+    def __delitem__(self, key: Hashable) -> None:
+        del self._data[key]
+        self.store.mark_dirty(self.name, key)
+
+    def __iter__(self) -> Iterator[Hashable]:
+        return iter(self._data)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def touch(self, key: Hashable) -> None:
+        """Mark a value that was changed in place for persisting."""
+        if key in self._data:
+            self.store.mark_dirty(self.name, key)
+
+    def replace(self, data: Dict[Hashable, Any]) -> None:
+        """Replace the whole namespace."""
+        for key in list(self._data):
+            if key not in data:
+                del self[key]
+        for key, value in data.items():
+            self[key] = value
+
+    def _load(self, raw: Dict[str, str]) -> None:
+        """Fill the namespace from encoded backend entries, keeping unsaved changes."""
+        dirty = self.store.dirty_keys(self.name)
+        data = {self.key_type(key): self.decode(value) for key, value in raw.items()}
+        data.update({key: value for key, value in self._data.items() if key in dirty})
+        self._data = data
+
+class StateStore:
+    """
+    Write-behind store of a bot's state namespaces.
+
+    Attributes:
+        backend: Storage backend
+        flush_interval (float): Maximum seconds a change stays unsaved
+        max_dirty (int): Dirty keys that trigger an early flush
+    """
+
+    def __init__(self, backend, flush_interval: Optional[float] = None, max_dirty: Optional[int] = None):
+        """
+        Initialize the store.
+
+        Args:
+            backend: Storage backend
+            flush_interval: Seconds between flushes (STATE_FLUSH_INTERVAL)
+            max_dirty: Dirty keys that trigger an early flush (STATE_MAX_DIRTY)
+        """
+        self.backend = backend
+        self.flush_interval = flush_interval or float(os.getenv('STATE_FLUSH_INTERVAL', '1'))
+        self.max_dirty = max_dirty or int(os.getenv('STATE_MAX_DIRTY', '500'))
+        self._maps: Dict[str, StateMap] = {}
+        self._dirty: Dict[str, Set[Hashable]] = defaultdict(set)
+        self._dirty_count = 0
+        # Serializes backend writes of the background task and the final flush
+        self._write_lock = threading.Lock()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def namespace(self, name: str, **options) -> StateMap:
+        """
+        Get a state namespace, creating it on first use.
+
+        Args:
+            name: Namespace name
+            **options: encode, decode and key_type passed to StateMap
+
+        Returns:
+            The namespace mapping
+        """
+        if name not in self._maps:
+            self._maps[name] = StateMap(self, name, **options)
+        return self._maps[name]
+
+    def load(self) -> None:
+        """Read all namespaces from the backend (blocking; run before handling updates)."""
+        for name, state_map in self._maps.items():
+            state_map._load(self.backend.load(name))
+            logger.info(f"Loaded {len(state_map)} {name} state entries")
+
+    @property
+    def dirty_count(self) -> int:
+        """Number of keys waiting to be written."""
+        return self._dirty_count
+
+    def dirty_keys(self, name: str) -> Set[Hashable]:
+        """Get the unsaved keys of a namespace."""
+        return set(self._dirty.get(name, ()))
+
+    def mark_dirty(self, name: str, key: Hashable) -> None:
+        """Schedule a key for the next flush."""
+        keys = self._dirty[name]
+        if key not in keys:
+            keys.add(key)
+            self._dirty_count += 1
+            if self._wakeup is not None and self._dirty_count >= self.max_dirty:
+                self._wakeup.set()
+
+    def _take(self) -> Batch:
+        """Encode and clear the dirty entries."""
+        batch = {}
+        for name, keys in self._dirty.items():
+            state_map = self._maps[name]
+            upserts, deletes = {}, []
+            for key in keys:
+                if key in state_map:
+                    upserts[str(key)] = state_map.encode(state_map[key])
+                else:
+                    deletes.append(str(key))
+            batch[name] = (upserts, deletes)
+        self._dirty = defaultdict(set)
+        self._dirty_count = 0
+        return batch
+
+    def _write(self, batch: Batch) -> None:
+        """Write a batch to the backend."""
+        with self._write_lock:
+            for name, (upserts, deletes) in batch.items():
+                self.backend.write(name, upserts, deletes)
+
+    def _restore(self, batch: Batch) -> None:
+        """Mark the keys of a batch that could not be written dirty again."""
+        for name, (upserts, deletes) in batch.items():
+            state_map = self._maps[name]
+            for key in list(upserts) + deletes:
+                self.mark_dirty(name, state_map.key_type(key))
+
+    def flush(self) -> int:
+        """
+        Write all dirty entries now (blocking).
+
+        Returns:
+            Number of entries written
+        """
+        batch = self._take()
+        try:
+            self._write(batch)
+        except Exception:
+            self._restore(batch)
+            raise
+        return sum(len(upserts) + len(deletes) for upserts, deletes in batch.values())
+
+    async def flush_async(self) -> int:
+        """
+        Write all dirty entries without blocking the event loop.
+
+        Returns:
+            Number of entries written
+        """
+        # Encode on the loop so handlers never race the executor thread
+        batch = self._take()
+        if not batch:
+            return 0
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self._write, batch)
+        except Exception:
+            self._restore(batch)
+            raise
+        return sum(len(upserts) + len(deletes) for upserts, deletes in batch.values())
+
+    async def run(self) -> None:
+        """Flush dirty entries until cancelled."""
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if self._dirty_count:
+                try:
+                    await self.flush_async()
+                except Exception as e:
+                    logger.error(f"Error flushing bot state: {e}")
+
+    def start(self) -> asyncio.Task:
+        """Start flushing in the background."""
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self.run())
+        return self._task
+
+    async def stop(self) -> None:
+        """Stop background flushing and write the remaining changes."""
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._wakeup = None
+        try:
+            await self.flush_async()
+        except Exception as e:
+            logger.error(f"Error flushing bot state on shutdown: {e}")
+
+def create_state_store(bot_token: str, config: Optional[Dict] = None) -> StateStore:
+    """
+    Build the state store of a bot from its configuration.
+
+    Args:
+        bot_token: Bot API token
+        config: Bot configuration; state_backend and state_path override
+            STATE_BACKEND (memory, redis or sqlite) and STATE_SQLITE_PATH
+
+    Returns:
+        State store using the configured backend
+
+    Raises:
+        BotConfigError: If the backend is unknown
+    """
+    config = config or {}
+    backend = config.get('state_backend') or os.getenv('STATE_BACKEND', 'memory')
+    fingerprint = token_fingerprint(bot_token)
+    if backend == 'memory':
+        return StateStore(MemoryStateBackend())
+    if backend == 'redis':
+        from .redis_client import get_redis
+        return StateStore(RedisStateBackend(get_redis(), fingerprint))
+    if backend == 'sqlite':
+        path = config.get('state_path') or os.getenv('STATE_SQLITE_PATH', f"bot_state_{fingerprint}.db")
+        return StateStore(SQLiteStateBackend(path))
+    raise BotConfigError(f"Unknown state backend: {backend}")
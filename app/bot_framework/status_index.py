@@ -0,0 +1,175 @@
+"""
+Redis-side fleet indexes by status and bot type.
+
+Every status transition moves the bot fingerprint between per-status sets and
+adjusts counter hashes in one atomic script, so fleet-wide counts are a
+single HGETALL regardless of the number of bots. Transitions are announced
+on a pub/sub channel so status caches can drop stale entries.
+"""
+
+import logging
+from typing import Dict, List, Optional
+from .keys import (
+    STATUS_COUNTS, STATUS_EVENTS_CHANNEL, TYPE_COUNTS,
+    status_index_key, status_key, type_index_key
+)
+
+logger = logging.getLogger(__name__)
+
+KNOWN_STATUSES = ('unknown', 'starting', 'running', 'stopping', 'stopped', 'error')
+
+# KEYS[1] status hash, KEYS[2] status counts, KEYS[3] type counts
+# ARGV[1] fingerprint, ARGV[2] status, ARGV[3] bot type (or ''),
+# ARGV[4] status set prefix, ARGV[5] type set prefix, ARGV[6] events channel,
+# ARGV[7..] hash fields
+_TRANSITION_SCRIPT = """
+local bot = ARGV[1]
+local new_status = ARGV[2]
+local new_type = ARGV[3]
+if #ARGV > 6 then
+    redis.call('HSET', KEYS[1], unpack(ARGV, 7))
+end
+local old_status = redis.call('HGET', KEYS[1], 'status')
+redis.call('HSET', KEYS[1], 'status', new_status)
+if old_status and old_status ~= new_status then
+    if redis.call('SREM', ARGV[4] .. old_status, bot) == 1 then
+        redis.call('HINCRBY', KEYS[2], old_status, -1)
+    end
+end
+if redis.call('SADD', ARGV[4] .. new_status, bot) == 1 then
+    redis.call('HINCRBY', KEYS[2], new_status, 1)
+end
+if new_type ~= '' then
+    local old_type = redis.call('HGET', KEYS[1], 'type')
+    redis.call('HSET', KEYS[1], 'type', new_type)
+    if old_type and old_type ~= new_type then
+        if redis.call('SREM', ARGV[5] .. old_type, bot) == 1 then
+            redis.call('HINCRBY', KEYS[3], old_type, -1)
+        end
+    end
+    if redis.call('SADD', ARGV[5] .. new_type, bot) == 1 then
+        redis.call('HINCRBY', KEYS[3], new_type, 1)
+    end
+end
+redis.call('HINCRBY', KEYS[1], 'version', 1)
+redis.call('PUBLISH', ARGV[6], bot)
+return old_status
+"""
+
+# KEYS[1] status hash, KEYS[2] status counts, KEYS[3] type counts
+# ARGV[1] fingerprint, ARGV[2] status set prefix, ARGV[3] type set prefix,
+# ARGV[4] events channel
+_FORGET_SCRIPT = """
+local bot = ARGV[1]
+local old_status = redis.call('HGET', KEYS[1], 'status')
+local old_type = redis.call('HGET', KEYS[1], 'type')
+if old_status and redis.call('SREM', ARGV[2] .. old_status, bot) == 1 then
+    redis.call('HINCRBY', KEYS[2], old_status, -1)
+end
+if old_type and redis.call('SREM', ARGV[3] .. old_type, bot) == 1 then
+    redis.call('HINCRBY', KEYS[3], old_type, -1)
+end
+redis.call('DEL', KEYS[1])
+redis.call('PUBLISH', ARGV[4], bot)
+return old_status
+"""
+
+class StatusIndex:
+    """Maintains and queries fleet indexes by status and bot type."""
+
+    def __init__(self, client):
+        """
+        Initialize the status index.
+
+        Args:
+            client: Redis client
+        """
+        self.redis = client
+        self._transition = client.register_script(_TRANSITION_SCRIPT)
+        self._forget = client.register_script(_FORGET_SCRIPT)
+
+    def transition(self, fingerprint: str, status: str, bot_type: Optional[str] = None,
+                   fields: Optional[Dict[str, str]] = None) -> Optional[str]:
+        """
+        Atomically set a bot's status and update the indexes.
+
+        Args:
+            fingerprint: Bot token fingerprint
+            status: New status
+            bot_type: Bot type, left unchanged if None
+            fields: Additional status hash fields to write
+
+        Returns:
+            The previous status or None if the bot was not indexed
+        """
+        args = [
+            fingerprint, status, bot_type or '',
+            status_index_key(''), type_index_key(''), STATUS_EVENTS_CHANNEL
+        ]
+        for field, value in (fields or {}).items():
+            args.extend([field, '' if value is None else str(value)])
+        old_status = self._transition(
+            keys=[status_key(fingerprint), STATUS_COUNTS, TYPE_COUNTS],
+            args=args
+        )
+        return old_status.decode() if isinstance(old_status, bytes) else old_status
+
+    def forget(self, fingerprint: str) -> None:
+        """
+        Remove a bot from all indexes and delete its status hash.
+
+        Args:
+            fingerprint: Bot token fingerprint
+        """
+        self._forget(
+            keys=[status_key(fingerprint), STATUS_COUNTS, TYPE_COUNTS],
+            args=[fingerprint, status_index_key(''), type_index_key(''), STATUS_EVENTS_CHANNEL]
+        )
+
+    def status_counts(self) -> Dict[str, int]:
+        """
+        Get the number of bots in each status.
+
+        Returns:
+            Dict mapping every known status (and any other seen) to a count
+        """
+        counts = {status: 0 for status in KNOWN_STATUSES}
+        counts.update(self._read_counts(STATUS_COUNTS))
+        return counts
+
+    def type_counts(self) -> Dict[str, int]:
+        """
+        Get the number of bots of each type.
+
+        Returns:
+            Dict mapping bot types to counts
+        """
+        return self._read_counts(TYPE_COUNTS)
+
+    def count(self, status: str) -> int:
+        """Get the number of bots in a status."""
+        value = self.redis.hget(STATUS_COUNTS, status)
+        return int(value) if value else 0
+
+    def members(self, status: str) -> List[str]:
+        """Get the fingerprints of all bots in a status."""
+        return [
+            member.decode() if isinstance(member, bytes) else member
+            for member in self.redis.smembers(status_index_key(status))
+        ]
+
+    def members_of_type(self, bot_type: str) -> List[str]:
+        """Get the fingerprints of all bots of a type."""
+        return [
+            member.decode() if isinstance(member, bytes) else member
+            for member in self.redis.smembers(type_index_key(bot_type))
+        ]
+
+    def _read_counts(self, key: str) -> Dict[str, int]:
+        """Read a counter hash, dropping empty buckets."""
+        counts = {}
+        for name, value in self.redis.hgetall(key).items():
+            name = name.decode() if isinstance(name, bytes) else name
+            if int(value) > 0:
+                counts[name] = int(value)
+        return counts
@@ -3,10 +3,110 @@ Dice MMO Game Bot
 A multiplayer dice rolling game with daily limits and scoreboards.
 """
 
-import asyncio
+import sys
+import json
+import time
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple, Union
 from app.bot_framework import BaseTelegramBot, bot_command, bot_handler
+from app.bot_framework.leaderboard import WINDOWS, MemoryLeaderboard, create_leaderboard, day_index
+from app.bot_framework.state import StateMap
+
+# Naive UTC datetimes are converted to unix time relative to this
+EPOCH = datetime(1970, 1, 1)
+
+DEFAULT_CONFIG = {
+    "max_daily_rolls": 5,
+    "reset_hour": 0,  # Hour when daily rolls reset (UTC)
+    "min_players_for_ranking": 3
+}
+
+# Seconds the Telegram dice animation runs
+DICE_ANIMATION_SECONDS = 4
+
+class Player:
+    """
+    Compact record of one player.
+
+    Uses slots instead of a dict per player, keeps the last roll as unix
+    seconds instead of a datetime and interns usernames. Fields can still
+    be read and written by key, e.g. player["score"].
+    """
+
+    __slots__ = ('score', 'rolls_today', 'last_roll_ts', '_username')
+
+    FIELDS = ('score', 'rolls_today', 'last_roll', 'username')
+
+    def __init__(self, score: int = 0, rolls_today: int = 0,
+                 last_roll: Optional[datetime] = None, username: Optional[str] = None):
+        self.score = score
+        self.rolls_today = rolls_today
+        self.last_roll = last_roll
+        self.username = username
+
+    @property
+    def last_roll(self) -> Optional[datetime]:
+        """Time (naive UTC) of the last roll."""
+        if self.last_roll_ts is None:
+            return None
+        return EPOCH + timedelta(seconds=self.last_roll_ts)
+
+    @last_roll.setter
+    def last_roll(self, value: Optional[datetime]) -> None:
+        self.last_roll_ts = None if value is None else (value - EPOCH).total_seconds()
+
+    @property
+    def username(self) -> Optional[str]:
+        """Telegram username."""
+        return self._username
+
+    @username.setter
+    def username(self, value: Optional[str]) -> None:
+        self._username = sys.intern(value) if value else value
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.FIELDS
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Get a field by key like dict.get."""
+        return self[key] if key in self.FIELDS else default
+
+    def keys(self) -> Tuple[str, ...]:
+        """Get the field names, so dict(player) works."""
+        return self.FIELDS
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Player":
+        """Build a record from player data in the old dict format."""
+        last_roll = data.get("last_roll")
+        if isinstance(last_roll, str):
+            last_roll = datetime.fromisoformat(last_roll)
+        return cls(data.get("score", 0), data.get("rolls_today", 0), last_roll, data.get("username"))
+
+    def encode(self) -> str:
+        """Encode the record for the state store."""
+        return json.dumps([self.score, self.rolls_today, self.last_roll_ts, self.username],
+                          separators=(',', ':'))
+
+    @classmethod
+    def decode(cls, raw: str) -> "Player":
+        """Decode a stored record, also accepting the old dict format."""
+        data = json.loads(raw)
+        if isinstance(data, dict):
+            return cls.from_dict(data)
+        player = cls(data[0], data[1], None, data[3])
+        player.last_roll_ts = data[2]
+        return player
 
 class DiceMMOBot(BaseTelegramBot):
     """
@@ -25,70 +125,114 @@ class DiceMMOBot(BaseTelegramBot):
             description="Multiplayer dice rolling game with scoreboards",
             config=config or {}
         )
-        # Player data: {user_id: {"score": int, "rolls_today": int, "last_roll": datetime}}
-        self.players: Dict[int, Dict] = {}
-        # Default configuration
-        self.config.update({
-            "max_daily_rolls": 5,
-            "reset_hour": 0,  # Hour when daily rolls reset (UTC)
-            "min_players_for_ranking": 3
+        # Player records by user id
+        self._players = self.state.namespace('players', encode=Player.encode, decode=Player.decode, key_type=int)
+        # Running totals: total_players, total_score, active_day and active_players
+        self.stats = self.state.namespace('stats')
+        # Default configuration, overridden by the bot's own
+        for key, value in DEFAULT_CONFIG.items():
+            self.config.setdefault(key, value)
+        # Score rankings by all-time, daily and weekly window
+        self.leaderboard = create_leaderboard(token, self.config)
+    
+    @property
+    def players(self) -> StateMap:
+        """Persistent player data by user id."""
+        return self._players
+    
+    @players.setter
+    def players(self, data: Dict[int, Union[Player, Dict]]) -> None:
+        self._players.replace({
+            user_id: player if isinstance(player, Player) else Player.from_dict(player)
+            for user_id, player in data.items()
+        })
+        self._rebuild_stats()
+    
+    async def on_state_loaded(self) -> None:
+        """Rebuild derived data that was not persisted."""
+        if "total_players" not in self.stats:
+            # State saved before the running totals existed
+            self._rebuild_stats()
+        scores = {user_id: p.score for user_id, p in self.players.items()}
+        if isinstance(self.leaderboard, MemoryLeaderboard):
+            self.leaderboard.seed(scores)
+        else:
+            # Players saved before the Redis leaderboard existed are not ranked yet
+            await self.leaderboard.seed(scores)
+    
+    def _rebuild_stats(self) -> None:
+        """Recompute the running totals from all players."""
+        today = self._today()
+        self.stats.replace({
+            "total_players": len(self.players),
+            "total_score": sum(p.score for p in self.players.values()),
+            "active_day": today,
+            "active_players": sum(1 for p in self.players.values() if self._rolls_today(p, today))
         })
     
-    def _get_player_data(self, user_id: int) -> Dict:
+    def _today(self) -> int:
+        """Get the index of the current game day."""
+        return day_index(time.time(), self.config["reset_hour"])
+    
+    def _rolls_today(self, player: Player, today: int) -> int:
+        """Get a player's rolls on a game day; older counts expire implicitly."""
+        if player.last_roll_ts is None:
+            return 0
+        if day_index(player.last_roll_ts, self.config["reset_hour"]) != today:
+            return 0
+        return player.rolls_today
+    
+    def _get_player_data(self, user_id: int) -> Player:
         """Get or create player data."""
         if user_id not in self.players:
-            self.players[user_id] = {
-                "score": 0,
-                "rolls_today": 0,
-                "last_roll": None,
-                "username": None
-            }
+            self.players[user_id] = Player()
+            self.stats["total_players"] = self.stats.get("total_players", 0) + 1
         return self.players[user_id]
     
     def _can_roll(self, user_id: int) -> Tuple[bool, str]:
         """Check if user can roll dice."""
         player = self._get_player_data(user_id)
+        today = self._today()
+        if self._rolls_today(player, today) < self.config["max_daily_rolls"]:
+            return True, ""
         
-        # Check if it's a new day
-        if player["last_roll"]:
-            now = datetime.utcnow()
-            reset_time = now.replace(
-                hour=self.config["reset_hour"],
-                minute=0,
-                second=0,
-                microsecond=0
-            )
-            if now < reset_time:
-                reset_time -= timedelta(days=1)
-            
-            if player["last_roll"] < reset_time:
-                player["rolls_today"] = 0
-        
-        if player["rolls_today"] >= self.config["max_daily_rolls"]:
-            next_reset = datetime.utcnow().replace(
-                hour=self.config["reset_hour"],
-                minute=0,
-                second=0,
-                microsecond=0
-            )
-            if next_reset < datetime.utcnow():
-                next_reset += timedelta(days=1)
-            
-            time_left = next_reset - datetime.utcnow()
-            hours = int(time_left.total_seconds() // 3600)
-            minutes = int((time_left.total_seconds() % 3600) // 60)
-            
-            return False, f"No rolls left today. Next reset in {hours}h {minutes}m"
+        # The next game day starts at the reset hour
+        time_left = (today + 1) * 86400 + self.config["reset_hour"] * 3600 - time.time()
+        hours = int(time_left // 3600)
+        minutes = int((time_left % 3600) // 60)
+        return False, f"No rolls left today. Next reset in {hours}h {minutes}m"
+    
+    def _record_roll(self, user_id: int, player: Player, value: int) -> None:
+        """Add a roll to a player and the running totals."""
+        today = self._today()
+        rolls = self._rolls_today(player, today)
+        player.score += value
+        player.rolls_today = rolls + 1
+        player.last_roll_ts = time.time()
+        self.players.touch(user_id)
         
-        return True, ""
+        self.stats["total_score"] = self.stats.get("total_score", 0) + value
+        if rolls == 0:
+            # First roll of the player today
+            if self.stats.get("active_day") != today:
+                self.stats["active_day"] = today
+                self.stats["active_players"] = 0
+            self.stats["active_players"] += 1
     
-    def _get_leaderboard(self, limit: int = 10) -> List[Tuple[int, str, int]]:
-        """Get sorted leaderboard data."""
-        leaderboard = [
-            (user_id, data["username"] or f"Player{user_id}", data["score"])
-            for user_id, data in self.players.items()
-        ]
-        return sorted(leaderboard, key=lambda x: x[2], reverse=True)[:limit]
+    def _active_today(self) -> int:
+        """Get the number of players who rolled on the current game day."""
+        if self.stats.get("active_day") != self._today():
+            return 0
+        return self.stats.get("active_players", 0)
+    
+    async def _get_leaderboard(self, limit: int = 10, window: str = 'all') -> List[Tuple[int, str, int]]:
+        """Get the top players of a leaderboard window."""
+        leaderboard = []
+        for user_id, score in await self.leaderboard.top(window, limit):
+            player = self.players.get(user_id)
+            username = player.username if player else None
+            leaderboard.append((user_id, username or f"Player{user_id}", int(score)))
+        return leaderboard
     
     @bot_command("start", "Start the game")
     async def cmd_start(self, update, context):
@@ -116,7 +260,7 @@ class DiceMMOBot(BaseTelegramBot):
             "*Commands:*\n"
             "• `/roll` - Roll the dice\n"
             "• `/score` - Check your score\n"
-            "• `/leaderboard` - View top players\n"
+            "• `/leaderboard [daily|weekly]` - View top players\n"
             "• `/history` - View your roll history"
         )
         await update.message.reply_text(help_text, parse_mode='Markdown')
@@ -129,7 +273,9 @@ class DiceMMOBot(BaseTelegramBot):
         
         # Update username
         player = self._get_player_data(user_id)
-        player["username"] = username
+        if player.username != username:
+            player.username = username
+            self.players.touch(user_id)
         
         # Check if user can roll
         can_roll, message = self._can_roll(user_id)
@@ -142,17 +288,20 @@ class DiceMMOBot(BaseTelegramBot):
         value = dice_message.dice.value
         
         # Update player data
-        player["score"] += value
-        player["rolls_today"] += 1
-        player["last_roll"] = datetime.utcnow()
+        self._record_roll(user_id, player, value)
+        await self.leaderboard.add(user_id, value)
         
         # Send result message
-        rolls_left = self.config["max_daily_rolls"] - player["rolls_today"]
-        await asyncio.sleep(4)  # Wait for dice animation
-        await update.message.reply_text(
-            f"🎯 You rolled a {value}!\n"
-            f"📊 Your total score: {player['score']}\n"
-            f"🎲 Rolls left today: {rolls_left}"
+        # Reply once the dice animation is over, without holding the handler
+        rolls_left = self.config["max_daily_rolls"] - player.rolls_today
+        self.schedule_send(
+            DICE_ANIMATION_SECONDS,
+            chat_id=update.effective_chat.id,
+            text=(
+                f"🎯 You rolled a {value}!\n"
+                f"📊 Your total score: {player.score}\n"
+                f"🎲 Rolls left today: {rolls_left}"
+            )
         )
     
     @bot_command("score", "Check your score")
@@ -160,31 +309,42 @@ class DiceMMOBot(BaseTelegramBot):
         """Show player's score."""
         user_id = update.effective_user.id
         player = self._get_player_data(user_id)
+        rank = await self.leaderboard.rank(user_id)
         
         await update.message.reply_text(
             f"📊 *Your Stats*\n"
-            f"Score: {player['score']}\n"
-            f"Rolls today: {player['rolls_today']}/{self.config['max_daily_rolls']}",
+            f"Score: {player.score}\n"
+            f"Rank: {f'#{rank[0]}' if rank else '-'}\n"
+            f"Rolls today: {self._rolls_today(player, self._today())}/{self.config['max_daily_rolls']}",
             parse_mode='Markdown'
         )
     
     @bot_command("leaderboard", "View top players")
     async def cmd_leaderboard(self, update, context):
-        """Show leaderboard."""
-        leaderboard = self._get_leaderboard()
+        """Show the leaderboard of a window (all, daily or weekly)."""
+        window = context.args[0].lower() if context.args else 'all'
+        if window not in WINDOWS:
+            await update.message.reply_text("❌ Usage: /leaderboard [all|daily|weekly]")
+            return
         
-        if len(leaderboard) < self.config["min_players_for_ranking"]:
+        if await self.leaderboard.size(window) < self.config["min_players_for_ranking"]:
             await update.message.reply_text(
                 f"❌ Not enough players yet! Need at least "
                 f"{self.config['min_players_for_ranking']} players."
             )
             return
         
-        text = ["🏆 *Leaderboard*\n"]
+        leaderboard = await self._get_leaderboard(window=window)
+        title = {'all': "Leaderboard", 'daily': "Today's Leaderboard", 'weekly': "This Week's Leaderboard"}[window]
+        text = [f"🏆 *{title}*\n"]
         for i, (user_id, username, score) in enumerate(leaderboard, 1):
             medal = {1: "🥇", 2: "🥈", 3: "🥉"}.get(i, "•")
             text.append(f"{medal} {username}: {score}")
         
+        rank = await self.leaderboard.rank(update.effective_user.id, window)
+        if rank and rank[0] > len(leaderboard):
+            text.append(f"\nYour rank: #{rank[0]} ({int(rank[1])})")
+        
         await update.message.reply_text(
             "\n".join(text),
             parse_mode='Markdown'
@@ -193,12 +353,9 @@ class DiceMMOBot(BaseTelegramBot):
     @bot_command("stats", "View game statistics", admin_only=True)
     async def cmd_stats(self, update, context):
         """Show game statistics (admin only)."""
-        total_players = len(self.players)
-        total_score = sum(p["score"] for p in self.players.values())
-        active_today = sum(
-            1 for p in self.players.values()
-            if p["last_roll"] and p["last_roll"].date() == datetime.utcnow().date()
-        )
+        total_players = self.stats.get("total_players", 0)
+        total_score = self.stats.get("total_score", 0)
+        active_today = self._active_today()
         
         stats = (
             "📈 *Game Statistics*\n"
@@ -3,10 +3,17 @@ Number Converter Bot
 Converts numbers to words and vice versa in multiple languages.
 """
 
+import os
+import time
+import asyncio
+import logging
 from num2words import num2words
 from word2number import w2n
 from typing import Dict, Optional
 from app.bot_framework import BaseTelegramBot, bot_command, bot_handler
+from app.bot_framework.cache import TTLCache
+
+logger = logging.getLogger(__name__)
 
 class NumberConverterBot(BaseTelegramBot):
     """
@@ -35,7 +42,85 @@ class NumberConverterBot(BaseTelegramBot):
             config=config or {}
         )
         # User language preferences: {user_id: language_code}
-        self.user_languages: Dict[int, str] = {}
+        self.user_languages = self.state.namespace('user_languages', key_type=int)
+        # Conversion results: {(number, language): words} and {normalized text: number}
+        cache_size = int(self.config.get('conversion_cache_size') or os.getenv('CONVERSION_CACHE_SIZE', '10000'))
+        self.words_cache = TTLCache(maxsize=cache_size)
+        self.numbers_cache = TTLCache(maxsize=cache_size)
+    
+    async def on_state_loaded(self) -> None:
+        """Warm up the conversion cache before updates are handled."""
+        await asyncio.get_running_loop().run_in_executor(None, self.warm_up)
+    
+    def warm_up(self, count: Optional[int] = None) -> int:
+        """
+        Convert the numbers 0 to count - 1 in every supported language ahead of time.
+        
+        Args:
+            count: Numbers per language, defaults to the conversion_cache_warmup
+                config key or CONVERSION_CACHE_WARMUP (0 disables warm-up)
+            
+        Returns:
+            Number of cached conversions
+        """
+        if count is None:
+            count = int(self.config.get('conversion_cache_warmup') or os.getenv('CONVERSION_CACHE_WARMUP', '0'))
+        # Never evict warmed entries with other warmed entries
+        count = min(count, self.words_cache.maxsize // len(self.SUPPORTED_LANGUAGES))
+        if count <= 0:
+            return 0
+        
+        started = time.perf_counter()
+        cached = 0
+        for lang in self.SUPPORTED_LANGUAGES:
+            try:
+                for number in range(count):
+                    # Handlers convert floats, so warm the same keys
+                    self.words_cache.set((float(number), lang), num2words(float(number), lang=lang))
+                    cached += 1
+            except NotImplementedError:
+                logger.warning(f"Skipped conversion cache warm-up for unsupported language {lang}")
+        logger.info(f"Warmed up {cached} conversions in {time.perf_counter() - started:.1f}s")
+        return cached
+    
+    def to_words(self, number: float, lang: str) -> str:
+        """
+        Convert a number to words, using the conversion cache.
+        
+        Raises:
+            NotImplementedError: If the language is not supported by num2words
+        """
+        key = (number, lang)
+        words = self.words_cache.get(key)
+        if words is not None:
+            self.metrics.incr('cache.words.hits')
+            return words
+        self.metrics.incr('cache.words.misses')
+        words = num2words(number, lang=lang)
+        self.words_cache.set(key, words)
+        return words
+    
+    def to_number(self, text: str) -> int:
+        """
+        Convert English words to a number, using the conversion cache.
+        
+        Raises:
+            ValueError: If the text is not a number
+        """
+        # Case and spacing do not change the result
+        normalized = ' '.join(text.lower().split())
+        number = self.numbers_cache.get(normalized)
+        if number is not None:
+            self.metrics.incr('cache.numbers.hits')
+            return number
+        self.metrics.incr('cache.numbers.misses')
+        number = w2n.word_to_num(normalized)
+        self.numbers_cache.set(normalized, number)
+        return number
+    
+    def cache_stats(self) -> Dict[str, Dict]:
+        """Get hit and eviction statistics of the conversion caches."""
+        return {'words': self.words_cache.stats(), 'numbers': self.numbers_cache.stats()}
     
     def get_user_language(self, user_id: int) -> str:
         """Get user's preferred language or default to English."""
@@ -118,7 +203,7 @@ class NumberConverterBot(BaseTelegramBot):
         try:
             number = float(context.args[0])
             lang = self.get_user_language(update.effective_user.id)
-            words = num2words(number, lang=lang)
+            words = self.to_words(number, lang)
             await update.message.reply_text(
                 f"🔢 {number}\n"
                 f"✍️ {words.capitalize()}"
@@ -147,7 +232,7 @@ class NumberConverterBot(BaseTelegramBot):
         text = ' '.join(context.args)
         try:
             # Note: word2number currently only supports English
-            number = w2n.word_to_num(text)
+            number = self.to_number(text)
             await update.message.reply_text(
                 f"✍️ {text}\n"
                 f"🔢 {number}"
@@ -164,7 +249,7 @@ class NumberConverterBot(BaseTelegramBot):
         try:
             number = float(update.message.text)
             lang = self.get_user_language(update.effective_user.id)
-            words = num2words(number, lang=lang)
+            words = self.to_words(number, lang)
             await update.message.reply_text(
                 f"🔢 {number}\n"
                 f"✍️ {words.capitalize()}"
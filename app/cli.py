@@ -0,0 +1,56 @@
+"""
+Maintenance commands for the management application.
+"""
+
+import click
+import logging
+from app import db
+
+logger = logging.getLogger(__name__)
+
+def register_commands(app):
+    """Register the maintenance commands with the Flask CLI."""
+    app.cli.add_command(backfill_fingerprints)
+
+@click.command('backfill-fingerprints')
+def backfill_fingerprints():
+    """Fill in missing token fingerprints and drop legacy containers and Redis entries."""
+    from app.models import TelegramBot
+    from app.bot_framework.heartbeat import clear_heartbeat
+    from app.bot_framework.redis_client import get_redis
+    from app.bot_framework.status_index import StatusIndex
+
+    bots = TelegramBot.query.filter(
+        TelegramBot.token_fingerprint.is_(None),
+        TelegramBot.bot_token.isnot(None)
+    ).all()
+    for bot in bots:
+        # Assigning the token again sets the fingerprint
+        bot.bot_token = bot.bot_token
+    db.session.commit()
+
+    try:
+        client = get_redis()
+        index = StatusIndex(client)
+        for bot in bots:
+            # Entries written under the raw token before fingerprints existed
+            index.forget(bot.bot_token)
+            clear_heartbeat(client, bot.bot_token)
+    except Exception as e:
+        logger.warning(f"Could not remove legacy Redis entries: {str(e)}")
+
+    # Containers named after the token are invisible to stop_bot and the
+    # fleet controller, which would start a second runner for the same bot
+    removed = 0
+    try:
+        from app.bot_framework.container_manager import ContainerManager
+        manager = ContainerManager()
+        for bot in bots:
+            removed += manager.remove_legacy_container(bot.bot_token)
+    except Exception as e:
+        logger.warning(f"Could not remove legacy bot containers: {str(e)}")
+
+    click.echo(
+        f"Backfilled {len(bots)} token fingerprints, removed {removed} legacy containers; "
+        f"the fleet controller restarts bots that should run"
+    )
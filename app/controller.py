@@ -0,0 +1,175 @@
+"""
+Declarative desired-state controller for the bot fleet.
+
+The database holds the desired state of every managed bot, Docker and
+Redis hold the actual state. Each cycle computes the difference and
+submits the minimal set of start, stop and restart commands through the
+lifecycle queue, bounded by an in-flight cap, a per-cycle action budget
+and a per-bot cooldown.
+"""
+
+import os
+import json
+import time
+import logging
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+ACTIONS_KEY = 'controller:actions'
+STATS_KEY = 'controller:stats'
+
+# Number of recorded actions kept in Redis
+ACTIONS_HISTORY = 1000
+
+def cooldown_key(bot_id: int) -> str:
+    """Key preventing repeated actions on the same bot."""
+    return f"controller:cooldown:{bot_id}"
+
+def plan_actions(bots: Iterable[Dict], running_containers: Set[str], statuses: Dict[str, Dict],
+                 live_fingerprints: Set[str]) -> List[Dict]:
+    """
+    Compute the actions that move bots towards their desired state.
+
+    Args:
+        bots: Dicts with id, fingerprint, container and desired state of managed bots
+        running_containers: Names of running bot containers
+        statuses: Reported Redis statuses by bot fingerprint
+        live_fingerprints: Fingerprints of bots with a recent heartbeat
+
+    Returns:
+        List of actions with bot id, action and reason
+    """
+    actions = []
+    for bot in bots:
+        container_running = bot['container'] in running_containers
+        status = statuses.get(bot['fingerprint'], {}).get('status', 'unknown')
+
+        if bot['desired'] == 'running':
+            if not container_running:
+                actions.append({'bot_id': bot['id'], 'action': 'start', 'reason': 'container not running'})
+            elif status == 'error':
+                actions.append({'bot_id': bot['id'], 'action': 'restart', 'reason': 'runner reported error'})
+            elif status == 'running' and bot['fingerprint'] not in live_fingerprints:
+                actions.append({'bot_id': bot['id'], 'action': 'restart', 'reason': 'heartbeat missing'})
+        elif bot['desired'] == 'stopped' and container_running:
+            actions.append({'bot_id': bot['id'], 'action': 'stop', 'reason': 'container running'})
+    return actions
+
+class FleetController:
+    """
+    Converges actual bot state towards the desired state.
+
+    Attributes:
+        max_actions (int): Maximum commands submitted per cycle
+        max_in_flight (int): Maximum pending lifecycle commands with a live task
+        cooldown (int): Seconds before the same bot is acted on again
+    """
+
+    def __init__(self, monitor, container_manager, lifecycle, submit: Callable[[int, str], bool],
+                 max_actions: Optional[int] = None, max_in_flight: Optional[int] = None,
+                 cooldown: Optional[int] = None):
+        """
+        Initialize the controller.
+
+        Args:
+            monitor: BotMonitor used to read reported statuses and liveness
+            container_manager: ContainerManager used to list running containers
+            lifecycle: LifecycleQueue used to read the in-flight command count
+            submit: Callable submitting a lifecycle command for a bot id
+            max_actions: Defaults to CONTROLLER_MAX_ACTIONS (20)
+            max_in_flight: Defaults to CONTROLLER_MAX_IN_FLIGHT (10)
+            cooldown: Defaults to CONTROLLER_COOLDOWN (120)
+        """
+        self.monitor = monitor
+        self.redis = monitor.redis
+        self.container_manager = container_manager
+        self.lifecycle = lifecycle
+        self.submit = submit
+        self.max_actions = max_actions or int(os.getenv('CONTROLLER_MAX_ACTIONS', '20'))
+        self.max_in_flight = max_in_flight or int(os.getenv('CONTROLLER_MAX_IN_FLIGHT', '10'))
+        self.cooldown = cooldown or int(os.getenv('CONTROLLER_COOLDOWN', '120'))
+
+    def observe(self, bots: List[Dict]) -> Dict:
+        """
+        Collect the actual state of the given bots.
+
+        Returns:
+            Dict with running container names, statuses and live fingerprints
+        """
+        running_containers = {
+            container['name'] for container in self.container_manager.list_bots()
+            if container['status'] == 'running'
+        }
+        statuses = self.monitor.get_bot_statuses([bot['fingerprint'] for bot in bots]) if bots else {}
+        live_fingerprints = self.monitor.get_live_among([bot['fingerprint'] for bot in bots]) if bots else set()
+        return {
+            'running_containers': running_containers,
+            'statuses': statuses,
+            'live_fingerprints': live_fingerprints
+        }
+
+    def apply(self, actions: List[Dict]) -> Dict[str, int]:
+        """
+        Submit planned actions within the concurrency and rate limits.
+
+        Returns:
+            Dict with submitted, cooling down and deferred action counts
+        """
+        budget = min(self.max_actions, max(0, self.max_in_flight - self.lifecycle.in_flight()))
+        submitted = cooling = 0
+        for action in actions:
+            if submitted >= budget:
+                break
+            if not self.redis.set(cooldown_key(action['bot_id']), action['action'], nx=True, ex=self.cooldown):
+                cooling += 1
+                continue
+            self.submit(action['bot_id'], action['action'])
+            submitted += 1
+            self._record(action)
+            logger.info(f"Controller {action['action']} bot {action['bot_id']}: {action['reason']}")
+        return {
+            'submitted': submitted,
+            'cooling_down': cooling,
+            'deferred': len(actions) - submitted - cooling
+        }
+
+    def run_once(self, bots: List[Dict]) -> Dict:
+        """
+        Run one reconciliation cycle.
+
+        Args:
+            bots: Managed bots with id, fingerprint, container and desired state
+
+        Returns:
+            Dict with cycle statistics
+        """
+        started = time.monotonic()
+        observed = self.observe(bots)
+        actions = plan_actions(
+            bots,
+            observed['running_containers'],
+            observed['statuses'],
+            observed['live_fingerprints']
+        )
+        stats = self.apply(actions)
+        stats.update({
+            'managed': len(bots),
+            'planned': len(actions),
+            'duration_ms': round((time.monotonic() - started) * 1000, 1),
+            'last_run': time.time()
+        })
+        self.redis.hset(STATS_KEY, mapping=stats)
+        return stats
+
+    def recent_actions(self, limit: int = 50) -> List[Dict]:
+        """Get the most recently submitted actions."""
+        return [json.loads(entry) for entry in self.redis.lrange(ACTIONS_KEY, 0, limit - 1)]
+
+    def _record(self, action: Dict) -> None:
+        """Append an action to the bounded history."""
+        entry = dict(action, at=time.time())
+        pipe = self.redis.pipeline()
+        pipe.lpush(ACTIONS_KEY, json.dumps(entry))
+        pipe.ltrim(ACTIONS_KEY, 0, ACTIONS_HISTORY - 1)
+        pipe.execute()
@@ -0,0 +1,69 @@
+"""
+Read-replica routing for the Flask-SQLAlchemy session.
+
+Replica URLs from SQLALCHEMY_REPLICA_URLS are registered as extra binds.
+Inside a request, plain SELECT statements go to a random replica.
+Flushes, DML, raw SQL text and anything else that is not a plain SELECT
+go to the primary, as does every read after a write in the same
+transaction. After a user commits a write, their following requests read
+from the primary for REPLICA_STICKY_SECONDS (stored in the Flask session
+cookie) so they see their own changes. Code outside requests (Celery
+tasks, CLI) always uses the primary.
+"""
+
+import random
+import time
+from flask import current_app, has_request_context, session as flask_session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.sql import Select
+
+REPLICA_BIND_PREFIX = 'replica_'
+
+# Flask session key holding the time until which reads use the primary
+STICKY_SESSION_KEY = '_db_primary_until'
+
+def replica_binds(urls) -> dict:
+    """Build SQLALCHEMY_BINDS entries for replica URLs."""
+    return {f"{REPLICA_BIND_PREFIX}{i}": url for i, url in enumerate(urls)}
+
+def _is_read(clause) -> bool:
+    """Check whether a statement is a plain SELECT that a replica can answer."""
+    # Text and other statements may write, and SELECT ... FOR UPDATE locks rows
+    return isinstance(clause, Select) and getattr(clause, '_for_update_arg', None) is None
+
+def _primary_pinned() -> bool:
+    """Check whether the current user recently wrote and must read the primary."""
+    return flask_session.get(STICKY_SESSION_KEY, 0) > time.time()
+
+class RoutingSession(Session):
+    """Session sending reads to replicas and writes to the primary."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and clause is not None and not _is_read(clause):
+            self.info['wrote'] = True
+        elif (bind is None and _is_read(clause) and not self._flushing
+              and not self.info.get('wrote') and has_request_context()):
+            replicas = [
+                engine for key, engine in self._db.engines.items()
+                if key and key.startswith(REPLICA_BIND_PREFIX)
+            ]
+            if replicas and not _primary_pinned():
+                return random.choice(replicas)
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _mark_flushed(session, flush_context):
+    """Keep the rest of the transaction on the primary after a flush."""
+    session.info['wrote'] = True
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _pin_after_commit(session):
+    """Send the writing user's next requests to the primary."""
+    if session.info.pop('wrote', False) and has_request_context():
+        flask_session[STICKY_SESSION_KEY] = time.time() + current_app.config.get('REPLICA_STICKY_SECONDS', 5)
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _reset_after_rollback(session):
+    """Forget writes that were rolled back."""
+    session.info.pop('wrote', None)
@@ -17,14 +17,16 @@ class RegistrationForm(FlaskForm):
 
 from wtforms import SelectField
 
+BOT_TYPE_CHOICES = [
+    ('number_converter', 'Number Converter Bot'),
+    ('dice_mmo', 'Dice MMO Game Bot')
+]
+
 class BotRegistrationForm(FlaskForm):
     bot_token = StringField('Bot Token', 
         validators=[DataRequired(), Length(min=40, max=46)])
     bot_type = SelectField('Bot Type',
-        choices=[
-            ('number_converter', 'Number Converter Bot'),
-            ('dice_mmo', 'Dice MMO Game Bot')
-        ],
+        choices=BOT_TYPE_CHOICES,
         validators=[DataRequired()])
     webhook_url = StringField('Webhook URL',
         validators=[DataRequired(), URL()])
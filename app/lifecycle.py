@@ -0,0 +1,181 @@
+"""
+Coalescing lifecycle command queue.
+
+Lifecycle commands (start, stop, restart) are not queued one by one.
+Each bot has a single desired-state slot in Redis that the latest command
+overwrites, and at most one worker task per bot is queued at a time. The
+worker executes only the newest intent under a per-bot lock, so double
+clicks and repeated restarts collapse into one piece of Docker work.
+
+A slot whose task was enqueued longer than the lock timeout ago is
+treated as orphaned (the message was lost or the worker died), and the
+next command for that bot enqueues a task again instead of collapsing.
+"""
+
+import time
+import logging
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+ACTIONS = ('start', 'stop', 'restart')
+
+PENDING_KEY = 'lifecycle:pending'
+STATS_KEY = 'lifecycle:stats'
+
+# KEYS[1] intent hash, KEYS[2] pending set, KEYS[3] stats
+# ARGV[1] bot id, ARGV[2] action, ARGV[3] submit time, ARGV[4] orphan age
+_SUBMIT_SCRIPT = """
+redis.call('HINCRBY', KEYS[1], 'seq', 1)
+redis.call('HSET', KEYS[1], 'action', ARGV[2], 'submitted_at', ARGV[3])
+redis.call('HINCRBY', KEYS[3], 'submitted', 1)
+if redis.call('SADD', KEYS[2], ARGV[1]) == 1 then
+    redis.call('HSET', KEYS[1], 'enqueued_at', ARGV[3])
+    return 1
+end
+local enqueued_at = tonumber(redis.call('HGET', KEYS[1], 'enqueued_at'))
+if not enqueued_at or enqueued_at < tonumber(ARGV[3]) - tonumber(ARGV[4]) then
+    redis.call('HSET', KEYS[1], 'enqueued_at', ARGV[3])
+    redis.call('HINCRBY', KEYS[3], 'orphaned', 1)
+    return 1
+end
+redis.call('HINCRBY', KEYS[3], 'collapsed', 1)
+return 0
+"""
+
+# KEYS[1] intent hash, KEYS[2] pending set, KEYS[3] stats
+# ARGV[1] bot id, ARGV[2] executed sequence number
+_COMPLETE_SCRIPT = """
+redis.call('HINCRBY', KEYS[3], 'executed', 1)
+if redis.call('HGET', KEYS[1], 'seq') == ARGV[2] then
+    redis.call('DEL', KEYS[1])
+    redis.call('SREM', KEYS[2], ARGV[1])
+    return 1
+end
+redis.call('HINCRBY', KEYS[3], 'superseded', 1)
+return 0
+"""
+
+def intent_key(bot_id: int) -> str:
+    """Hash holding the latest requested lifecycle action of a bot."""
+    return f"lifecycle:intent:{bot_id}"
+
+def lock_key(bot_id: int) -> str:
+    """Lock serializing lifecycle work for a bot."""
+    return f"lifecycle:lock:{bot_id}"
+
+class LifecycleQueue:
+    """Per-bot latest-wins lifecycle command slots in Redis."""
+
+    def __init__(self, client, lock_timeout: int = 300):
+        """
+        Initialize the queue.
+
+        Args:
+            client: Redis client
+            lock_timeout: Seconds after which a crashed worker's lock expires
+        """
+        self.redis = client
+        self.lock_timeout = lock_timeout
+        self._submit = client.register_script(_SUBMIT_SCRIPT)
+        self._complete = client.register_script(_COMPLETE_SCRIPT)
+
+    def submit(self, bot_id: int, action: str) -> bool:
+        """
+        Record the desired lifecycle action of a bot.
+
+        Args:
+            bot_id: Bot id
+            action: One of ACTIONS
+
+        Returns:
+            True if a worker task must be enqueued, False if the command
+            was collapsed into one that is already pending; an orphaned
+            slot counts as not pending
+
+        Raises:
+            ValueError: If the action is unknown
+        """
+        if action not in ACTIONS:
+            raise ValueError(f"Invalid lifecycle action: {action}")
+        return bool(self._submit(
+            keys=[intent_key(bot_id), PENDING_KEY, STATS_KEY],
+            args=[bot_id, action, time.time(), self.lock_timeout]
+        ))
+
+    def next_intent(self, bot_id: int) -> Optional[Tuple[str, str]]:
+        """
+        Get the latest pending action of a bot.
+
+        Returns:
+            Tuple of (action, sequence number) or None if nothing is pending
+        """
+        intent = self.redis.hmget(intent_key(bot_id), 'action', 'seq')
+        if not intent[0]:
+            return None
+        return intent[0].decode(), intent[1].decode()
+
+    def complete(self, bot_id: int, seq: str) -> bool:
+        """
+        Mark an action as executed.
+
+        Returns:
+            True if the slot was cleared, False if a newer action arrived
+            while the executed one was running
+        """
+        return bool(self._complete(
+            keys=[intent_key(bot_id), PENDING_KEY, STATS_KEY],
+            args=[bot_id, seq]
+        ))
+
+    def discard(self, bot_id: int) -> None:
+        """Drop a pending action, e.g. when its task could not be enqueued."""
+        pipe = self.redis.pipeline()
+        pipe.delete(intent_key(bot_id))
+        pipe.srem(PENDING_KEY, bot_id)
+        pipe.execute()
+
+    def lock(self, bot_id: int):
+        """Get the non-blocking per-bot lifecycle lock."""
+        return self.redis.lock(lock_key(bot_id), timeout=self.lock_timeout, blocking_timeout=0)
+
+    def depth(self) -> int:
+        """Get the number of bots with a pending lifecycle action."""
+        return self.redis.scard(PENDING_KEY)
+
+    def in_flight(self) -> int:
+        """
+        Get the number of pending actions that still have a task behind them.
+
+        A slot counts while its task was enqueued within the lock timeout or
+        its lock is held; orphaned slots are left out, as in submit().
+        """
+        bot_ids = [int(bot_id) for bot_id in self.redis.sscan_iter(PENDING_KEY)]
+        if not bot_ids:
+            return 0
+        pipe = self.redis.pipeline()
+        for bot_id in bot_ids:
+            pipe.hget(intent_key(bot_id), 'enqueued_at')
+            pipe.exists(lock_key(bot_id))
+        results = pipe.execute()
+        cutoff = time.time() - self.lock_timeout
+        return sum(
+            1 for enqueued_at, locked in zip(results[::2], results[1::2])
+            if locked or (enqueued_at is not None and float(enqueued_at) >= cutoff)
+        )
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Get queue metrics.
+
+        Returns:
+            Dict with queue depth, in-flight count and submitted, collapsed,
+            orphaned, executed and superseded command counts
+        """
+        stats = {
+            key.decode(): int(value)
+            for key, value in self.redis.hgetall(STATS_KEY).items()
+        }
+        stats['depth'] = self.depth()
+        stats['in_flight'] = self.in_flight()
+        return stats
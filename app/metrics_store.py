@@ -0,0 +1,233 @@
+"""
+Database storage of bot metrics.
+
+Closed per-minute Redis buckets written by the runners are added to
+minute, hour and day rows of bot_metric_buckets in one upsert, so
+downsampling costs nothing extra and range reads for charts only touch
+pre-aggregated rows. Each resolution is pruned after its own retention.
+
+Flushing is at-least-once: if a worker dies between the database commit
+and removing the Redis buckets, those minutes are counted twice.
+"""
+
+import os
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+from app import db
+from app.models import BotMetricBucket, TelegramBot
+from app.bot_framework.metrics import closed_buckets, delete_buckets, read_buckets
+
+logger = logging.getLogger(__name__)
+
+RESOLUTIONS = {
+    'minute': timedelta(minutes=1),
+    'hour': timedelta(hours=1),
+    'day': timedelta(days=1)
+}
+
+RETENTION = {
+    'minute': timedelta(hours=int(os.getenv('METRICS_MINUTE_RETENTION_HOURS', '48'))),
+    'hour': timedelta(days=int(os.getenv('METRICS_HOUR_RETENTION_DAYS', '30'))),
+    'day': timedelta(days=int(os.getenv('METRICS_DAY_RETENTION_DAYS', '365')))
+}
+
+# Hash of bot id -> counter bumped whenever new metrics of the bot are stored
+METRICS_VERSION_KEY = 'metrics:versions'
+
+# Rows per INSERT statement
+UPSERT_BATCH_SIZE = 500
+
+# Largest number of buckets a range read may return per metric
+MAX_QUERY_BUCKETS = 2000
+
+def bucket_start(moment: datetime, resolution: str) -> datetime:
+    """Truncate a datetime to the start of its bucket."""
+    if resolution == 'minute':
+        return moment.replace(second=0, microsecond=0)
+    if resolution == 'hour':
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def pick_resolution(start: datetime, end: datetime) -> str:
+    """Get the finest resolution that keeps a range within MAX_QUERY_BUCKETS."""
+    for resolution, step in RESOLUTIONS.items():
+        if (end - start) / step <= MAX_QUERY_BUCKETS:
+            return resolution
+    return 'day'
+
+def _upsert(rows: List[Dict]) -> None:
+    """Add values to existing bucket rows, creating missing ones."""
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        for row in rows:
+            bucket = BotMetricBucket.query.filter_by(
+                bot_id=row['bot_id'], resolution=row['resolution'],
+                bucket_start=row['bucket_start'], metric=row['metric']
+            ).first()
+            if bucket:
+                bucket.value += row['value']
+            else:
+                db.session.add(BotMetricBucket(**row))
+        return
+
+    for i in range(0, len(rows), UPSERT_BATCH_SIZE):
+        stmt = insert(BotMetricBucket).values(rows[i:i + UPSERT_BATCH_SIZE])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['bot_id', 'resolution', 'bucket_start', 'metric'],
+            set_={'value': BotMetricBucket.value + stmt.excluded.value}
+        )
+        db.session.execute(stmt)
+
+def flush_pending(client, now: Optional[float] = None, limit: int = 1000) -> Dict[str, int]:
+    """
+    Move closed minute buckets from Redis into the database.
+
+    Args:
+        client: Redis client
+        now: Current time (unix seconds)
+        limit: Maximum number of Redis buckets moved
+
+    Returns:
+        Dict with flushed bucket, dropped bucket and written row counts
+    """
+    buckets = closed_buckets(client, now=now, limit=limit)
+    if not buckets:
+        return {'buckets': 0, 'dropped': 0, 'rows': 0}
+
+    fingerprints = {fingerprint for _, fingerprint, _ in buckets}
+    bot_ids = dict(
+        db.session.query(TelegramBot.token_fingerprint, TelegramBot.id)
+        .filter(TelegramBot.token_fingerprint.in_(fingerprints))
+    )
+
+    keys = [key for key, _, _ in buckets]
+    totals: Dict[tuple, float] = defaultdict(float)
+    dropped = 0
+    for (key, fingerprint, minute), counters in zip(buckets, read_buckets(client, keys)):
+        bot_id = bot_ids.get(fingerprint)
+        if bot_id is None:
+            # The bot was deleted after reporting
+            dropped += 1
+            continue
+        moment = datetime.utcfromtimestamp(minute)
+        for resolution in RESOLUTIONS:
+            start = bucket_start(moment, resolution)
+            for metric, value in counters.items():
+                totals[(bot_id, resolution, start, metric[:64])] += value
+
+    rows = [
+        {'bot_id': bot_id, 'resolution': resolution, 'bucket_start': start, 'metric': metric, 'value': value}
+        for (bot_id, resolution, start, metric), value in totals.items()
+    ]
+    if rows:
+        _upsert(rows)
+        db.session.commit()
+        pipe = client.pipeline()
+        for bot_id in {row['bot_id'] for row in rows}:
+            pipe.hincrby(METRICS_VERSION_KEY, bot_id, 1)
+        pipe.execute()
+    delete_buckets(client, keys)
+
+    return {'buckets': len(buckets), 'dropped': dropped, 'rows': len(rows)}
+
+def prune(now: Optional[datetime] = None) -> Dict[str, int]:
+    """
+    Delete buckets older than their resolution's retention.
+
+    Returns:
+        Dict mapping resolutions to deleted row counts
+    """
+    now = now or datetime.utcnow()
+    deleted = {}
+    for resolution, retention in RETENTION.items():
+        deleted[resolution] = BotMetricBucket.query.filter(
+            BotMetricBucket.resolution == resolution,
+            BotMetricBucket.bucket_start < now - retention
+        ).delete(synchronize_session=False)
+    db.session.commit()
+    return deleted
+
+def _matches(metric: str, prefixes: Optional[Iterable[str]]) -> bool:
+    """Check whether a metric is selected by name or dotted prefix."""
+    return not prefixes or any(metric == p or metric.startswith(f"{p}.") for p in prefixes)
+
+def query_series(bot_id: int, start: datetime, end: datetime, resolution: Optional[str] = None,
+                 metrics: Optional[List[str]] = None) -> Dict:
+    """
+    Read metric time series of a bot.
+
+    Args:
+        bot_id: Bot id
+        start: Range start (UTC, inclusive)
+        end: Range end (UTC, exclusive)
+        resolution: minute, hour or day; picked from the range if None
+        metrics: Metric names or dotted prefixes (e.g. "commands"); all if None
+
+    Returns:
+        Dict with the resolution and a mapping of metric names to lists of
+        [bucket start, value] pairs. latency_ms.avg is derived from the
+        latency sum and count.
+
+    Raises:
+        ValueError: If the resolution is unknown or the range too large
+    """
+    resolution = resolution or pick_resolution(start, end)
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"Invalid resolution: {resolution}")
+    if (end - start) / RESOLUTIONS[resolution] > MAX_QUERY_BUCKETS:
+        raise ValueError(f"Range too large for {resolution} resolution")
+
+    rows = db.session.query(
+        BotMetricBucket.bucket_start, BotMetricBucket.metric, BotMetricBucket.value
+    ).filter(
+        BotMetricBucket.bot_id == bot_id,
+        BotMetricBucket.resolution == resolution,
+        BotMetricBucket.bucket_start >= bucket_start(start, resolution),
+        BotMetricBucket.bucket_start < end
+    ).order_by(BotMetricBucket.bucket_start)
+
+    series: Dict[str, List] = defaultdict(list)
+    latency: Dict[datetime, Dict[str, float]] = defaultdict(dict)
+    for moment, metric, value in rows:
+        if metric.startswith('latency_ms.'):
+            latency[moment][metric] = value
+        if _matches(metric, metrics):
+            series[metric].append([moment.isoformat(), value])
+    if _matches('latency_ms.avg', metrics):
+        for moment, values in sorted(latency.items()):
+            if values.get('latency_ms.count'):
+                series['latency_ms.avg'].append([
+                    moment.isoformat(),
+                    round(values.get('latency_ms.sum', 0) / values['latency_ms.count'], 2)
+                ])
+    return {'resolution': resolution, 'series': dict(series)}
+
+def summarize(bot_id: int, since: datetime) -> Dict[str, float]:
+    """
+    Total each metric of a bot over the hours since a point in time.
+
+    Returns:
+        Dict mapping metric names to totals, with latency_ms.avg derived
+    """
+    totals = dict(
+        db.session.query(BotMetricBucket.metric, db.func.sum(BotMetricBucket.value))
+        .filter(
+            BotMetricBucket.bot_id == bot_id,
+            BotMetricBucket.resolution == 'hour',
+            BotMetricBucket.bucket_start >= bucket_start(since, 'hour')
+        )
+        .group_by(BotMetricBucket.metric)
+    )
+    if totals.get('latency_ms.count'):
+        totals['latency_ms.avg'] = round(totals.get('latency_ms.sum', 0) / totals['latency_ms.count'], 2)
+    return totals
+
+def metrics_version(client, bot_id: int) -> int:
+    """Get the counter bumped whenever new metrics of a bot are stored."""
+    return int(client.hget(METRICS_VERSION_KEY, bot_id) or 0)
@@ -1,7 +1,10 @@
 from app import db, login_manager
 from flask_login import UserMixin
 from sqlalchemy import JSON
+from sqlalchemy.orm import validates
 from werkzeug.security import generate_password_hash, check_password_hash
+from datetime import datetime
+from app.bot_framework.keys import FINGERPRINT_LENGTH, token_fingerprint
 
 class User(UserMixin, db.Model):
     __tablename__ = 'users'
@@ -9,7 +12,7 @@ class User(UserMixin, db.Model):
     username = db.Column(db.String(64), index=True, unique=True)
     password_hash = db.Column(db.String(256))
     is_admin = db.Column(db.Boolean, default=False)
-    bots = db.relationship('TelegramBot', backref='owner', lazy='dynamic')
+    bots = db.relationship('TelegramBot', back_populates='owner', lazy='dynamic')
 
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
@@ -22,25 +25,35 @@ class User(UserMixin, db.Model):
 
 class TelegramBot(db.Model):
     __tablename__ = 'telegram_bots'
+    __table_args__ = (
+        # Keyset pagination of a user's bots, optionally filtered by status or type
+        db.Index('ix_telegram_bots_user_created', 'user_id', 'created_at', 'id'),
+        db.Index('ix_telegram_bots_user_status_created', 'user_id', 'status', 'created_at', 'id'),
+        db.Index('ix_telegram_bots_user_type_created', 'user_id', 'bot_type', 'created_at', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     bot_token = db.Column(db.String(120), unique=True)
-    bot_username = db.Column(db.String(64))
+    # Short hash of the token addressing the bot in Redis, container names and webhook paths
+    token_fingerprint = db.Column(db.String(FINGERPRINT_LENGTH), unique=True, index=True)
+    bot_username = db.Column(db.String(64), index=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
-    bot_type = db.Column(db.String(50), nullable=False)  # e.g., 'number_converter', 'dice_mmo'
+    owner = db.relationship('User', back_populates='bots')
+    bot_type = db.Column(db.String(50), nullable=False, index=True)  # e.g., 'number_converter', 'dice_mmo'
     config = db.Column(JSON)
-    status = db.Column(db.String(20), default='unknown')  # unknown, running, error
+    status = db.Column(db.String(20), default='unknown', index=True)  # unknown, running, error
+    desired_state = db.Column(db.String(20))  # running, stopped; NULL = not managed by the controller
     last_activity = db.Column(db.DateTime)
     error_message = db.Column(db.Text)
     webhook_url = db.Column(db.String(255))  # Full webhook URL
-    created_at = db.Column(db.DateTime, default=db.func.now())
+    # Set in Python so SQLite stores microseconds like the keyset cursors compare against
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, onupdate=db.func.now())
 
-    def update_stats(self, new_stats):
-        """Update bot statistics."""
-        current_stats = self.stats or {}
-        current_stats.update(new_stats)
-        self.stats = current_stats
-        self.last_activity = db.func.now()
+    @validates('bot_token')
+    def _set_fingerprint(self, key, bot_token):
+        """Keep the fingerprint in step with the token."""
+        self.token_fingerprint = token_fingerprint(bot_token) if bot_token else None
+        return bot_token
 
     def get_controller_class(self):
         """Get the appropriate bot controller class based on bot_type."""
@@ -53,6 +66,23 @@ class TelegramBot(db.Model):
         }
         return bot_types.get(self.bot_type)
 
+class BotMetricBucket(db.Model):
+    """Sum of one bot metric over a minute, hour or day."""
+    __tablename__ = 'bot_metric_buckets'
+    __table_args__ = (
+        # Range reads for one bot and resolution; also the upsert conflict target
+        db.UniqueConstraint('bot_id', 'resolution', 'bucket_start', 'metric', name='uq_bot_metric_buckets'),
+        # Retention deletes
+        db.Index('ix_bot_metric_buckets_resolution_start', 'resolution', 'bucket_start'),
+    )
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True)
+    bot_id = db.Column(db.Integer, db.ForeignKey('telegram_bots.id', ondelete='CASCADE'), nullable=False)
+    resolution = db.Column(db.String(10), nullable=False)  # minute, hour, day
+    bucket_start = db.Column(db.DateTime, nullable=False)  # UTC
+    metric = db.Column(db.String(64), nullable=False)  # e.g. updates.message, commands.roll, errors
+    value = db.Column(db.Float, nullable=False, default=0)
+
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
\ No newline at end of file
+    from app.user_cache import load_cached_user
+    return load_cached_user(int(user_id))
\ No newline at end of file
@@ -0,0 +1,166 @@
+"""
+Adaptive schedule for bot status monitoring.
+
+Each bot has its own next-check time in a Redis sorted set. Bots whose
+status changed are checked again soon, stable bots back off towards the
+maximum interval, and every interval is jittered so checks spread out
+instead of hitting Redis and the database in lockstep.
+"""
+
+import os
+import random
+import time
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DUE_KEY = 'monitor:due'
+INTERVAL_KEY = 'monitor:interval'
+SCHEDULE_STATS_KEY = 'monitor:schedule'
+
+class AdaptiveSchedule:
+    """
+    Per-bot monitoring schedule stored in Redis.
+
+    Attributes:
+        min_interval (float): Interval after a bot changed (seconds)
+        max_interval (float): Upper bound for stable bots (seconds)
+        backoff (float): Interval multiplier for each unchanged check
+        jitter (float): Relative random spread applied to every interval
+    """
+
+    def __init__(self, client, min_interval: Optional[float] = None, max_interval: Optional[float] = None,
+                 backoff: Optional[float] = None, jitter: Optional[float] = None):
+        """
+        Initialize the schedule.
+
+        Args:
+            client: Redis client
+            min_interval: Defaults to MONITOR_MIN_INTERVAL (15)
+            max_interval: Defaults to MONITOR_MAX_INTERVAL (300)
+            backoff: Defaults to MONITOR_BACKOFF (2.0)
+            jitter: Defaults to MONITOR_JITTER (0.2)
+        """
+        self.redis = client
+        self.min_interval = min_interval or float(os.getenv('MONITOR_MIN_INTERVAL', '15'))
+        self.max_interval = max_interval or float(os.getenv('MONITOR_MAX_INTERVAL', '300'))
+        self.backoff = backoff or float(os.getenv('MONITOR_BACKOFF', '2.0'))
+        self.jitter = jitter if jitter is not None else float(os.getenv('MONITOR_JITTER', '0.2'))
+
+    def next_interval(self, previous: Optional[float], changed: bool) -> float:
+        """
+        Compute the next (unjittered) check interval of a bot.
+
+        Args:
+            previous: Previous interval or None for new bots
+            changed: Whether the bot's status changed in the last check
+
+        Returns:
+            Interval in seconds
+        """
+        if changed or previous is None:
+            return self.min_interval
+        return min(self.max_interval, max(self.min_interval, previous * self.backoff))
+
+    def _jittered(self, interval: float) -> float:
+        """Apply random jitter to an interval."""
+        return interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def due(self, now: Optional[float] = None, limit: int = 500) -> List[Tuple[int, float]]:
+        """
+        Get bots due for a check, most overdue first.
+
+        Args:
+            now: Current time (unix seconds)
+            limit: Maximum number of bots returned
+
+        Returns:
+            List of (bot_id, due_at) tuples
+        """
+        now = time.time() if now is None else now
+        entries = self.redis.zrangebyscore(DUE_KEY, '-inf', now, start=0, num=limit, withscores=True)
+        return [(int(bot_id), due_at) for bot_id, due_at in entries]
+
+    def reschedule(self, results: Dict[int, bool], now: Optional[float] = None) -> None:
+        """
+        Schedule the next check of checked bots.
+
+        Args:
+            results: Dict mapping bot ids to whether their status changed
+            now: Current time (unix seconds)
+        """
+        if not results:
+            return
+        now = time.time() if now is None else now
+        bot_ids = list(results)
+        previous = self.redis.hmget(INTERVAL_KEY, bot_ids)
+        intervals = {}
+        due = {}
+        for bot_id, prev in zip(bot_ids, previous):
+            interval = self.next_interval(float(prev) if prev else None, results[bot_id])
+            intervals[bot_id] = interval
+            due[bot_id] = now + self._jittered(interval)
+        pipe = self.redis.pipeline()
+        pipe.hset(INTERVAL_KEY, mapping=intervals)
+        pipe.zadd(DUE_KEY, due)
+        pipe.execute()
+
+    def add(self, bot_ids: Iterable[int], now: Optional[float] = None) -> int:
+        """
+        Schedule bots that are not scheduled yet.
+
+        First checks are spread over the minimum interval.
+
+        Args:
+            bot_ids: Bot ids
+            now: Current time (unix seconds)
+
+        Returns:
+            Number of newly scheduled bots
+        """
+        now = time.time() if now is None else now
+        due = {bot_id: now + random.uniform(0, self.min_interval) for bot_id in bot_ids}
+        if not due:
+            return 0
+        return self.redis.zadd(DUE_KEY, due, nx=True)
+
+    def remove(self, bot_ids: Iterable[int]) -> None:
+        """Stop scheduling bots, e.g. after they were deleted."""
+        bot_ids = list(bot_ids)
+        if not bot_ids:
+            return
+        pipe = self.redis.pipeline()
+        pipe.zrem(DUE_KEY, *bot_ids)
+        pipe.hdel(INTERVAL_KEY, *bot_ids)
+        pipe.execute()
+
+    def record_tick(self, due: int, lag: float, duration: float, changed: int) -> None:
+        """Record metrics of one scheduler tick."""
+        pipe = self.redis.pipeline()
+        pipe.hset(SCHEDULE_STATS_KEY, mapping={
+            'last_tick': time.time(),
+            'due': due,
+            'lag_ms': round(lag * 1000, 1),
+            'duration_ms': round(duration * 1000, 1),
+            'changed': changed,
+            'scheduled': self.redis.zcard(DUE_KEY)
+        })
+        pipe.hincrby(SCHEDULE_STATS_KEY, 'cycles', 1)
+        pipe.execute()
+
+    def record_skipped(self) -> None:
+        """Record a tick skipped because the previous one was still running."""
+        self.redis.hincrby(SCHEDULE_STATS_KEY, 'skipped_cycles', 1)
+
+    def stats(self) -> Dict[str, str]:
+        """
+        Get scheduler metrics.
+
+        Returns:
+            Dict with last tick time, lag, due and skipped cycle counts
+        """
+        return {
+            key.decode(): value.decode()
+            for key, value in self.redis.hgetall(SCHEDULE_STATS_KEY).items()
+        }
@@ -0,0 +1,55 @@
+"""
+Per-queue Celery latency metrics.
+
+Every published task is stamped with its enqueue time; when a worker picks
+it up the wait is added to per-queue counters in Redis.
+"""
+
+import time
+import logging
+from typing import Dict
+from celery.signals import before_task_publish, task_prerun
+from app.bot_framework.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+QUEUE_LATENCY_KEY = 'celery:queue_latency'
+
+@before_task_publish.connect
+def stamp_enqueue_time(headers=None, **kwargs):
+    """Record when a task was published."""
+    if headers is not None:
+        headers.setdefault('enqueued_at', time.time())
+
+@task_prerun.connect
+def record_queue_latency(task=None, **kwargs):
+    """Record how long a task waited in its queue."""
+    enqueued_at = getattr(task.request, 'enqueued_at', None) if task else None
+    if enqueued_at is None:
+        return
+    queue = (task.request.delivery_info or {}).get('routing_key') or 'unknown'
+    latency_ms = max(0.0, (time.time() - float(enqueued_at)) * 1000)
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.hincrby(QUEUE_LATENCY_KEY, f"{queue}:count", 1)
+        pipe.hincrbyfloat(QUEUE_LATENCY_KEY, f"{queue}:total_ms", latency_ms)
+        pipe.hset(QUEUE_LATENCY_KEY, f"{queue}:last_ms", round(latency_ms, 1))
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Error recording queue latency: {e}")
+
+def queue_latency_stats() -> Dict[str, Dict[str, float]]:
+    """
+    Get queue wait statistics.
+
+    Returns:
+        Dict mapping queue names to task count, average and last latency (ms)
+    """
+    stats: Dict[str, Dict[str, float]] = {}
+    for field, value in get_redis().hgetall(QUEUE_LATENCY_KEY).items():
+        queue, metric = field.decode().rsplit(':', 1)
+        stats.setdefault(queue, {})[metric] = float(value)
+    for queue, metrics in stats.items():
+        count = metrics.get('count', 0)
+        metrics['avg_ms'] = round(metrics.get('total_ms', 0) / count, 1) if count else 0.0
+    return stats
@@ -1,57 +1,209 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, current_app
 from flask_login import login_required, current_user
 from app.models import TelegramBot
-from app.forms import BotRegistrationForm
+from app.forms import BotRegistrationForm, BOT_TYPE_CHOICES
+from app.bot_framework.bot_monitor import BotMonitor
+from app.monitoring import AdaptiveSchedule
+from app.tasks import submit_lifecycle_command
+from app import metrics_store
+from app.bot_framework.status_index import KNOWN_STATUSES
 from app import db, celery
+from sqlalchemy import tuple_
+from typing import Callable, Dict, List, Optional, Tuple
+import base64
+import hashlib
 import json
+import os
 import logging
-import redis
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 
+bp = Blueprint('bots', __name__, url_prefix='/bots')
 logger = logging.getLogger(__name__)
 
-class BotMonitor:
-    """Monitor external bot instances."""
+# Global bot monitor instance
+bot_monitor = BotMonitor()
+
+# Seconds browsers may reuse polled responses without revalidating
+STATUS_CACHE_MAX_AGE = int(os.getenv('STATUS_CACHE_MAX_AGE', '5'))
+STATS_CACHE_MAX_AGE = int(os.getenv('STATS_CACHE_MAX_AGE', '10'))
+
+def _parse_utc(value: str) -> datetime:
+    """Parse an ISO 8601 timestamp into a naive UTC datetime."""
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+def status_etag(bot_id: int, status: Dict) -> str:
+    """Version tag of a bot status; the version is bumped by every transition and heartbeat."""
+    return f"status-{bot_id}-{status['version']}-{status['last_update']}"
+
+def status_payload(status: Dict) -> Dict:
+    """Public fields of a bot status."""
+    return {
+        'status': status['status'],
+        'error': status['error'],
+        'webhook_url': status['webhook_url'],
+        'last_update': status['last_update'],
+        'type': status['type']
+    }
+
+def cache_control(max_age: Optional[int]) -> str:
+    """Cache-Control value of per-user responses; None forbids storing them."""
+    if max_age is None:
+        return "private, no-store"
+    return f"private, max-age={max_age}, must-revalidate"
+
+def _conditional_json(etag: str, build: Callable[[], Dict], max_age: Optional[int]):
+    """
+    Answer a GET with 304 if the client's ETag is current, else with JSON.
+
+    Responses are private to the logged-in user: only the browser may
+    reuse them for max_age seconds, shared proxies must not store them.
+
+    Args:
+        etag: Version tag of the resource
+        build: Callable producing the JSON payload, only called on a miss
+        max_age: Seconds the response may be reused, None to never store it
+
+    Returns:
+        Flask response
+    """
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = jsonify(build())
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control(max_age)
+    response.vary.add('Cookie')
+    return response
+
+# Bots per page of the listing, and the largest page a client may request
+BOTS_PER_PAGE = 25
+MAX_BOTS_PER_PAGE = 100
+
+def encode_cursor(bot: TelegramBot) -> str:
+    """Encode the keyset position after a bot as an opaque cursor."""
+    raw = json.dumps([bot.created_at.isoformat(), bot.id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    Decode a cursor produced by encode_cursor.
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, bot_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(bot_id)
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+def query_bots(user_id: int, status: Optional[str] = None, bot_type: Optional[str] = None,
+               search: Optional[str] = None, cursor: Optional[str] = None,
+               limit: int = BOTS_PER_PAGE) -> Tuple[List[TelegramBot], Optional[str]]:
+    """
+    Get one page of a user's bots, newest first.
+
+    Pages are addressed by the (created_at, id) of the last bot on the
+    previous page, so every page is an index range scan regardless of depth.
+
+    Args:
+        user_id: Owner of the bots
+        status: Only bots with this status
+        bot_type: Only bots of this type
+        search: Text matched against the bot username
+        cursor: Cursor of the previous page's last bot
+        limit: Page size
+
+    Returns:
+        Tuple of (bots, cursor of the next page or None)
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    query = TelegramBot.query.filter(TelegramBot.user_id == user_id)
+    if status:
+        query = query.filter(TelegramBot.status == status)
+    if bot_type:
+        query = query.filter(TelegramBot.bot_type == bot_type)
+    if search:
+        # Match the input literally, not as LIKE wildcards
+        pattern = search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        query = query.filter(TelegramBot.bot_username.ilike(f"%{pattern}%", escape='\\'))
+    if cursor:
+        query = query.filter(tuple_(TelegramBot.created_at, TelegramBot.id) < decode_cursor(cursor))
     
-    def __init__(self, redis_url: str = 'redis://redis:6379/0'):
-        """Initialize bot monitor."""
-        self.redis = redis.from_url(redis_url)
+    bots = query.order_by(
+        TelegramBot.created_at.desc(), TelegramBot.id.desc()
+    ).limit(limit + 1).all()
     
-    def get_bot_status(self, bot_token: str) -> dict:
-        """Get bot status from Redis."""
-        try:
-            status = self.redis.hgetall(f"bot:{bot_token}")
-            if status:
-                return {
-                    'status': status.get(b'status', b'unknown').decode(),
-                    'error': status.get(b'error', b'').decode(),
-                    'webhook_url': status.get(b'webhook_url', b'').decode(),
-                    'last_update': status.get(b'last_update', b'').decode(),
-                    'type': status.get(b'type', b'').decode()
-                }
-        except Exception as e:
-            logger.error(f"Error getting bot status: {e}")
-        
-        return {
-            'status': 'unknown',
-            'error': '',
-            'webhook_url': '',
-            'last_update': '',
-            'type': ''
-        }
+    next_cursor = encode_cursor(bots[limit - 1]) if len(bots) > limit else None
+    return bots[:limit], next_cursor
 
-bp = Blueprint('bots', __name__, url_prefix='/bots')
-logger = logging.getLogger(__name__)
+def _listing_args() -> Dict:
+    """Read listing filters and paging from the query string."""
+    try:
+        limit = int(request.args.get('per_page', BOTS_PER_PAGE))
+    except ValueError:
+        limit = BOTS_PER_PAGE
+    return {
+        'status': request.args.get('status') or None,
+        'bot_type': request.args.get('type') or None,
+        'search': (request.args.get('q') or '').strip() or None,
+        'cursor': request.args.get('cursor') or None,
+        'limit': max(1, min(limit, MAX_BOTS_PER_PAGE))
+    }
 
-# Global bot monitor instance
-bot_monitor = BotMonitor()
+def _bot_summary(bot: TelegramBot) -> Dict:
+    """Serialize a bot for the listing API."""
+    return {
+        'id': bot.id,
+        'username': bot.bot_username,
+        'type': bot.bot_type,
+        'status': bot.status,
+        'desired_state': bot.desired_state,
+        'error': bot.error_message,
+        'last_activity': bot.last_activity.isoformat() if bot.last_activity else None,
+        'created_at': bot.created_at.isoformat() if bot.created_at else None
+    }
 
 @bp.route('/')
 @login_required
 def list():
-    """List all bots for the current user."""
-    bots = TelegramBot.query.filter_by(user_id=current_user.id).all()
-    return render_template('bots/list.html', bots=bots)
+    """List the current user's bots, one page at a time."""
+    args = _listing_args()
+    try:
+        bots, next_cursor = query_bots(current_user.id, **args)
+    except ValueError:
+        flash('Invalid page, showing the first page.', 'warning')
+        args['cursor'] = None
+        bots, next_cursor = query_bots(current_user.id, **args)
+    
+    return render_template(
+        'bots/list.html',
+        bots=bots,
+        next_cursor=next_cursor,
+        filters={'status': args['status'], 'type': args['bot_type'], 'q': args['search']},
+        is_first_page=args['cursor'] is None,
+        statuses=KNOWN_STATUSES,
+        bot_types=BOT_TYPE_CHOICES
+    )
+
+@bp.route('/api')
+@login_required
+def list_api():
+    """List the current user's bots as JSON, one page at a time."""
+    try:
+        bots, next_cursor = query_bots(current_user.id, **_listing_args())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({
+        'bots': [_bot_summary(bot) for bot in bots],
+        'next_cursor': next_cursor
+    })
 
 @bp.route('/register', methods=['GET', 'POST'])
 @login_required
@@ -72,13 +224,20 @@ def register():
                 user_id=current_user.id,
                 bot_type=form.bot_type.data,
                 config=json.dumps(config),
-                status='stopped'
+                status='stopped',
+                desired_state='running'
             )
             db.session.add(bot)
             db.session.commit()
             
+            # Check the new bot soon instead of waiting for the next schedule sync
+            try:
+                AdaptiveSchedule(bot_monitor.redis).add([bot.id])
+            except Exception as e:
+                logger.warning(f'Could not schedule monitoring for bot {bot.id}: {str(e)}')
+            
             # Start bot process
-            start_bot_process.delay(bot.id)
+            submit_lifecycle_command(bot.id, 'start')
             flash('Bot registered successfully!', 'success')
             return redirect(url_for('bots.list'))
             
@@ -90,6 +249,42 @@ def register():
     
     return render_template('bots/register.html', form=form)
 
+def control(bot: TelegramBot, action: str) -> Optional[str]:
+    """
+    Record a bot's desired state and submit the lifecycle command.
+
+    Args:
+        bot: Bot to control
+        action: start, stop or restart
+
+    Returns:
+        Message describing the submitted command, or None if the bot is
+        already in the requested state
+
+    Raises:
+        ValueError: If the action is unknown
+    """
+    if action == 'start':
+        bot.desired_state = 'running'
+        db.session.commit()
+        if bot.status != 'running':
+            submit_lifecycle_command(bot.id, 'start')
+            return 'Bot starting...'
+    elif action == 'stop':
+        bot.desired_state = 'stopped'
+        db.session.commit()
+        if bot.status == 'running':
+            submit_lifecycle_command(bot.id, 'stop')
+            return 'Bot stopping...'
+    elif action == 'restart':
+        bot.desired_state = 'running'
+        db.session.commit()
+        submit_lifecycle_command(bot.id, 'restart')
+        return 'Bot restarting...'
+    else:
+        raise ValueError(f"Invalid action: {action}")
+    return None
+
 @bp.route('/<int:bot_id>/control/<action>')
 @login_required
 def control_bot(bot_id, action):
@@ -97,19 +292,11 @@ def control_bot(bot_id, action):
     bot = TelegramBot.query.filter_by(id=bot_id, user_id=current_user.id).first_or_404()
     
     try:
-        if action == 'start':
-            if bot.status != 'running':
-                start_bot_process.delay(bot.id)
-                flash('Bot starting...', 'success')
-        elif action == 'stop':
-            if bot.status == 'running':
-                stop_bot_process.delay(bot.id)
-                flash('Bot stopping...', 'success')
-        elif action == 'restart':
-            restart_bot_process.delay(bot.id)
-            flash('Bot restarting...', 'success')
-        else:
-            flash('Invalid action', 'error')
+        message = control(bot, action)
+        if message:
+            flash(message, 'success')
+    except ValueError:
+        flash('Invalid action', 'error')
     except Exception as e:
         flash(f'Error controlling bot: {str(e)}', 'error')
         logger.error(f'Bot control error: {str(e)}')
@@ -119,9 +306,43 @@ def control_bot(bot_id, action):
 @bp.route('/<int:bot_id>/stats')
 @login_required
 def bot_stats(bot_id):
-    """Get bot statistics."""
+    """Get bot metric totals of the last 24 hours."""
+    bot = TelegramBot.query.filter_by(id=bot_id, user_id=current_user.id).first_or_404()
+    # Totals change when new metrics are stored or the window moves to the next hour
+    now = datetime.utcnow()
+    version = metrics_store.metrics_version(bot_monitor.redis, bot.id)
+    etag = f"stats-{bot.id}-{version}-{now:%Y%m%d%H}"
+    return _conditional_json(
+        etag,
+        lambda: metrics_store.summarize(bot.id, since=now - timedelta(hours=24)),
+        STATS_CACHE_MAX_AGE
+    )
+
+@bp.route('/<int:bot_id>/metrics')
+@login_required
+def bot_metrics(bot_id):
+    """
+    Get metric time series of a bot.
+
+    Query parameters: start and end (ISO 8601 UTC, default the last 24
+    hours), resolution (minute, hour or day, default picked from the range)
+    and metric (name or dotted prefix, repeatable).
+    """
     bot = TelegramBot.query.filter_by(id=bot_id, user_id=current_user.id).first_or_404()
-    return jsonify(bot.stats or {})
+    try:
+        end = _parse_utc(request.args['end']) if 'end' in request.args else datetime.utcnow()
+        start = _parse_utc(request.args['start']) if 'start' in request.args else end - timedelta(hours=24)
+        if start >= end:
+            raise ValueError('start must be before end')
+        result = metrics_store.query_series(
+            bot.id, start, end,
+            resolution=request.args.get('resolution') or None,
+            metrics=request.args.getlist('metric') or None
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    result.update({'start': start.isoformat(), 'end': end.isoformat()})
+    return jsonify(result)
 
 def run_async(coro):
     """Run an async function in a synchronous context."""
@@ -142,7 +363,7 @@ def update_bot_status(bot_id):
             return
 
         # Get status from Redis
-        status = bot_monitor.get_bot_status(bot.bot_token)
+        status = bot_monitor.get_bot_status(bot.token_fingerprint)
         
         # Update bot record
         bot.status = status['status']
@@ -162,15 +383,19 @@ def get_bot_status(bot_id):
     bot = TelegramBot.query.filter_by(id=bot_id, user_id=current_user.id).first_or_404()
     
     # Get status from Redis
-    status = bot_monitor.get_bot_status(bot.bot_token)
+    status = bot_monitor.get_bot_status(bot.token_fingerprint)
     
-    return jsonify({
-        'status': status['status'],
-        'error': status['error'],
-        'webhook_url': status['webhook_url'],
-        'last_update': status['last_update'],
-        'type': status['type']
-    })
+    return _conditional_json(
+        status_etag(bot.id, status), lambda: status_payload(status), STATUS_CACHE_MAX_AGE
+    )
+
+@bp.route('/fleet')
+@login_required
+def fleet_status():
+    """Get fleet-wide bot counts by status and type."""
+    if not current_user.is_admin:
+        return jsonify({'error': 'Access denied'}), 403
+    return jsonify(bot_monitor.get_fleet_status())
 
 @bp.route('/webhook-url/<int:bot_id>')
 @login_required
@@ -183,9 +408,12 @@ def get_webhook_url(bot_id):
     if request.headers.get('X-Forwarded-Proto') == 'https':
         base_url = base_url.replace('http://', 'https://')
     
-    webhook_url = f"{base_url}/bots/webhook/{bot.bot_token}"
+    webhook_url = f"{base_url}/bots/webhook/{bot.token_fingerprint}"
     
-    return jsonify({
+    # Only changes with the token or the public base URL; the response holds
+    # the raw token, so it is never stored
+    etag = "webhook-" + hashlib.sha256(f"{bot.id}:{bot.bot_token}:{base_url}".encode()).hexdigest()[:32]
+    return _conditional_json(etag, lambda: {
         'webhook_url': webhook_url,
         'test_command': f'curl -F "url={webhook_url}" https://api.telegram.org/bot{bot.bot_token}/setWebhook'
-    })
\ No newline at end of file
+    }, None)
@@ -1,21 +1,44 @@
-from flask import Blueprint, render_template, redirect, url_for, request, flash, jsonify
+from flask import Blueprint, render_template, redirect, url_for, request, flash, jsonify, current_app
 from flask_login import current_user, login_required
 from werkzeug.security import generate_password_hash
 from app.models import User, TelegramBot
 from app.forms import RegistrationForm
 from app import db
+from app.bot_framework.bot_monitor import BotMonitor
+from app.routes.bots import bot_monitor
+from app.monitoring import AdaptiveSchedule
+from app.lifecycle import LifecycleQueue
+from app.controller import STATS_KEY as CONTROLLER_STATS_KEY
+from app.queue_metrics import queue_latency_stats
+from app.bot_framework.redis_client import get_redis, get_pool_stats
+from app.setup_state import is_setup_complete
+from app.user_cache import cache_stats as user_cache_stats
+from app.bot_framework.cache import TTLCache
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
 from sqlalchemy import text
-import redis
 import psycopg2
 from urllib.parse import urlparse
 import os
+import time
 
 bp = Blueprint('setup', __name__)
 
+# Seconds each system check may take before it is reported as timed out
+SYSTEM_CHECK_TIMEOUT = float(os.getenv('SYSTEM_CHECK_TIMEOUT', '5'))
+
+# Threads shared by all system checks; checks that time out keep theirs until they finish
+_check_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('SYSTEM_CHECK_WORKERS', '10')),
+    thread_name_prefix='system-check'
+)
+
+# System check results keyed by exact-count mode, reused for a short time
+_check_cache = TTLCache(maxsize=2, ttl=float(os.getenv('SYSTEM_CHECK_CACHE_TTL', '15')))
+
 @bp.route('/initial-setup', methods=['GET', 'POST'])
 def initial_setup():
     # Redirect if admin already exists
-    if User.query.filter_by(is_admin=True).first():
+    if is_setup_complete():
         flash('Setup has already been completed.', 'info')
         return redirect(url_for('main.index'))
     
@@ -48,8 +71,8 @@ def check_setup():
     ):
         return
 
-    # Check if admin exists
-    if not User.query.filter_by(is_admin=True).first():
+    # Check if admin exists (cached once setup is complete)
+    if not is_setup_complete():
         if request.endpoint != 'setup.initial_setup':
             flash('Please complete the initial setup.', 'warning')
             return redirect(url_for('setup.initial_setup'))
@@ -61,16 +84,92 @@ def system_check():
         flash('Access denied.', 'error')
         return redirect(url_for('main.index'))
     
+    exact = request.args.get('exact') == '1'
+    cached = None if request.args.get('refresh') == '1' else _check_cache.get(exact)
+    if cached is None:
+        cached = (run_checks(exact=exact), time.time())
+        _check_cache.set(exact, cached)
+    checks, checked_at = cached
+    
+    return render_template(
+        'setup/system_check.html',
+        checks=checks,
+        checked_age=int(time.time() - checked_at),
+        exact=exact,
+        estimated=checks.get('database', {}).get('estimated', False)
+    )
+
+def run_checks(exact: bool = False, timeout: float = SYSTEM_CHECK_TIMEOUT) -> dict:
+    """
+    Run all system checks concurrently.
+
+    Args:
+        exact: Count table rows exactly instead of using catalog estimates
+        timeout: Seconds after which a check is reported as timed out
+
+    Returns:
+        Dict mapping check names to their status and message
+    """
+    app = current_app._get_current_object()
     checks = {
-        'database': check_database(),
-        'redis': check_redis(),
-        'users': check_users(),
-        'bots': check_bots()
+        'database': lambda: check_database(exact=exact),
+        'redis': check_redis,
+        'users': check_users,
+        'bots': check_bots,
+        'monitoring': check_monitoring
     }
     
-    return render_template('setup/system_check.html', checks=checks)
+    def run(check):
+        with app.app_context():
+            return check()
+    
+    futures = {name: _check_executor.submit(run, check) for name, check in checks.items()}
+    
+    deadline = time.monotonic() + timeout
+    results = {}
+    for name, future in futures.items():
+        try:
+            results[name] = future.result(timeout=max(0, deadline - time.monotonic()))
+        except FuturesTimeout:
+            # Checks still waiting for a busy thread are not started at all
+            future.cancel()
+            results[name] = {'status': 'error', 'message': f'Check timed out after {timeout:g}s'}
+        except Exception as e:
+            results[name] = {'status': 'error', 'message': str(e)}
+    return results
+
+def _table_row_counts(tables, exact: bool) -> dict:
+    """
+    Get row counts of tables.
+
+    On PostgreSQL the planner's catalog estimates are used unless exact
+    counts are requested, so large tables are not scanned.
 
-def check_database():
+    Returns:
+        Dict mapping table names to (count, is_estimate) tuples
+    """
+    if not exact and db.engine.dialect.name == 'postgresql':
+        rows = db.session.execute(
+            text(
+                "SELECT c.relname, c.reltuples::bigint FROM pg_class c "
+                "JOIN pg_namespace n ON n.oid = c.relnamespace "
+                "WHERE n.nspname = current_schema() AND c.relkind = 'r' "
+                "AND c.relname = ANY(:tables)"
+            ),
+            {'tables': tables}
+        ).all()
+        # reltuples is -1 until a table has been vacuumed or analyzed
+        return {name: (max(count, 0), True) for name, count in rows}
+    
+    counts = {}
+    for table in tables:
+        counts[table] = (
+            db.session.execute(text(f'SELECT COUNT(*) FROM {table}')).scalar(),
+            False
+        )
+    return counts
+
+def check_database(exact: bool = False):
     try:
         # Get database info first
         engine = db.engine
@@ -94,15 +193,17 @@ def check_database():
             tables = inspector.get_table_names()
             
             # Get table statistics
-            table_stats = []
-            for table in tables:
-                try:
-                    count = db.session.execute(
-                        text(f'SELECT COUNT(*) FROM {table}')
-                    ).scalar()
-                    table_stats.append(f"{table} ({count} rows)")
-                except Exception as table_err:
-                    table_stats.append(f"{table} (error: {str(table_err)})")
+            try:
+                counts = _table_row_counts(tables, exact)
+                estimated = any(estimate for _, estimate in counts.values())
+                table_stats = []
+                for table in tables:
+                    count, estimate = counts.get(table, (0, True))
+                    table_stats.append(f"{table} ({'~' if estimate else ''}{count} rows)")
+            except Exception as count_err:
+                db.session.rollback()
+                estimated = False
+                table_stats = [f"{table} (error: {str(count_err)})" for table in tables]
             
             message = (
                 f"Database type: {db_type}\n"
@@ -114,7 +215,8 @@ def check_database():
             
             return {
                 'status': 'ok',
-                'message': message
+                'message': message,
+                'estimated': estimated
             }
             
         except Exception as inspect_err:
@@ -131,9 +233,8 @@ def check_database():
 
 def check_redis():
     try:
-        # Get Redis URL from environment or config
-        redis_url = os.getenv('REDIS_URL', 'redis://redis:6379/0')
-        r = redis.from_url(redis_url)
+        # Use the shared client so the check does not open a new pool
+        r = get_redis()
         
         # Test connection and get info
         r.ping()
@@ -149,6 +250,23 @@ def check_redis():
             f'Memory used: {memory}, '
             f'Connected clients: {clients}'
         )
+        cache = bot_monitor.cache_stats()
+        message += (
+            f'\nStatus cache: {cache["hit_rate"]:.0%} hit rate '
+            f'({cache["hits"]} hits, {cache["misses"]} misses, '
+            f'{cache["size"]}/{cache["maxsize"]} entries, '
+            f'invalidation {"on" if cache["invalidation"] else "off"})'
+        )
+        users = user_cache_stats()
+        message += (
+            f'\nUser cache: {users["hit_rate"]:.0%} hit rate '
+            f'({users["hits"]} hits, {users["misses"]} misses)'
+        )
+        for url, pool in get_pool_stats().items():
+            message += (
+                f'\nPool {url}: {pool["in_use"]} in use, {pool["idle"]} idle, '
+                f'{pool["created"]}/{pool["max_connections"]} created'
+            )
         
         return {'status': 'ok', 'message': message}
     except Exception as e:
@@ -180,21 +298,35 @@ def check_users():
 
 def check_bots():
     try:
-        total_bots = TelegramBot.query.count()
-        active_bots = TelegramBot.query.filter_by(is_active=True).count()
-        inactive_bots = total_bots - active_bots
+        # One grouped query instead of a count per status
+        rows = db.session.query(
+            TelegramBot.status, db.func.count(TelegramBot.id)
+        ).group_by(TelegramBot.status).all()
+        db_counts = {status or 'unknown': count for status, count in rows}
+        total_bots = sum(db_counts.values())
         
         # Get latest bot if any exist
         latest_bot = TelegramBot.query.order_by(TelegramBot.id.desc()).first()
         latest_info = (
-            f", Latest bot: {latest_bot.bot_username} "
-            f"({'active' if latest_bot.is_active else 'inactive'})"
+            f", Latest bot: {latest_bot.bot_username or latest_bot.bot_type} "
+            f"({latest_bot.status})"
         ) if latest_bot else ""
         
+        # Reported state comes from the Redis fleet indexes in constant time
+        fleet = BotMonitor(invalidate=False).get_fleet_status()
+        reported = ", ".join(
+            f"{status}: {count}" for status, count in fleet['status'].items() if count
+        ) or "none"
+        types = ", ".join(
+            f"{bot_type}: {count}" for bot_type, count in fleet['type'].items()
+        ) or "none"
+        
         message = (
             f"Total bots: {total_bots}\n"
-            f"Active bots: {active_bots}\n"
-            f"Inactive bots: {inactive_bots}"
+            f"Running bots: {db_counts.get('running', 0)}\n"
+            f"Bots in error: {db_counts.get('error', 0)}\n"
+            f"Reported by runners: {reported}\n"
+            f"Reported types: {types}"
             f"{latest_info}"
         )
         
@@ -203,4 +335,49 @@ def check_bots():
             'message': message
         }
     except Exception as e:
-        return {'status': 'error', 'message': str(e)}
\ No newline at end of file
+        return {'status': 'error', 'message': str(e)}
+
+def check_monitoring():
+    try:
+        stats = AdaptiveSchedule(get_redis()).stats()
+        if not stats:
+            return {'status': 'error', 'message': 'Monitoring scheduler has not run yet'}
+        
+        message = (
+            f"Scheduled bots: {stats.get('scheduled', 0)}\n"
+            f"Last tick: {stats.get('due', 0)} due, {stats.get('changed', 0)} changed "
+            f"in {stats.get('duration_ms', 0)}ms\n"
+            f"Schedule lag: {stats.get('lag_ms', 0)}ms\n"
+            f"Cycles: {stats.get('cycles', 0)}, skipped: {stats.get('skipped_cycles', 0)}"
+        )
+        lifecycle = LifecycleQueue(get_redis()).stats()
+        message += (
+            f"\nLifecycle queue depth: {lifecycle['depth']} ({lifecycle['in_flight']} in flight), "
+            f"executed: {lifecycle.get('executed', 0)}, "
+            f"collapsed: {lifecycle.get('collapsed', 0)}, "
+            f"superseded: {lifecycle.get('superseded', 0)}, "
+            f"orphaned: {lifecycle.get('orphaned', 0)}"
+        )
+        controller = {
+            key.decode(): value.decode()
+            for key, value in get_redis().hgetall(CONTROLLER_STATS_KEY).items()
+        }
+        if controller:
+            message += (
+                f"\nController: {controller.get('managed', 0)} managed, "
+                f"{controller.get('planned', 0)} planned, "
+                f"{controller.get('submitted', 0)} submitted, "
+                f"{controller.get('deferred', 0)} deferred"
+            )
+        for queue, latency in sorted(queue_latency_stats().items()):
+            message += (
+                f"\nQueue {queue}: {int(latency.get('count', 0))} tasks, "
+                f"avg wait {latency['avg_ms']}ms, last {latency.get('last_ms', 0)}ms"
+            )
+        
+        return {
+            'status': 'ok',
+            'message': message
+        }
+    except Exception as e:
+        return {'status': 'error', 'message': str(e)}
@@ -0,0 +1,99 @@
+"""
+Process-wide cache of the setup-complete flag.
+
+Setup is complete once an admin user exists. The flag is kept in process
+memory and re-validated against Redis at most every SETUP_RECHECK_INTERVAL
+seconds, so the per-request hook makes no queries once setup is done. The
+database is only consulted when neither cache knows the answer or Redis is
+unavailable. Any change to users invalidates both caches after commit.
+"""
+
+import os
+import time
+import logging
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+from app.bot_framework.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+SETUP_COMPLETE_KEY = 'app:setup_complete'
+
+# Seconds a worker trusts its local flag before re-reading Redis
+SETUP_RECHECK_INTERVAL = float(os.getenv('SETUP_RECHECK_INTERVAL', '60'))
+
+# Local expiry (monotonic) of the cached flag; 0 = not cached
+_valid_until = 0.0
+
+def _query_setup_complete() -> bool:
+    """Check the database for an admin user."""
+    from app.models import User
+    return User.query.filter_by(is_admin=True).first() is not None
+
+def is_setup_complete() -> bool:
+    """
+    Check whether the initial setup has been completed.
+
+    Only a positive answer is cached; until setup is done every call
+    checks the database.
+
+    Returns:
+        True if an admin user exists
+    """
+    global _valid_until
+    if time.monotonic() < _valid_until:
+        return True
+
+    try:
+        cached = get_redis().get(SETUP_COMPLETE_KEY)
+    except Exception as e:
+        logger.warning(f"Error reading setup flag from Redis: {e}")
+        cached = None
+
+    if cached is None:
+        if not _query_setup_complete():
+            return False
+        try:
+            get_redis().set(SETUP_COMPLETE_KEY, 1)
+        except Exception as e:
+            logger.warning(f"Error storing setup flag in Redis: {e}")
+    _valid_until = time.monotonic() + SETUP_RECHECK_INTERVAL
+    return True
+
+def invalidate_setup_complete() -> None:
+    """Drop the cached flag in this process and in Redis."""
+    global _valid_until
+    _valid_until = 0.0
+    try:
+        get_redis().delete(SETUP_COMPLETE_KEY)
+    except Exception as e:
+        logger.warning(f"Error clearing setup flag in Redis: {e}")
+
+def _mark_users_changed(mapper, connection, target):
+    """Flag the session so the setup cache is invalidated on commit."""
+    session = object_session(target)
+    if session is not None:
+        session.info['users_changed'] = True
+
+def _invalidate_after_commit(session):
+    """Invalidate the setup cache once user changes are committed."""
+    if session.info.pop('users_changed', False):
+        invalidate_setup_complete()
+
+def _discard_after_rollback(session):
+    """Forget user changes that were rolled back."""
+    session.info.pop('users_changed', None)
+
+def register_listeners(user_model) -> None:
+    """
+    Invalidate the setup cache whenever users are inserted, updated or deleted.
+
+    Args:
+        user_model: User model class
+    """
+    for name in ('after_insert', 'after_update', 'after_delete'):
+        if not event.contains(user_model, name, _mark_users_changed):
+            event.listen(user_model, name, _mark_users_changed)
+    if not event.contains(Session, 'after_commit', _invalidate_after_commit):
+        event.listen(Session, 'after_commit', _invalidate_after_commit)
+        event.listen(Session, 'after_rollback', _discard_after_rollback)
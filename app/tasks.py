@@ -1,11 +1,67 @@
 from app import celery, db
 from app.models import TelegramBot
-from app.routes.bots import BotMonitor
+from app.bot_framework.bot_monitor import BotMonitor
+from app.bot_framework.redis_client import get_redis
+from app.lifecycle import LifecycleQueue
+from app.monitoring import AdaptiveSchedule
+from app import metrics_store
+from app import queue_metrics  # noqa: F401 - registers queue latency signals
+from redis.exceptions import LockNotOwnedError
+from sqlalchemy import update
 from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional
+import os
+import time
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Bots read from the DB and Redis per reconciliation round trip
+RECONCILE_CHUNK_SIZE = int(os.getenv('RECONCILE_CHUNK_SIZE', '500'))
+
+# Heartbeats move last_update every few seconds; only persist coarser changes
+ACTIVITY_RESOLUTION = int(os.getenv('RECONCILE_ACTIVITY_RESOLUTION', '60'))
+
+RECONCILE_STATS_KEY = 'monitor:reconcile'
+
+# Bots checked per scheduler tick
+MONITOR_BATCH_SIZE = int(os.getenv('MONITOR_BATCH_SIZE', '1000'))
+
+# Seconds between syncs of the schedule with the bots in the database
+MONITOR_SYNC_INTERVAL = int(os.getenv('MONITOR_SYNC_INTERVAL', '600'))
+
+MONITOR_TICK_LOCK = 'monitor:tick:lock'
+MONITOR_SYNC_KEY = 'monitor:synced'
+
+# Seconds before retrying a lifecycle task whose bot is locked by another worker
+LIFECYCLE_RETRY_DELAY = int(os.getenv('LIFECYCLE_RETRY_DELAY', '2'))
+
+# Retries of a locked lifecycle task; the default outlasts the 300s lock timeout
+LIFECYCLE_MAX_RETRIES = int(os.getenv('LIFECYCLE_MAX_RETRIES', '150'))
+
+CONTROLLER_LOCK = 'controller:lock'
+
+_monitor: Optional[BotMonitor] = None
+
+def get_monitor() -> BotMonitor:
+    """
+    Get the bot monitor shared by the tasks of this worker process.
+
+    It neither subscribes to status events nor caches statuses, so tasks
+    always read fresh statuses and do not hold a listener thread.
+    """
+    global _monitor
+    if _monitor is None:
+        _monitor = BotMonitor(cache_ttl=0, invalidate=False)
+    return _monitor
+
+@celery.task(name='process_update')
+def process_update(update_data):
+    """Process an incoming Telegram update."""
+    from telegram import Update
+    update = Update.de_json(update_data, None)
+    # Implement proper update routing to respective bot controllers
+
 @celery.task
 def update_bot_status(bot_id):
     """Update bot status from Redis."""
@@ -16,9 +72,9 @@ def update_bot_status(bot_id):
             return False
 
         # Get status from Redis
-        monitor = BotMonitor()
-        status = monitor.get_bot_status(bot.bot_token)
-        
+        monitor = get_monitor()
+        status = monitor.get_bot_status(bot.token_fingerprint)
+
         # Update bot record
         bot.status = status['status']
         bot.error_message = status['error']
@@ -26,7 +82,7 @@ def update_bot_status(bot_id):
         if status['last_update']:
             bot.last_activity = datetime.fromisoformat(status['last_update'])
         db.session.commit()
-        
+
         logger.info(f"Updated status for bot {bot_id}: {status['status']}")
         return True
 
@@ -34,14 +90,361 @@ def update_bot_status(bot_id):
         logger.error(f"Error updating bot status {bot_id}: {str(e)}")
         return False
 
+def _iter_bot_chunks(chunk_size: int, bot_ids: Optional[Iterable[int]] = None) -> Iterator[List]:
+    """Stream the status columns of bots in primary key order."""
+    columns = (
+        TelegramBot.id,
+        TelegramBot.token_fingerprint,
+        TelegramBot.status,
+        TelegramBot.error_message,
+        TelegramBot.webhook_url,
+        TelegramBot.last_activity
+    )
+    if bot_ids is not None:
+        ids = sorted(set(bot_ids))
+        for i in range(0, len(ids), chunk_size):
+            chunk = ids[i:i + chunk_size]
+            yield db.session.query(*columns).filter(TelegramBot.id.in_(chunk)).order_by(TelegramBot.id).all()
+        return
+
+    last_id = 0
+    while True:
+        rows = db.session.query(*columns).filter(
+            TelegramBot.id > last_id
+        ).order_by(TelegramBot.id).limit(chunk_size).all()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1].id
+
+def _status_changes(row, status: Dict) -> Dict:
+    """Get the columns of a bot row that differ from its reported status."""
+    changes = {}
+    if row.status != status['status']:
+        changes['status'] = status['status']
+    if (row.error_message or '') != status['error']:
+        changes['error_message'] = status['error']
+    if (row.webhook_url or '') != status['webhook_url']:
+        changes['webhook_url'] = status['webhook_url']
+    if status['last_update']:
+        try:
+            last_update = datetime.fromisoformat(status['last_update'])
+        except ValueError:
+            last_update = None
+        if last_update and (
+            row.last_activity is None
+            or abs((last_update - row.last_activity).total_seconds()) >= ACTIVITY_RESOLUTION
+        ):
+            changes['last_activity'] = last_update
+    return changes
+
+def reconcile_statuses(bot_ids: Optional[Iterable[int]] = None, chunk_size: int = RECONCILE_CHUNK_SIZE,
+                       monitor: Optional[BotMonitor] = None) -> Dict:
+    """
+    Copy reported bot statuses from Redis into the database.
+
+    Bots are streamed in chunks; each chunk costs one pipelined Redis round
+    trip and at most one bulk UPDATE containing only the changed rows.
+
+    Args:
+        bot_ids: Restrict reconciliation to these bots, defaults to all bots
+        chunk_size: Number of bots per chunk
+        monitor: Bot monitor used to read statuses
+
+    Returns:
+        Dict with run statistics
+    """
+    monitor = monitor or get_monitor()
+    started = time.monotonic()
+    scanned = changed = chunks = 0
+    seen_ids = []
+    changed_ids = []
+
+    for rows in _iter_bot_chunks(chunk_size, bot_ids):
+        chunks += 1
+        scanned += len(rows)
+        seen_ids.extend(row.id for row in rows)
+        statuses = monitor.get_bot_statuses([row.token_fingerprint for row in rows])
+        updates = []
+        for row in rows:
+            changes = _status_changes(row, statuses[row.token_fingerprint])
+            if changes:
+                changes['id'] = row.id
+                updates.append(changes)
+        if updates:
+            db.session.execute(update(TelegramBot), updates)
+            db.session.commit()
+            changed += len(updates)
+            changed_ids.extend(u['id'] for u in updates)
+
+    stats = {
+        'last_run': datetime.utcnow().isoformat(),
+        'duration_ms': round((time.monotonic() - started) * 1000, 1),
+        'scanned': scanned,
+        'changed': changed,
+        'chunks': chunks
+    }
+    try:
+        pipe = monitor.redis.pipeline()
+        pipe.hset(RECONCILE_STATS_KEY, mapping=stats)
+        pipe.hincrby(RECONCILE_STATS_KEY, 'runs', 1)
+        pipe.hincrby(RECONCILE_STATS_KEY, 'total_changed', changed)
+        pipe.execute()
+    except Exception as e:
+        logger.error(f"Error recording reconciliation stats: {e}")
+
+    logger.info(
+        f"Reconciled {scanned} bots in {stats['duration_ms']}ms "
+        f"({changed} changed, {chunks} chunks)"
+    )
+    stats['seen_ids'] = seen_ids
+    stats['changed_ids'] = changed_ids
+    return stats
+
+@celery.task
+def reconcile_bot_statuses():
+    """Reconcile the statuses of all registered bots in batches."""
+    try:
+        stats = reconcile_statuses()
+        stats.pop('seen_ids')
+        stats.pop('changed_ids')
+        return stats
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error reconciling bot statuses: {str(e)}")
+        return False
+
 @celery.task
 def monitor_bots():
     """Monitor all registered bots."""
+    return reconcile_bot_statuses()
+
+def _sync_schedule(schedule: AdaptiveSchedule) -> int:
+    """Add bots missing from the monitoring schedule."""
+    added = 0
+    last_id = 0
+    while True:
+        ids = [
+            bot_id for bot_id, in db.session.query(TelegramBot.id).filter(
+                TelegramBot.id > last_id
+            ).order_by(TelegramBot.id).limit(RECONCILE_CHUNK_SIZE)
+        ]
+        if not ids:
+            return added
+        added += schedule.add(ids)
+        last_id = ids[-1]
+
+def run_monitor_tick(monitor: Optional[BotMonitor] = None, schedule: Optional[AdaptiveSchedule] = None,
+                     now: Optional[float] = None) -> Dict:
+    """
+    Check the bots that are due according to the adaptive schedule.
+
+    Args:
+        monitor: Bot monitor used to read statuses
+        schedule: Monitoring schedule
+        now: Current time (unix seconds)
+
+    Returns:
+        Dict with tick statistics
+    """
+    monitor = monitor or get_monitor()
+    schedule = schedule or AdaptiveSchedule(monitor.redis)
+    now = time.time() if now is None else now
+    started = time.monotonic()
+
+    if monitor.redis.set(MONITOR_SYNC_KEY, now, nx=True, ex=MONITOR_SYNC_INTERVAL):
+        added = _sync_schedule(schedule)
+        if added:
+            logger.info(f"Added {added} bots to the monitoring schedule")
+
+    due = schedule.due(now, limit=MONITOR_BATCH_SIZE)
+    if not due:
+        schedule.record_tick(due=0, lag=0.0, duration=time.monotonic() - started, changed=0)
+        return {'due': 0, 'changed': 0, 'lag_ms': 0.0}
+
+    due_ids = [bot_id for bot_id, _ in due]
+    lag = max(0.0, now - due[0][1])
+    stats = reconcile_statuses(bot_ids=due_ids, monitor=monitor)
+
+    changed_ids = set(stats['changed_ids'])
+    seen_ids = set(stats['seen_ids'])
+    schedule.reschedule({bot_id: bot_id in changed_ids for bot_id in seen_ids}, now=now)
+    schedule.remove(bot_id for bot_id in due_ids if bot_id not in seen_ids)
+
+    duration = time.monotonic() - started
+    schedule.record_tick(due=len(due_ids), lag=lag, duration=duration, changed=len(changed_ids))
+    return {'due': len(due_ids), 'changed': len(changed_ids), 'lag_ms': round(lag * 1000, 1)}
+
+@celery.task
+def monitor_tick():
+    """Run one adaptive monitoring cycle unless the previous one is still running."""
+    monitor = get_monitor()
+    schedule = AdaptiveSchedule(monitor.redis)
+    lock = monitor.redis.lock(MONITOR_TICK_LOCK, timeout=300, blocking_timeout=0)
+    if not lock.acquire():
+        schedule.record_skipped()
+        logger.warning("Skipping monitor tick, previous tick still running")
+        return False
     try:
-        bots = TelegramBot.query.all()
-        for bot in bots:
-            update_bot_status.delay(bot.id)
-        return True
+        return run_monitor_tick(monitor, schedule)
     except Exception as e:
-        logger.error(f"Error monitoring bots: {str(e)}")
-        return False
\ No newline at end of file
+        db.session.rollback()
+        logger.error(f"Error in monitor tick: {str(e)}")
+        return False
+    finally:
+        try:
+            lock.release()
+        except LockNotOwnedError:
+            logger.warning("Monitor tick lock expired before the tick finished")
+
+def submit_lifecycle_command(bot_id: int, action: str, queue: Optional[LifecycleQueue] = None) -> bool:
+    """
+    Request a lifecycle action for a bot.
+
+    Args:
+        bot_id: Bot id
+        action: start, stop or restart
+        queue: Lifecycle queue
+
+    Returns:
+        True if a worker task was enqueued, False if the command was
+        collapsed into an already pending one
+    """
+    queue = queue or LifecycleQueue(get_redis())
+    if not queue.submit(bot_id, action):
+        logger.info(f"Collapsed {action} command for bot {bot_id}")
+        return False
+    try:
+        run_lifecycle_command.delay(bot_id)
+    except Exception:
+        queue.discard(bot_id)
+        raise
+    return True
+
+def execute_lifecycle_action(bot_id: int, action: str) -> None:
+    """Perform a lifecycle action with the container manager."""
+    from app.bot_framework.container_manager import ContainerManager
+
+    bot = TelegramBot.query.get(bot_id)
+    if not bot:
+        logger.warning(f"Bot {bot_id} not found")
+        return
+
+    manager = ContainerManager()
+    if action in ('stop', 'restart'):
+        manager.stop_bot(bot.token_fingerprint)
+    if action in ('start', 'restart'):
+        manager.start_bot(bot.bot_token, bot.bot_type)
+
+@celery.task(bind=True, max_retries=LIFECYCLE_MAX_RETRIES, acks_late=True)
+def run_lifecycle_command(self, bot_id):
+    """Execute the latest pending lifecycle action of a bot."""
+    queue = LifecycleQueue(get_redis())
+    lock = queue.lock(bot_id)
+    if not lock.acquire():
+        if self.request.retries >= self.max_retries:
+            # The fleet controller still converges the bot to its desired state
+            logger.error(f"Giving up on lifecycle command for bot {bot_id}, lock still held")
+            # Free the slot so later commands enqueue a task instead of collapsing
+            queue.discard(bot_id)
+            return False
+        # The lock holder may finish before seeing our intent, so try again
+        raise self.retry(countdown=LIFECYCLE_RETRY_DELAY)
+
+    try:
+        while True:
+            intent = queue.next_intent(bot_id)
+            if intent is None:
+                return True
+            action, seq = intent
+            try:
+                execute_lifecycle_action(bot_id, action)
+                logger.info(f"Executed {action} for bot {bot_id}")
+            except Exception as e:
+                logger.error(f"Error executing {action} for bot {bot_id}: {str(e)}")
+            if queue.complete(bot_id, seq):
+                return True
+            logger.info(f"Newer lifecycle command arrived for bot {bot_id}")
+    except Exception:
+        try:
+            queue.discard(bot_id)
+        except Exception as e:
+            logger.error(f"Error discarding lifecycle command for bot {bot_id}: {str(e)}")
+        raise
+    finally:
+        try:
+            lock.release()
+        except LockNotOwnedError:
+            # The work is done; the lock only expired while it ran
+            logger.warning(f"Lifecycle lock of bot {bot_id} expired before the command finished")
+
+@celery.task
+def reconcile_fleet():
+    """Converge containers and runners towards the desired bot states."""
+    from app.bot_framework.container_manager import ContainerManager
+    from app.controller import FleetController
+
+    monitor = get_monitor()
+    lock = monitor.redis.lock(CONTROLLER_LOCK, timeout=300, blocking_timeout=0)
+    if not lock.acquire():
+        logger.warning("Skipping fleet reconciliation, previous run still in progress")
+        return False
+    try:
+        manager = ContainerManager()
+        bots = [
+            {
+                'id': bot_id,
+                'fingerprint': fingerprint,
+                'container': manager.get_container_name(fingerprint),
+                'desired': desired_state
+            }
+            for bot_id, fingerprint, desired_state in db.session.query(
+                TelegramBot.id, TelegramBot.token_fingerprint, TelegramBot.desired_state
+            ).filter(TelegramBot.desired_state.isnot(None))
+        ]
+        controller = FleetController(
+            monitor,
+            manager,
+            LifecycleQueue(monitor.redis),
+            submit_lifecycle_command
+        )
+        stats = controller.run_once(bots)
+        logger.info(
+            f"Fleet reconciliation: {stats['planned']} planned, {stats['submitted']} submitted, "
+            f"{stats['deferred']} deferred"
+        )
+        return stats
+    except Exception as e:
+        logger.error(f"Error reconciling fleet: {str(e)}")
+        return False
+    finally:
+        try:
+            lock.release()
+        except LockNotOwnedError:
+            logger.warning("Fleet reconciliation lock expired before the run finished")
+
+@celery.task
+def flush_bot_metrics():
+    """Move closed per-minute bot metrics from Redis into the database."""
+    try:
+        stats = metrics_store.flush_pending(get_redis())
+        if stats['buckets']:
+            logger.info(
+                f"Flushed {stats['buckets']} metric buckets into {stats['rows']} rows "
+                f"({stats['dropped']} of deleted bots dropped)"
+            )
+        return stats
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error flushing bot metrics: {str(e)}")
+        return False
+
+@celery.task
+def prune_bot_metrics():
+    """Delete bot metric buckets past their retention."""
+    try:
+        return metrics_store.prune()
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error pruning bot metrics: {str(e)}")
+        return False
@@ -0,0 +1,93 @@
+"""
+Cache of user records for request authentication.
+
+Flask-Login loads the user on every authenticated request, including
+every status and stats poll. User columns are cached in process memory
+for a few seconds and in Redis for longer, so most requests build the
+user without a database query. Password hashes are never cached; they
+are loaded from the database on access.
+"""
+
+import os
+import json
+import logging
+from typing import Dict, Optional
+from sqlalchemy.orm import make_transient_to_detached
+from app import db
+from app.bot_framework.cache import TTLCache
+from app.bot_framework.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+CACHED_COLUMNS = ('id', 'username', 'is_admin')
+
+# Seconds a user record is kept in Redis
+USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL', '60'))
+
+# Short local lifetime bounds how long other workers serve an edited user
+_local = TTLCache(
+    maxsize=int(os.getenv('USER_CACHE_SIZE', '1024')),
+    ttl=float(os.getenv('USER_CACHE_LOCAL_TTL', '5'))
+)
+
+def user_key(user_id: int) -> str:
+    """Redis key holding a cached user record."""
+    return f"user:{user_id}"
+
+def _fetch(user_id: int) -> Optional[Dict]:
+    """Get the cached columns of a user, loading them on a miss."""
+    data = _local.get(user_id)
+    if data is not None:
+        return data
+
+    try:
+        raw = get_redis().get(user_key(user_id))
+    except Exception as e:
+        logger.warning(f"Error reading user {user_id} from Redis: {e}")
+        raw = None
+    if raw is not None:
+        data = json.loads(raw)
+    else:
+        from app.models import User
+        user = db.session.get(User, user_id)
+        if user is None:
+            return None
+        data = {column: getattr(user, column) for column in CACHED_COLUMNS}
+        try:
+            get_redis().set(user_key(user_id), json.dumps(data), ex=USER_CACHE_TTL)
+        except Exception as e:
+            logger.warning(f"Error caching user {user_id} in Redis: {e}")
+
+    _local.set(user_id, data)
+    return data
+
+def load_cached_user(user_id: int):
+    """
+    Get a user attached to the current session, from cache if possible.
+
+    Args:
+        user_id: User id
+
+    Returns:
+        User or None if it does not exist
+    """
+    from app.models import User
+    data = _fetch(user_id)
+    if data is None:
+        return None
+    user = User(**data)
+    make_transient_to_detached(user)
+    # Attach without a SELECT; uncached columns load on first access
+    return db.session.merge(user, load=False)
+
+def invalidate_user(user_id: int) -> None:
+    """Drop a user from this process's cache and from Redis."""
+    _local.pop(user_id)
+    try:
+        get_redis().delete(user_key(user_id))
+    except Exception as e:
+        logger.warning(f"Error removing user {user_id} from Redis: {e}")
+
+def cache_stats() -> Dict:
+    """Get hit statistics of this process's user cache."""
+    return _local.stats()
@@ -0,0 +1,111 @@
+"""
+Load test for the async bot API.
+
+Opens many concurrent keep-alive connections that poll a bot's status the
+way the UI does, revalidating with If-None-Match, and reports throughput,
+latency percentiles and status codes.
+
+Usage:
+    python benchmarks/api_load.py --url http://localhost:8000 --bot-id 1 \
+        --cookie "session=..." --concurrency 2000 --duration 30
+
+The session cookie can be copied from a logged in browser.
+"""
+
+import time
+import asyncio
+import argparse
+from collections import Counter
+from urllib.parse import urlparse
+
+async def poller(host, port, path, cookie, deadline, latencies, codes, revalidate):
+    """Poll one endpoint over a single keep-alive connection until the deadline."""
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+    except OSError:
+        codes['connect_error'] += 1
+        return
+    etag = None
+    try:
+        while time.monotonic() < deadline:
+            request = (
+                f"GET {path} HTTP/1.1\r\n"
+                f"Host: {host}\r\n"
+                f"Cookie: {cookie}\r\n"
+            )
+            if revalidate and etag:
+                request += f"If-None-Match: {etag}\r\n"
+            started = time.monotonic()
+            writer.write((request + "\r\n").encode())
+            await writer.drain()
+
+            status_line = await reader.readline()
+            if not status_line:
+                codes['disconnected'] += 1
+                return
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                if name.lower() == 'content-length':
+                    length = int(value)
+                elif name.lower() == 'etag':
+                    etag = value.strip()
+            if length:
+                await reader.readexactly(length)
+
+            latencies.append(time.monotonic() - started)
+            codes[int(status_line.split()[1])] += 1
+    except (OSError, asyncio.IncompleteReadError):
+        codes['connection_error'] += 1
+    finally:
+        writer.close()
+
+def percentile(values, fraction):
+    """Get a percentile of sorted values."""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+async def run(args):
+    url = urlparse(args.url)
+    path = f"/api/bots/{args.bot_id}/{args.endpoint}"
+    deadline = time.monotonic() + args.duration
+    latencies = []
+    codes = Counter()
+
+    started = time.monotonic()
+    await asyncio.gather(*(
+        poller(url.hostname, url.port or 80, path, args.cookie, deadline,
+               latencies, codes, not args.no_revalidate)
+        for _ in range(args.concurrency)
+    ))
+    elapsed = time.monotonic() - started
+
+    latencies.sort()
+    print(f"Endpoint:     {path}")
+    print(f"Connections:  {args.concurrency}")
+    print(f"Requests:     {len(latencies)} in {elapsed:.1f}s ({len(latencies) / elapsed:.0f} req/s)")
+    print(
+        f"Latency (ms): p50 {percentile(latencies, 0.5) * 1000:.1f}, "
+        f"p95 {percentile(latencies, 0.95) * 1000:.1f}, "
+        f"p99 {percentile(latencies, 0.99) * 1000:.1f}, "
+        f"max {(latencies[-1] if latencies else 0) * 1000:.1f}"
+    )
+    print(f"Responses:    {dict(codes)}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the async bot API')
+    parser.add_argument('--url', default='http://localhost:8000', help='API base URL')
+    parser.add_argument('--bot-id', type=int, required=True, help='Bot to poll')
+    parser.add_argument('--cookie', required=True, help='Cookie header of a logged in session')
+    parser.add_argument('--endpoint', choices=('status', 'stats'), default='status')
+    parser.add_argument('--concurrency', type=int, default=1000, help='Concurrent pollers')
+    parser.add_argument('--duration', type=float, default=30, help='Test duration in seconds')
+    parser.add_argument('--no-revalidate', action='store_true', help='Do not send If-None-Match')
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""
+Benchmark of DiceMMOBot leaderboard operations.
+
+Loads a number of players into a leaderboard and measures the latency of
+adding points to a random player, reading the top 10 and looking up a
+player's rank. For comparison it also times the previous approach of
+sorting every player on each /leaderboard call.
+
+Usage:
+    PYTHONPATH=. python benchmarks/leaderboard.py --players 1000000 --backend redis \
+        --redis-url redis://localhost:6379/15
+
+The Redis backend writes to leaderboard:bench:* keys and deletes them
+afterwards; use a scratch database.
+"""
+
+import time
+import random
+import asyncio
+import argparse
+from app.bot_framework.leaderboard import WINDOWS, MemoryLeaderboard, RedisLeaderboard
+
+LOAD_BATCH = 10000
+
+def percentile(values, fraction):
+    """Get a percentile of sorted values."""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+def report(name, latencies):
+    """Print latency percentiles of an operation."""
+    latencies.sort()
+    print(
+        f"{name:<14} p50 {percentile(latencies, 0.5) * 1000:8.3f} ms   "
+        f"p99 {percentile(latencies, 0.99) * 1000:8.3f} ms   "
+        f"max {latencies[-1] * 1000:8.3f} ms"
+    )
+
+async def load(board, scores):
+    """Fill a leaderboard with initial scores."""
+    if isinstance(board, MemoryLeaderboard):
+        board.seed(scores)
+        return
+    items = list(scores.items())
+    for i in range(0, len(items), LOAD_BATCH):
+        async with board.client.pipeline(transaction=False) as pipe:
+            for window in WINDOWS:
+                pipe.zadd(board._key(window, None), dict(items[i:i + LOAD_BATCH]))
+            await pipe.execute()
+
+async def measure(board, players, operations):
+    """Time leaderboard operations on random players."""
+    adds, tops, ranks = [], [], []
+    for _ in range(operations):
+        member = random.randrange(players)
+
+        started = time.perf_counter()
+        await board.add(member, random.randint(1, 6))
+        adds.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await board.top('all', 10)
+        tops.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await board.rank(member)
+        ranks.append(time.perf_counter() - started)
+    report('add', adds)
+    report('top 10', tops)
+    report('rank', ranks)
+
+def measure_full_sort(scores, operations):
+    """Time the old approach: sort every player per request."""
+    players = {member: {'username': None, 'score': score} for member, score in scores.items()}
+    latencies = []
+    for _ in range(operations):
+        started = time.perf_counter()
+        leaderboard = [
+            (member, data['username'] or f"Player{member}", data['score'])
+            for member, data in players.items()
+        ]
+        sorted(leaderboard, key=lambda x: x[2], reverse=True)[:10]
+        latencies.append(time.perf_counter() - started)
+    report('full sort', latencies)
+
+async def run(args):
+    scores = {member: random.randint(0, 5000) for member in range(args.players)}
+    if args.backend == 'redis':
+        import redis.asyncio
+        client = redis.asyncio.Redis.from_url(args.redis_url)
+        board = RedisLeaderboard(client, 'bench')
+    else:
+        board = MemoryLeaderboard()
+
+    started = time.perf_counter()
+    await load(board, scores)
+    print(f"Loaded {args.players} players into {args.backend} in {time.perf_counter() - started:.1f}s")
+
+    try:
+        await measure(board, args.players, args.operations)
+        if not args.skip_sort:
+            measure_full_sort(scores, args.sort_operations)
+    finally:
+        if args.backend == 'redis':
+            keys = [key async for key in client.scan_iter('leaderboard:bench:*')]
+            if keys:
+                await client.delete(*keys)
+            await client.aclose()
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark DiceMMOBot leaderboards')
+    parser.add_argument('--players', type=int, default=1000000, help='Number of players')
+    parser.add_argument('--backend', choices=('memory', 'redis'), default='memory')
+    parser.add_argument('--redis-url', default='redis://localhost:6379/15', help='Scratch Redis database')
+    parser.add_argument('--operations', type=int, default=1000, help='Timed operations per kind')
+    parser.add_argument('--sort-operations', type=int, default=5, help='Timed full sorts')
+    parser.add_argument('--skip-sort', action='store_true', help='Do not time the full sort')
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Memory benchmark of DiceMMOBot player records.
+
+Builds the same players twice, once as the dicts with a datetime the bot
+used before and once as compact Player records, and reports the traced
+allocations per player including the user id mapping.
+
+Usage:
+    PYTHONPATH=. python benchmarks/player_memory.py --players 1000000
+"""
+
+import gc
+import random
+import argparse
+import tracemalloc
+from datetime import datetime, timedelta
+from app.bots.dice_mmo_bot import Player
+
+# Share of players that have set a username; the rest repeat a few common ones
+UNIQUE_NAMES = 0.5
+
+def username(user_id):
+    """Get a sample username as a fresh string, like one decoded from an update."""
+    if random.random() < UNIQUE_NAMES:
+        name = f"player_{user_id}"
+    else:
+        name = random.choice(('alex', 'max', 'sam', 'anna', 'dima'))
+    return name.encode().decode()
+
+def build_dicts(players, now):
+    """Build players in the previous dict format."""
+    return {
+        user_id: {
+            "score": random.randint(0, 5000),
+            "rolls_today": random.randint(0, 5),
+            "last_roll": now - timedelta(seconds=random.randint(0, 86400)),
+            "username": username(user_id)
+        }
+        for user_id in range(players)
+    }
+
+def build_records(players, now):
+    """Build players as Player records."""
+    return {
+        user_id: Player(
+            random.randint(0, 5000),
+            random.randint(0, 5),
+            now - timedelta(seconds=random.randint(0, 86400)),
+            username(user_id)
+        )
+        for user_id in range(players)
+    }
+
+def measure(name, build, players):
+    """Print the bytes per player allocated by a builder."""
+    random.seed(0)
+    now = datetime.utcnow()
+    gc.collect()
+    tracemalloc.start()
+    data = build(players, now)
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<8} {size / players:8.1f} bytes/player   {size / 2 ** 20:8.1f} MiB total")
+    del data
+    return size
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark DiceMMOBot player memory')
+    parser.add_argument('--players', type=int, default=1000000, help='Number of players')
+    args = parser.parse_args()
+
+    before = measure('dict', build_dicts, args.players)
+    after = measure('Player', build_records, args.players)
+    print(f"Player records use {after / before:.0%} of the dict memory")
+
+if __name__ == '__main__':
+    main()
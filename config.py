@@ -6,8 +6,60 @@ load_dotenv()
 class Config:
     SECRET_KEY = os.getenv('SECRET_KEY', 'dev-secret-key')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Comma separated read replica URLs; reads inside requests are routed to them
+    SQLALCHEMY_REPLICA_URLS = [url for url in os.getenv('DATABASE_REPLICA_URLS', '').split(',') if url]
+    # Seconds a user reads from the primary after their own writes
+    REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', '5'))
     CELERY_BROKER_URL = os.getenv('REDIS_URL', 'redis://redis:6379/0')
     CELERY_RESULT_BACKEND = os.getenv('REDIS_URL', 'redis://redis:6379/0')
+    CELERY_IMPORTS = ('app.tasks',)
+    
+    # Separate queues so update bursts, Docker work and monitoring cannot
+    # delay each other; see the worker roles in entrypoint.sh
+    CELERY_DEFAULT_QUEUE = 'default'
+    CELERY_ROUTES = {
+        'process_update': {'queue': 'ingress'},
+        'app.tasks.run_lifecycle_command': {'queue': 'lifecycle'},
+        'app.tasks.reconcile_fleet': {'queue': 'lifecycle'},
+        'app.tasks.monitor_tick': {'queue': 'monitoring', 'priority': 0},
+        'app.tasks.update_bot_status': {'queue': 'monitoring', 'priority': 3},
+        'update_bot_status': {'queue': 'monitoring', 'priority': 3},
+        'app.tasks.reconcile_bot_statuses': {'queue': 'monitoring', 'priority': 6},
+        'app.tasks.monitor_bots': {'queue': 'monitoring', 'priority': 6},
+        'app.tasks.flush_bot_metrics': {'queue': 'monitoring', 'priority': 6},
+        'app.tasks.prune_bot_metrics': {'queue': 'monitoring', 'priority': 9},
+    }
+    BROKER_TRANSPORT_OPTIONS = {
+        'queue_order_strategy': 'priority',
+        'priority_steps': list(range(10)),
+        'sep': ':'
+    }
+    CELERYD_PREFETCH_MULTIPLIER = 1
+    CELERYBEAT_SCHEDULE = {
+        # Each tick only checks the bots that are due on the adaptive schedule
+        'monitor-tick': {
+            'task': 'app.tasks.monitor_tick',
+            'schedule': float(os.getenv('MONITOR_TICK_INTERVAL', '5')),
+            'options': {'expires': float(os.getenv('MONITOR_TICK_INTERVAL', '5'))}
+        },
+        # Converge Docker and Redis towards the desired state in the DB
+        'fleet-controller': {
+            'task': 'app.tasks.reconcile_fleet',
+            'schedule': float(os.getenv('CONTROLLER_INTERVAL', '30')),
+            'options': {'expires': float(os.getenv('CONTROLLER_INTERVAL', '30'))}
+        },
+        # Move closed per-minute bot metrics from Redis into the database
+        'flush-bot-metrics': {
+            'task': 'app.tasks.flush_bot_metrics',
+            'schedule': float(os.getenv('METRICS_FLUSH_INTERVAL', '60')),
+            'options': {'expires': float(os.getenv('METRICS_FLUSH_INTERVAL', '60'))}
+        },
+        'prune-bot-metrics': {
+            'task': 'app.tasks.prune_bot_metrics',
+            'schedule': 3600.0,
+            'options': {'expires': 3600.0}
+        }
+    }
     LOG_LEVEL = 'INFO'
     WTF_CSRF_ENABLED = True
 
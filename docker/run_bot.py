@@ -8,9 +8,13 @@ import json
 import logging
 import asyncio
 import signal
+from datetime import datetime
 from typing import Optional
-import redis
 from app.models import TelegramBot
+from app.bot_framework.heartbeat import HeartbeatSender, clear_heartbeat
+from app.bot_framework.keys import token_fingerprint
+from app.bot_framework.redis_client import get_redis
+from app.bot_framework.status_index import StatusIndex
 from app.bots.number_converter_bot import NumberConverterBot
 from app.bots.dice_mmo_bot import DiceMMOBot
 
@@ -37,46 +41,60 @@ class BotRunner:
         self.webhook_host = os.getenv('WEBHOOK_HOST')
         self.webhook_port = int(os.getenv('WEBHOOK_PORT', '8443'))
         self.container_name = os.getenv('CONTAINER_NAME')
+        self.heartbeat_interval = float(os.getenv('HEARTBEAT_INTERVAL', '10'))
         
         if not all([self.bot_token, self.bot_type, self.webhook_host]):
             raise ValueError("Missing required environment variables")
         
-        self.redis = redis.from_url(os.getenv('REDIS_URL', 'redis://redis:6379/0'))
+        # Redis keys and the webhook path use the fingerprint instead of the token
+        self.fingerprint = token_fingerprint(self.bot_token)
+        self.webhook_url = f"https://{self.webhook_host}:{self.webhook_port}/webhook/{self.fingerprint}"
+        
+        self.redis = get_redis()
+        self.status_index = StatusIndex(self.redis)
         self.bot_instance = None
+        self.heartbeat = None
         self.running = False
-        
-        # Set up signal handlers
-        signal.signal(signal.SIGTERM, self.handle_signal)
-        signal.signal(signal.SIGINT, self.handle_signal)
+        # Set by termination signals; start_bot then stops the bot in its loop
+        self.stop_requested: Optional[asyncio.Event] = None
     
-    def handle_signal(self, signum, frame):
+    def handle_signal(self, signum: int):
         """Handle termination signals."""
         logger.info(f"Received signal {signum}")
         self.running = False
-        if self.bot_instance:
-            asyncio.run(self.stop_bot())
-        sys.exit(0)
+        if self.stop_requested is not None:
+            self.stop_requested.set()
+    
+    def install_signal_handlers(self):
+        """Route SIGTERM and SIGINT to handle_signal inside the running event loop."""
+        self.stop_requested = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(signum, self.handle_signal, signum)
     
     def update_status(self, status: str, error: Optional[str] = None):
-        """Update bot status in Redis."""
-        self.redis.hset(
-            f"bot:{self.bot_token}",
-            mapping={
-                'status': status,
+        """Update bot status and fleet indexes in Redis."""
+        self.status_index.transition(
+            self.fingerprint,
+            status,
+            bot_type=self.bot_type,
+            fields={
                 'error': error or '',
                 'container': self.container_name,
-                'webhook_url': f"https://{self.webhook_host}:{self.webhook_port}/webhook/{self.bot_token}"
+                'webhook_url': self.webhook_url,
+                'last_update': datetime.utcnow().isoformat()
             }
         )
     
     async def setup_webhook(self):
         """Set up webhook for the bot."""
-        webhook_url = f"https://{self.webhook_host}:{self.webhook_port}/webhook/{self.bot_token}"
-        await self.bot_instance.application.bot.set_webhook(webhook_url)
-        logger.info(f"Webhook set to {webhook_url}")
+        await self.bot_instance.application.bot.set_webhook(self.webhook_url)
+        logger.info(f"Webhook set to {self.webhook_url}")
     
     async def start_bot(self):
-        """Start the bot."""
+        """Start the bot and run it until a termination signal arrives."""
+        self.install_signal_handlers()
+        failed = False
         try:
             # Get bot class
             bot_class = BOT_TYPES.get(self.bot_type)
@@ -100,23 +118,48 @@ class BotRunner:
             self.update_status('running')
             self.running = True
             
+            # Report liveness, loop lag and queue depth until stopped
+            self.heartbeat = HeartbeatSender(
+                self.redis,
+                self.fingerprint,
+                interval=self.heartbeat_interval,
+                queue_depth=self.bot_instance.application.update_queue.qsize,
+                metrics=self.bot_instance.metrics
+            )
+            self.heartbeat.start()
+            
             # Keep the bot running
-            while self.running:
-                await asyncio.sleep(1)
+            await self.stop_requested.wait()
         
         except Exception as e:
+            failed = True
             error_msg = str(e)
             logger.error(f"Error running bot: {error_msg}")
             self.update_status('error', error_msg)
             raise
+        finally:
+            # Also runs on errors so pending state and scheduled sends are written
+            await self.stop_bot(report=not failed)
     
-    async def stop_bot(self):
-        """Stop the bot."""
+    async def stop_bot(self, report: bool = True):
+        """
+        Stop the bot.
+        
+        Args:
+            report: Publish stopping/stopped statuses; False keeps an error status
+        """
         try:
+            if self.heartbeat:
+                await self.heartbeat.stop()
+                # Counters of the last partial interval
+                self.heartbeat.flush_metrics()
             if self.bot_instance:
-                self.update_status('stopping')
+                if report:
+                    self.update_status('stopping')
                 await self.bot_instance.stop()
-                self.update_status('stopped')
+                if report:
+                    self.update_status('stopped')
+                    clear_heartbeat(self.redis, self.fingerprint)
         except Exception as e:
             logger.error(f"Error stopping bot: {e}")
             self.update_status('error', str(e))
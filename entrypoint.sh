@@ -24,14 +24,35 @@ flask db init
 flask db migrate -m "Initial migration"
 # Apply migration
 flask db upgrade
+# Fingerprints of bots registered before the column existed
+flask backfill-fingerprints
 
 # Start application based on container role
 if [ "${CONTAINER_ROLE:-web}" = "web" ]; then
     echo "Starting web server..."
     gunicorn --bind 0.0.0.0:5000 --workers 4 --timeout 120 "app:create_app()"
+elif [ "${CONTAINER_ROLE}" = "api" ]; then
+    echo "Starting async API server..."
+    uvicorn app.asgi:application --host 0.0.0.0 --port 8000 --workers ${API_WORKERS:-2} \
+        --timeout-keep-alive 75
 elif [ "${CONTAINER_ROLE}" = "celery" ]; then
-    echo "Starting Celery worker..."
-    celery -A app.celery worker --loglevel=info
+    echo "Starting Celery worker for all queues..."
+    celery -A app.celery worker --loglevel=info -Q ingress,lifecycle,monitoring,default
+elif [ "${CONTAINER_ROLE}" = "worker-ingress" ]; then
+    echo "Starting Celery ingress worker..."
+    celery -A app.celery worker --loglevel=info -Q ingress -n ingress@%h \
+        --concurrency=${CELERY_CONCURRENCY:-8} --prefetch-multiplier=4
+elif [ "${CONTAINER_ROLE}" = "worker-lifecycle" ]; then
+    echo "Starting Celery lifecycle worker..."
+    celery -A app.celery worker --loglevel=info -Q lifecycle -n lifecycle@%h \
+        --concurrency=${CELERY_CONCURRENCY:-4} --prefetch-multiplier=1 -O fair
+elif [ "${CONTAINER_ROLE}" = "worker-monitoring" ]; then
+    echo "Starting Celery monitoring worker..."
+    celery -A app.celery worker --loglevel=info -Q monitoring,default -n monitoring@%h \
+        --concurrency=${CELERY_CONCURRENCY:-2} --prefetch-multiplier=1
+elif [ "${CONTAINER_ROLE}" = "beat" ]; then
+    echo "Starting Celery beat..."
+    celery -A app.celery beat --loglevel=info --schedule /tmp/celerybeat-schedule
 else
     echo "Unknown container role: ${CONTAINER_ROLE}"
     exit 1
@@ -3,6 +3,7 @@ Test suite for bot management functionality.
 """
 
 import json
+import time
 import pytest
 from unittest.mock import patch, MagicMock
 from datetime import datetime
@@ -47,7 +48,7 @@ def auth_client(app, client):
 @pytest.fixture
 def mock_redis():
     """Mock Redis connection."""
-    with patch('redis.from_url') as mock:
+    with patch('app.bot_framework.bot_monitor.get_redis') as mock:
         mock.return_value = MagicMock()
         yield mock.return_value
 
@@ -162,4 +163,970 @@ def test_unauthorized_access(client):
     for route in routes:
         response = client.get(route)
         assert response.status_code == 302  # Redirect to login
-        assert b'/auth/login' in response.data
\ No newline at end of file
+        assert b'/auth/login' in response.data
+
+def test_heartbeat_updates_liveness_index(mock_redis):
+    """Test heartbeat writes liveness key and last-seen index."""
+    from app.bot_framework.heartbeat import write_heartbeat
+    
+    pipe = mock_redis.pipeline.return_value
+    write_heartbeat(mock_redis, 'test_token', interval=10, loop_lag_ms=2.5, queue_depth=3, now=1000.0)
+    
+    pipe.set.assert_called_once_with('bot_alive:test_token', '1000.000', ex=30)
+    pipe.zadd.assert_called_once_with('bots:last_seen', {'test_token': 1000.0})
+    mapping = pipe.hset.call_args.kwargs['mapping']
+    assert mapping['loop_lag_ms'] == '2.5'
+    assert mapping['queue_depth'] == '3'
+    assert mapping['last_update']
+    pipe.execute.assert_called_once()
+
+def test_stale_bots_query(bot_monitor, mock_redis):
+    """Test stale bots are found with a range query on the last-seen index."""
+    mock_redis.zrangebyscore.return_value = [b'dead_token']
+    
+    with patch('app.bot_framework.bot_monitor.time.time', return_value=1000.0):
+        stale = bot_monitor.get_stale_bots(max_age=60)
+    
+    assert stale == ['dead_token']
+    mock_redis.zrangebyscore.assert_called_once_with('bots:last_seen', '-inf', 940.0)
+
+def test_shared_redis_client():
+    """Test Redis clients are shared per URL and expose pool stats."""
+    from app.bot_framework.redis_client import get_redis, get_pool_stats, reset_redis_clients
+    
+    url = 'redis://:secret@localhost:6399/1'
+    client = get_redis(url)
+    try:
+        assert get_redis(url) is client
+        stats = get_pool_stats()['redis://:****@localhost:6399/1']
+        assert stats['created'] == 0
+        assert stats['in_use'] == 0
+    finally:
+        reset_redis_clients()
+
+def test_status_index_counts(mock_redis):
+    """Test fleet counts come from the counter hashes."""
+    from app.bot_framework.status_index import StatusIndex
+    
+    index = StatusIndex(mock_redis)
+    mock_redis.hgetall.return_value = {b'running': b'3', b'error': b'1', b'stopping': b'0'}
+    
+    counts = index.status_counts()
+    assert counts['running'] == 3
+    assert counts['error'] == 1
+    assert counts['stopped'] == 0
+    mock_redis.hgetall.assert_called_with('bots:counts:status')
+    
+    script = mock_redis.register_script.return_value
+    script.return_value = b'starting'
+    assert index.transition('tok', 'running', bot_type='dice_mmo', fields={'error': ''}) == 'starting'
+    call = script.call_args_list[-1]
+    assert call.kwargs['keys'][0] == 'bot:tok'
+    assert call.kwargs['args'][:3] == ['tok', 'running', 'dice_mmo']
+
+def test_bot_monitor_cache(bot_monitor, mock_redis):
+    """Test status reads are cached and invalidated by status events."""
+    mock_redis.hgetall.return_value = {b'status': b'running'}
+    
+    assert bot_monitor.get_bot_status('test_token')['status'] == 'running'
+    mock_redis.hgetall.return_value = {b'status': b'stopped'}
+    assert bot_monitor.get_bot_status('test_token')['status'] == 'running'
+    assert mock_redis.hgetall.call_count == 1
+    
+    bot_monitor._on_status_event({'data': b'test_token'})
+    assert bot_monitor.get_bot_status('test_token')['status'] == 'stopped'
+    
+    stats = bot_monitor.cache_stats()
+    assert stats['hits'] == 1
+    assert stats['misses'] == 2
+
+def test_bot_monitor_close(bot_monitor, mock_redis):
+    """Test closing a monitor stops its listener and worker tasks share one monitor."""
+    from app import tasks
+    
+    listener = mock_redis.pubsub.return_value.run_in_thread.return_value
+    bot_monitor.get_bot_status('test_token')
+    assert bot_monitor.cache_stats()['invalidation'] is True
+    
+    bot_monitor.close()
+    listener.stop.assert_called_once()
+    listener.pubsub.close.assert_called_once()
+    bot_monitor.get_bot_status('test_token')
+    assert mock_redis.pubsub.call_count == 1
+    
+    with patch.object(tasks, '_monitor', None):
+        monitor = tasks.get_monitor()
+        assert tasks.get_monitor() is monitor
+        monitor.get_bot_status('test_token')
+        assert mock_redis.pubsub.call_count == 1
+
+def test_reconcile_statuses_updates_changed_rows(app):
+    """Test batched reconciliation only writes rows that changed."""
+    from app.tasks import reconcile_statuses
+    from app.bot_framework.keys import token_fingerprint
+    
+    bots = [
+        TelegramBot(bot_token=f'token{i}', bot_type='number_converter', user_id=1, status='running')
+        for i in range(5)
+    ]
+    db.session.add_all(bots)
+    db.session.commit()
+    
+    failing = token_fingerprint('token3')
+    monitor = MagicMock()
+    monitor.get_bot_statuses.side_effect = lambda fingerprints: {
+        fingerprint: {
+            'status': 'error' if fingerprint == failing else 'running',
+            'error': 'boom' if fingerprint == failing else '',
+            'webhook_url': '',
+            'last_update': ''
+        }
+        for fingerprint in fingerprints
+    }
+    
+    stats = reconcile_statuses(chunk_size=2, monitor=monitor)
+    
+    assert stats['scanned'] == 5
+    assert stats['chunks'] == 3
+    assert stats['changed'] == 1
+    assert monitor.get_bot_statuses.call_count == 3
+    bot = TelegramBot.query.filter_by(bot_token='token3').first()
+    assert bot.status == 'error'
+    assert bot.error_message == 'boom'
+
+def test_tasks_run_in_app_context(app, mock_redis):
+    """Test Celery tasks push an app context when none is active."""
+    import threading
+    from flask import has_app_context
+    from app.tasks import update_bot_status
+    
+    bot = TelegramBot(bot_token='123:abc', bot_type='dice_mmo', status='stopped')
+    db.session.add(bot)
+    db.session.commit()
+    bot_id = bot.id
+    mock_redis.hgetall.return_value = {b'status': b'running'}
+    
+    results = []
+    def run_task():
+        # Worker threads start without a Flask app context
+        results.append(has_app_context())
+        results.append(update_bot_status(bot_id))
+    
+    with patch('app._flask_app', app), patch('app.tasks._monitor', None):
+        thread = threading.Thread(target=run_task)
+        thread.start()
+        thread.join()
+    
+    assert results == [False, True]
+    db.session.refresh(bot)
+    assert bot.status == 'running'
+
+def test_periodic_tasks_survive_expired_lock(app):
+    """Test a tick or reconcile outliving its lock keeps its result."""
+    fakeredis = pytest.importorskip('fakeredis')
+    from app.tasks import monitor_tick, reconcile_fleet
+    
+    client = fakeredis.FakeRedis()
+    monitor = MagicMock(redis=client)
+    
+    def expire_lock(*args, **kwargs):
+        # The run takes longer than the lock timeout
+        client.delete('monitor:tick:lock', 'controller:lock')
+        return {'due': 1, 'changed': 0, 'lag_ms': 0.0}
+    
+    with patch('app.tasks.get_monitor', return_value=monitor), \
+            patch('app.tasks.run_monitor_tick', side_effect=expire_lock):
+        assert monitor_tick() == {'due': 1, 'changed': 0, 'lag_ms': 0.0}
+    
+    with patch('app.tasks.get_monitor', return_value=monitor), \
+            patch('app.bot_framework.container_manager.ContainerManager'), \
+            patch('app.controller.FleetController') as controller:
+        controller.return_value.run_once.side_effect = lambda bots: dict(
+            expire_lock(), planned=0, submitted=0, deferred=0
+        )
+        assert reconcile_fleet()['planned'] == 0
+    assert not client.exists('monitor:tick:lock', 'controller:lock')
+
+def test_adaptive_schedule_intervals(mock_redis):
+    """Test changed bots are checked soon and stable bots back off."""
+    from app.monitoring import AdaptiveSchedule
+    
+    schedule = AdaptiveSchedule(mock_redis, min_interval=10, max_interval=60, backoff=2, jitter=0.1)
+    assert schedule.next_interval(None, changed=False) == 10
+    assert schedule.next_interval(40, changed=True) == 10
+    assert schedule.next_interval(20, changed=False) == 40
+    assert schedule.next_interval(40, changed=False) == 60
+    
+    mock_redis.hmget.return_value = [b'20', None]
+    schedule.reschedule({1: False, 2: True}, now=1000.0)
+    due = mock_redis.pipeline.return_value.zadd.call_args.args[1]
+    assert 1000 + 36 <= due[1] <= 1000 + 44
+    assert 1000 + 9 <= due[2] <= 1000 + 11
+
+def test_lifecycle_commands_coalesce(mock_redis):
+    """Test only the first pending lifecycle command enqueues a task."""
+    from app.tasks import submit_lifecycle_command
+    
+    queue = MagicMock()
+    queue.submit.side_effect = [True, False, False]
+    with patch('app.tasks.run_lifecycle_command') as task:
+        assert submit_lifecycle_command(1, 'start', queue=queue) is True
+        assert submit_lifecycle_command(1, 'restart', queue=queue) is False
+        assert submit_lifecycle_command(1, 'stop', queue=queue) is False
+    
+    task.delay.assert_called_once_with(1)
+
+def test_lifecycle_command_lock_handling(app):
+    """Test an expired lock does not fail a finished command and retries are bounded."""
+    from redis.exceptions import LockNotOwnedError
+    from app.tasks import LIFECYCLE_MAX_RETRIES, run_lifecycle_command
+    
+    queue = MagicMock()
+    queue.next_intent.return_value = ('start', 1)
+    queue.complete.return_value = True
+    lock = queue.lock.return_value
+    lock.release.side_effect = LockNotOwnedError('expired')
+    with patch('app.tasks.LifecycleQueue', return_value=queue), patch('app.tasks.get_redis'), \
+            patch('app.tasks.execute_lifecycle_action') as execute:
+        assert run_lifecycle_command.apply(args=(1,)).get() is True
+        execute.assert_called_once_with(1, 'start')
+        
+        # A lock that is never freed ends the retries instead of looping forever
+        lock.acquire.return_value = False
+        result = run_lifecycle_command.apply(args=(1,), retries=LIFECYCLE_MAX_RETRIES)
+        assert result.get() is False
+
+def test_lifecycle_orphaned_commands_requeue(app):
+    """Test a bot is not wedged after a give-up or a lost task."""
+    fakeredis = pytest.importorskip('fakeredis')
+    from app.lifecycle import LifecycleQueue
+    from app.tasks import LIFECYCLE_MAX_RETRIES, run_lifecycle_command, submit_lifecycle_command
+    
+    client = fakeredis.FakeRedis()
+    queue = LifecycleQueue(client, lock_timeout=300)
+    assert queue.submit(1, 'start') is True
+    
+    # Another worker holds the lock until the task gives up
+    holder = queue.lock(1)
+    assert holder.acquire()
+    with patch('app.tasks.get_redis', return_value=client):
+        result = run_lifecycle_command.apply(args=(1,), retries=LIFECYCLE_MAX_RETRIES)
+    assert result.get() is False
+    holder.release()
+    with patch('app.tasks.run_lifecycle_command') as task:
+        assert submit_lifecycle_command(1, 'stop', queue=queue) is True
+    task.delay.assert_called_once_with(1)
+    
+    # A slot whose task never ran is re-enqueued once it is older than the lock timeout
+    assert queue.submit(1, 'restart') is False
+    with patch('app.lifecycle.time.time', return_value=time.time() + 301):
+        assert queue.submit(1, 'restart') is True
+    assert queue.submit(1, 'start') is False
+    assert queue.stats()['orphaned'] == 1
+
+def test_fleet_controller_plan():
+    """Test the controller plans the minimal actions towards desired state."""
+    from app.controller import plan_actions
+    
+    bots = [
+        {'id': 1, 'fingerprint': 't1', 'container': 'bot_t1', 'desired': 'running'},
+        {'id': 2, 'fingerprint': 't2', 'container': 'bot_t2', 'desired': 'running'},
+        {'id': 3, 'fingerprint': 't3', 'container': 'bot_t3', 'desired': 'running'},
+        {'id': 4, 'fingerprint': 't4', 'container': 'bot_t4', 'desired': 'stopped'},
+        {'id': 5, 'fingerprint': 't5', 'container': 'bot_t5', 'desired': 'running'},
+    ]
+    statuses = {
+        't2': {'status': 'running'},
+        't3': {'status': 'running'},
+        't5': {'status': 'error'},
+    }
+    actions = plan_actions(bots, {'bot_t2', 'bot_t3', 'bot_t4', 'bot_t5'}, statuses, {'t2'})
+    
+    assert [(a['bot_id'], a['action']) for a in actions] == [
+        (1, 'start'), (3, 'restart'), (4, 'stop'), (5, 'restart')
+    ]
+
+def test_fleet_controller_limits(mock_redis):
+    """Test the controller respects the in-flight cap and cooldowns."""
+    from app.controller import FleetController
+    
+    monitor = MagicMock(redis=mock_redis)
+    lifecycle = MagicMock()
+    lifecycle.in_flight.return_value = 8
+    submit = MagicMock()
+    mock_redis.set.side_effect = [True, False, True, True]
+    controller = FleetController(monitor, MagicMock(), lifecycle, submit,
+                                 max_actions=5, max_in_flight=10, cooldown=60)
+    
+    actions = [{'bot_id': i, 'action': 'start', 'reason': 'test'} for i in range(4)]
+    stats = controller.apply(actions)
+    
+    assert stats == {'submitted': 2, 'cooling_down': 1, 'deferred': 1}
+    assert [c.args for c in submit.call_args_list] == [(0, 'start'), (2, 'start')]
+
+def test_fleet_controller_ignores_orphaned_commands():
+    """Test orphaned lifecycle slots do not use up the in-flight budget."""
+    fakeredis = pytest.importorskip('fakeredis')
+    from app.controller import FleetController
+    from app.lifecycle import LifecycleQueue
+    
+    client = fakeredis.FakeRedis()
+    lifecycle = LifecycleQueue(client, lock_timeout=300)
+    with patch('app.lifecycle.time.time', return_value=time.time() - 600):
+        for bot_id in range(3):
+            lifecycle.submit(bot_id, 'start')
+    lifecycle.submit(3, 'start')
+    assert lifecycle.lock(0).acquire()
+    assert lifecycle.depth() == 4
+    assert lifecycle.in_flight() == 2
+    
+    # Liveness is only read for the bots of the current chunk
+    client.zadd('bots:last_seen', {'t1': time.time(), 't2': time.time() - 600, 'other': time.time()})
+    with patch('app.bot_framework.bot_monitor.get_redis', return_value=client):
+        monitor = BotMonitor(invalidate=False)
+    container_manager = MagicMock()
+    container_manager.list_bots.return_value = []
+    controller = FleetController(monitor, container_manager, lifecycle, MagicMock(),
+                                 max_actions=5, max_in_flight=3)
+    observed = controller.observe([{'fingerprint': 't1'}, {'fingerprint': 't2'}, {'fingerprint': 't3'}])
+    assert observed['live_fingerprints'] == {'t1'}
+    
+    actions = [{'bot_id': i, 'action': 'start', 'reason': 'test'} for i in range(10, 13)]
+    assert controller.apply(actions)['submitted'] == 1
+
+def test_setup_complete_cache():
+    """Test the setup flag is cached and invalidated when users change."""
+    from app import setup_state
+    
+    client = MagicMock()
+    client.get.return_value = None
+    with patch('app.setup_state.get_redis', return_value=client), \
+         patch('app.setup_state._query_setup_complete', return_value=True) as query:
+        setup_state.invalidate_setup_complete()
+        
+        assert setup_state.is_setup_complete()
+        assert setup_state.is_setup_complete()
+        assert query.call_count == 1
+        client.set.assert_called_once_with(setup_state.SETUP_COMPLETE_KEY, 1)
+        
+        # Another worker already cached the flag in Redis
+        setup_state.invalidate_setup_complete()
+        client.get.return_value = b'1'
+        assert setup_state.is_setup_complete()
+        assert query.call_count == 1
+        
+        # Redis down: fall back to the database
+        setup_state.invalidate_setup_complete()
+        client.get.side_effect = ConnectionError()
+        query.return_value = False
+        assert not setup_state.is_setup_complete()
+        assert query.call_count == 2
+
+def test_setup_cache_invalidated_on_user_commit(app):
+    """Test committing a user change clears the cached setup flag."""
+    with patch('app.setup_state.invalidate_setup_complete') as invalidate:
+        with app.app_context():
+            user = User(username='setup_cache_user')
+            user.set_password('password')
+            db.session.add(user)
+            db.session.commit()
+            invalidate.assert_called_once()
+            
+            db.session.delete(user)
+            db.session.commit()
+            assert invalidate.call_count == 2
+
+def test_system_checks_run_concurrently(app):
+    """Test system checks run in parallel and slow checks time out."""
+    import time
+    from app.routes import setup
+    
+    def slow_check(*args, **kwargs):
+        time.sleep(0.3)
+        return {'status': 'ok', 'message': 'slow'}
+    
+    def hung_check():
+        time.sleep(2)
+        return {'status': 'ok', 'message': 'hung'}
+    
+    with patch.object(setup, 'check_database', slow_check), \
+         patch.object(setup, 'check_redis', slow_check), \
+         patch.object(setup, 'check_users', slow_check), \
+         patch.object(setup, 'check_bots', slow_check), \
+         patch.object(setup, 'check_monitoring', hung_check):
+        with app.app_context():
+            started = time.monotonic()
+            results = setup.run_checks(timeout=1)
+            elapsed = time.monotonic() - started
+    
+    assert elapsed < 1.5
+    assert results['database'] == {'status': 'ok', 'message': 'slow'}
+    assert results['users']['status'] == 'ok'
+    assert results['monitoring']['status'] == 'error'
+    assert 'timed out' in results['monitoring']['message']
+    
+    # Checks share one bounded pool instead of leaving new threads behind
+    import threading
+    threads = [t for t in threading.enumerate() if t.name.startswith('system-check')]
+    assert len(threads) <= setup._check_executor._max_workers
+
+def test_database_check_counts(app):
+    """Test table counts are exact outside PostgreSQL."""
+    from app.routes.setup import check_database
+    
+    with app.app_context():
+        result = check_database()
+    
+    assert result['status'] == 'ok'
+    assert '~' not in result['message']
+    assert result['estimated'] is False
+
+def test_keyset_bot_pagination(app):
+    """Test bot pages follow (created_at, id) order with filters."""
+    from datetime import timedelta
+    from app.routes.bots import query_bots, decode_cursor
+    
+    user = User(username='pager')
+    user.set_password('password')
+    db.session.add(user)
+    db.session.flush()
+    
+    base = datetime(2024, 1, 1)
+    for i in range(7):
+        db.session.add(TelegramBot(
+            bot_token=f'pager_token_{i}',
+            bot_username=f'pager_bot_{i}',
+            user_id=user.id,
+            bot_type='dice_mmo' if i % 2 else 'number_converter',
+            status='running' if i < 3 else 'stopped',
+            # Two bots share a timestamp so the id breaks the tie
+            created_at=base + timedelta(minutes=min(i, 5))
+        ))
+    db.session.commit()
+    
+    seen = []
+    cursor = None
+    while True:
+        bots, cursor = query_bots(user.id, cursor=cursor, limit=3)
+        seen.extend(bot.bot_username for bot in bots)
+        if cursor is None:
+            break
+    assert seen == [f'pager_bot_{i}' for i in (6, 5, 4, 3, 2, 1, 0)]
+    
+    bots, cursor = query_bots(user.id, status='running', bot_type='dice_mmo')
+    assert [bot.bot_username for bot in bots] == ['pager_bot_1']
+    assert cursor is None
+    
+    bots, _ = query_bots(user.id, search='bot_4')
+    assert [bot.bot_username for bot in bots] == ['pager_bot_4']
+    
+    # Wildcard characters in the search are matched literally
+    assert query_bots(user.id, search='%')[0] == []
+    assert query_bots(user.id, search='bot%4')[0] == []
+    assert len(query_bots(user.id, search='_')[0]) == 7
+    assert query_bots(user.id, search='bot__')[0] == []
+    
+    with pytest.raises(ValueError):
+        decode_cursor('not-a-cursor')
+
+def test_status_conditional_get(app, client):
+    """Test the status endpoint answers 304 until the status version changes."""
+    admin = User(username='etag_admin', is_admin=True)
+    admin.set_password('password')
+    db.session.add(admin)
+    db.session.flush()
+    bot = TelegramBot(bot_token='etag_token', user_id=admin.id, bot_type='dice_mmo')
+    db.session.add(bot)
+    db.session.commit()
+    
+    status = {
+        'status': 'running', 'error': '', 'webhook_url': '', 'type': 'dice_mmo',
+        'last_update': '2024-01-01T00:00:00', 'version': 3
+    }
+    with patch('app.setup_state.get_redis', side_effect=ConnectionError()), \
+         patch('app.routes.bots.bot_monitor') as monitor:
+        monitor.get_bot_status.return_value = status
+        client.post('/auth/login', data={'username': 'etag_admin', 'password': 'password'})
+        
+        response = client.get(f'/bots/status/{bot.id}')
+        assert response.status_code == 200
+        assert response.get_json()['status'] == 'running'
+        etag = response.headers['ETag']
+        assert 'max-age=' in response.headers['Cache-Control']
+        assert 'private' in response.headers['Cache-Control']
+        assert 'Cookie' in response.headers['Vary']
+        
+        response = client.get(f'/bots/status/{bot.id}', headers={'If-None-Match': etag})
+        assert response.status_code == 304
+        assert response.data == b''
+        
+        status['version'] = 4
+        response = client.get(f'/bots/status/{bot.id}', headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        assert response.headers['ETag'] != etag
+        
+        # The webhook helper contains the raw token and is never stored
+        response = client.get(f'/bots/webhook-url/{bot.id}')
+        assert 'etag_token' in response.get_json()['test_command']
+        assert response.headers['Cache-Control'] == 'private, no-store'
+
+def test_async_api_status(app):
+    """Test the ASGI API authenticates by session cookie and answers 304."""
+    import asyncio
+    from unittest.mock import AsyncMock
+    from app.asgi import BotAPI
+    
+    owner = User(username='api_owner')
+    owner.set_password('password')
+    db.session.add(owner)
+    db.session.flush()
+    bot = TelegramBot(bot_token='api_token', user_id=owner.id, bot_type='dice_mmo')
+    db.session.add(bot)
+    db.session.commit()
+    
+    client = MagicMock()
+    client.hgetall = AsyncMock(return_value={
+        b'status': b'running', b'version': b'7', b'last_update': b'2024-01-01T00:00:00'
+    })
+    api = BotAPI(app, redis_client=client)
+    cookie = f"session={api.serializer.dumps({'_user_id': str(owner.id)})}"
+    
+    def request(path, headers=()):
+        messages = []
+        
+        async def send(message):
+            messages.append(message)
+        
+        scope = {
+            'type': 'http', 'method': 'GET', 'path': path,
+            'headers': [(k.encode(), v.encode()) for k, v in headers]
+        }
+        asyncio.run(api(scope, AsyncMock(), send))
+        return messages[0]['status'], dict(messages[0]['headers']), messages[1]['body']
+    
+    status, headers, body = request(f'/api/bots/{bot.id}/status', [('cookie', cookie)])
+    assert status == 200
+    assert json.loads(body)['status'] == 'running'
+    
+    status, _, body = request(f'/api/bots/{bot.id}/status', [
+        ('cookie', cookie), ('if-none-match', headers[b'etag'].decode())
+    ])
+    assert (status, body) == (304, b'')
+    
+    assert request(f'/api/bots/{bot.id}/status')[0] == 401
+    assert request(f'/api/bots/{bot.id + 1}/status', [('cookie', cookie)])[0] == 404
+
+def test_cached_user_loading(app):
+    """Test authenticated requests load users without querying the database."""
+    from sqlalchemy import event
+    from app import user_cache
+    from app.models import load_user
+    
+    user = User(username='cached_user', is_admin=True)
+    user.set_password('password')
+    db.session.add(user)
+    db.session.commit()
+    user_id = user.id
+    db.session.expunge_all()
+    
+    queries = []
+    def count(*args):
+        queries.append(args)
+    
+    client = MagicMock()
+    client.get.return_value = None
+    with patch('app.user_cache.get_redis', return_value=client):
+        user_cache.invalidate_user(user_id)
+        event.listen(db.engine, 'before_cursor_execute', count)
+        try:
+            loaded = load_user(str(user_id))
+            assert len(queries) == 1
+            client.set.assert_called_once()
+            
+            db.session.expunge_all()
+            for _ in range(3):
+                loaded = load_user(str(user_id))
+            assert len(queries) == 1
+            assert loaded.username == 'cached_user' and loaded.is_admin
+            
+            # Password hashes are not cached but load on access
+            assert loaded.check_password('password')
+            assert len(queries) == 2
+            
+            # Another worker populated Redis
+            user_cache.invalidate_user(user_id)
+            db.session.expunge_all()
+            client.get.return_value = client.set.call_args.args[1]
+            assert load_user(str(user_id)).username == 'cached_user'
+            assert len(queries) == 2
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', count)
+
+def test_admin_bot_list_query_count(app):
+    """Test the admin bot list loads owners without a query per row."""
+    from sqlalchemy import event
+    from app.admin import BotModelView
+    
+    owners = []
+    for i in range(5):
+        owner = User(username=f'admin_list_owner_{i}')
+        owner.set_password('password')
+        db.session.add(owner)
+        owners.append(owner)
+    db.session.flush()
+    for i in range(30):
+        db.session.add(TelegramBot(
+            bot_token=f'admin_list_token_{i}',
+            bot_username=f'admin_list_bot_{i}',
+            user_id=owners[i % 5].id,
+            bot_type='dice_mmo'
+        ))
+    db.session.commit()
+    db.session.expunge_all()
+    
+    view = BotModelView(TelegramBot, db.session, endpoint='test_admin_bots')
+    queries = []
+    def count(*args):
+        queries.append(args)
+    
+    event.listen(db.engine, 'before_cursor_execute', count)
+    try:
+        total, bots = view.get_list(0, None, False, None, [])
+        owner_names = {bot.owner.username for bot in bots}
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count)
+    
+    assert total is None
+    assert len(bots) == 30
+    assert owner_names == {f'admin_list_owner_{i}' for i in range(5)}
+    # One list query: owners are joined and no COUNT(*) is issued
+    assert len(queries) == 1
+
+def test_bot_metrics_counters():
+    """Test bot counters drain to per-minute Redis buckets."""
+    from app.bot_framework.metrics import BotMetrics, flush_metrics
+    from app.bot_framework.keys import METRICS_PENDING, metrics_key
+    
+    metrics = BotMetrics()
+    metrics.incr('updates.message')
+    metrics.incr('updates.message')
+    metrics.observe_latency(12.5)
+    counters = metrics.drain()
+    assert counters == {'updates.message': 2, 'latency_ms.sum': 12.5, 'latency_ms.count': 1}
+    assert metrics.snapshot() == {}
+    
+    metrics.restore(counters)
+    assert metrics.snapshot() == counters
+    
+    client = MagicMock()
+    pipe = client.pipeline.return_value
+    flush_metrics(client, 'metrics_token', counters, now=1700000059)
+    key = metrics_key('metrics_token', 1700000040)
+    pipe.hincrbyfloat.assert_any_call(key, 'updates.message', 2)
+    pipe.zadd.assert_called_once_with(METRICS_PENDING, {key: 1700000040})
+
+def test_metrics_rollup_and_query(app):
+    """Test flushed minutes roll up into hour and day buckets."""
+    from app import metrics_store
+    from app.models import BotMetricBucket
+    
+    owner = User(username='metrics_owner')
+    owner.set_password('password')
+    db.session.add(owner)
+    db.session.flush()
+    bot = TelegramBot(bot_token='metrics_token', user_id=owner.id, bot_type='dice_mmo')
+    db.session.add(bot)
+    db.session.commit()
+    
+    minute = int(datetime(2024, 1, 1, 10, 5).timestamp() - datetime(1970, 1, 1).timestamp())
+    buckets = [
+        ('metrics:a', bot.token_fingerprint, minute),
+        ('metrics:b', bot.token_fingerprint, minute + 60),
+        ('metrics:c', 'deleted0fingerpr', minute)
+    ]
+    counters = [
+        {'commands.roll': 2, 'latency_ms.sum': 30, 'latency_ms.count': 2},
+        {'commands.roll': 1, 'errors': 1, 'latency_ms.sum': 10, 'latency_ms.count': 1},
+        {'commands.roll': 5}
+    ]
+    client = MagicMock()
+    with patch('app.metrics_store.closed_buckets', return_value=buckets), \
+         patch('app.metrics_store.read_buckets', return_value=counters), \
+         patch('app.metrics_store.delete_buckets') as delete:
+        stats = metrics_store.flush_pending(client)
+        # Flushing again adds to the existing rows
+        metrics_store.flush_pending(client)
+    
+    assert stats['buckets'] == 3 and stats['dropped'] == 1
+    delete.assert_called_with(client, ['metrics:a', 'metrics:b', 'metrics:c'])
+    hour = BotMetricBucket.query.filter_by(bot_id=bot.id, resolution='hour', metric='commands.roll').one()
+    assert hour.bucket_start == datetime(2024, 1, 1, 10) and hour.value == 6
+    assert BotMetricBucket.query.filter_by(resolution='minute', metric='commands.roll').count() == 2
+    
+    result = metrics_store.query_series(
+        bot.id, datetime(2024, 1, 1, 10), datetime(2024, 1, 1, 11), metrics=['commands', 'latency_ms.avg']
+    )
+    assert result['resolution'] == 'minute'
+    assert result['series']['commands.roll'] == [
+        ['2024-01-01T10:05:00', 4.0], ['2024-01-01T10:06:00', 2.0]
+    ]
+    assert result['series']['latency_ms.avg'][0] == ['2024-01-01T10:05:00', 15.0]
+    assert 'errors' not in result['series']
+    
+    assert metrics_store.query_series(bot.id, datetime(2024, 1, 1), datetime(2024, 3, 1))['resolution'] == 'hour'
+    with pytest.raises(ValueError):
+        metrics_store.query_series(bot.id, datetime(2023, 1, 1), datetime(2024, 1, 1), resolution='minute')
+    
+    totals = metrics_store.summarize(bot.id, since=datetime(2024, 1, 1))
+    assert totals['commands.roll'] == 6 and totals['latency_ms.avg'] == 13.33
+    
+    deleted = metrics_store.prune(now=datetime(2024, 1, 10))
+    assert deleted['minute'] > 0 and deleted['hour'] == 0
+
+def test_read_replica_routing(tmp_path):
+    """Test reads go to replicas and a user's writes pin them to the primary."""
+    from flask import session
+    from sqlalchemy import insert, text
+    from config import Config
+    from app.db_routing import STICKY_SESSION_KEY
+    
+    class ReplicaConfig(Config):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'primary.db'}"
+        SQLALCHEMY_REPLICA_URLS = [f"sqlite:///{tmp_path / 'replica.db'}"]
+    
+    app = create_app(ReplicaConfig)
+    with app.app_context():
+        db.create_all()
+        replica = db.engines['replica_0']
+        db.metadata.create_all(replica)
+        # Different rows on each database reveal where a query ran
+        with replica.begin() as conn:
+            conn.execute(insert(User).values(id=1, username='on_replica', password_hash='x'))
+        db.session.add(User(id=1, username='on_primary', password_hash='x'))
+        db.session.commit()
+        db.session.remove()
+        
+        # Outside requests everything uses the primary
+        assert db.session.get(User, 1).username == 'on_primary'
+        db.session.remove()
+        
+        with app.test_request_context():
+            assert db.session.get(User, 1).username == 'on_replica'
+            db.session.remove()
+            
+            user = User(username='writer', password_hash='x')
+            db.session.add(user)
+            db.session.flush()
+            # Reads after a write in the same transaction see it
+            assert User.query.filter_by(username='writer').count() == 1
+            db.session.commit()
+            assert session[STICKY_SESSION_KEY] > 0
+            db.session.remove()
+            
+            # Read-your-writes: the user stays on the primary for a while
+            assert User.query.filter_by(username='writer').count() == 1
+            session[STICKY_SESSION_KEY] = 0
+            db.session.remove()
+            assert User.query.filter_by(username='writer').count() == 0
+            
+            # Raw SQL may write, so it runs on the primary and pins the session
+            db.session.execute(text("UPDATE users SET username = 'renamed' WHERE username = 'writer'"))
+            db.session.commit()
+            assert session[STICKY_SESSION_KEY] > 0
+            assert User.query.filter_by(username='renamed').count() == 1
+            db.session.remove()
+        
+        db.session.remove()
+        db.drop_all(bind_key=None)
+    # init_app registered an empty metadata for the replica bind on the shared db
+    db.metadatas.pop('replica_0', None)
+
+def test_token_fingerprint(app):
+    """Test bots get a short fingerprint that follows their token."""
+    from app.bot_framework.keys import status_key, token_fingerprint
+    
+    bot = TelegramBot(bot_token='123456:fingerprint_token', user_id=1, bot_type='dice_mmo')
+    db.session.add(bot)
+    db.session.commit()
+    
+    assert bot.token_fingerprint == token_fingerprint('123456:fingerprint_token')
+    assert len(bot.token_fingerprint) == 16
+    assert status_key(bot.token_fingerprint) == f"bot:{bot.token_fingerprint}"
+    assert TelegramBot.query.filter_by(token_fingerprint=bot.token_fingerprint).one() is bot
+    
+    bot.bot_token = '123456:rotated_token'
+    db.session.commit()
+    assert bot.token_fingerprint == token_fingerprint('123456:rotated_token')
+    
+    # Rows created before the column existed are backfilled
+    db.session.execute(db.update(TelegramBot).values(token_fingerprint=None))
+    db.session.commit()
+    redis_client = MagicMock()
+    docker_client = MagicMock()
+    with patch('app.bot_framework.redis_client.get_redis', return_value=redis_client), \
+         patch('app.bot_framework.container_manager.get_redis', return_value=redis_client), \
+         patch('app.bot_framework.container_manager.docker.from_env', return_value=docker_client):
+        result = app.test_cli_runner().invoke(args=['backfill-fingerprints'])
+    
+    assert 'Backfilled 1 token fingerprints, removed 1 legacy containers' in result.output
+    db.session.refresh(bot)
+    assert bot.token_fingerprint == token_fingerprint('123456:rotated_token')
+    redis_client.pipeline.return_value.delete.assert_called_once_with('bot_alive:123456:rotated_token')
+    # The runner named after the raw token is replaced by a bot_<fingerprint> one
+    docker_client.containers.get.assert_called_once_with('bot_ed_token')
+    docker_client.containers.get.return_value.remove.assert_called_once_with(force=True)
+
+def test_state_store_write_behind(tmp_path):
+    """Test bot state is flushed in batches and survives a restart."""
+    import asyncio
+    from app.bot_framework.state import RedisStateBackend, SQLiteStateBackend, StateStore
+    
+    path = str(tmp_path / 'state.db')
+    store = StateStore(SQLiteStateBackend(path), flush_interval=60)
+    players = store.namespace('players', key_type=int)
+    store.load()
+    
+    players[1] = {'score': 3, 'last_roll': datetime(2024, 1, 1, 12)}
+    players[2] = {'score': 5}
+    players[1]['score'] += 4
+    players.touch(1)
+    assert store.dirty_count == 2
+    assert store.flush() == 2
+    assert store.dirty_count == 0
+    
+    del players[2]
+    backend = MagicMock(wraps=store.backend)
+    store.backend = backend
+    
+    async def stop():
+        store.start()
+        await store.stop()
+    asyncio.run(stop())
+    # Only the deleted key was written on shutdown
+    backend.write.assert_called_once_with('players', {}, ['2'])
+    
+    restarted = StateStore(SQLiteStateBackend(path))
+    restored = restarted.namespace('players', key_type=int)
+    restarted.load()
+    assert dict(restored) == {1: {'score': 7, 'last_roll': '2024-01-01T12:00:00'}}
+    
+    # Failed writes stay dirty for the next flush
+    client = MagicMock()
+    client.pipeline.return_value.execute.side_effect = ConnectionError('down')
+    store = StateStore(RedisStateBackend(client, 'abc'))
+    store.namespace('languages', key_type=int)[7] = 'es'
+    with pytest.raises(ConnectionError):
+        store.flush()
+    assert store.dirty_count == 1
+    client.pipeline.return_value.hset.assert_called_with('bot_state:abc:languages', mapping={'7': '"es"'})
+
+def test_leaderboard_windows():
+    """Test leaderboards rank members per window and roll over daily."""
+    import asyncio
+    from app.bot_framework.leaderboard import MemoryLeaderboard, window_period
+    
+    monday = datetime(2024, 1, 8, 12).timestamp() - datetime(1970, 1, 1).timestamp()
+    assert window_period('weekly', monday) == window_period('weekly', monday + 6 * 86400)
+    assert window_period('weekly', monday) != window_period('weekly', monday - 86400)
+    # Game days start at the reset hour
+    assert window_period('daily', monday, reset_hour=13) == window_period('daily', monday - 86400)
+    
+    async def play():
+        board = MemoryLeaderboard()
+        await board.add(1, 10, now=monday)
+        await board.add(2, 20, now=monday)
+        await board.add(3, 15, now=monday)
+        await board.add(1, 12, now=monday + 86400)
+        
+        assert await board.top('all', 2) == [(1, 22), (2, 20)]
+        assert await board.rank(3) == (3, 15)
+        assert await board.top('daily', now=monday + 86400) == [(1, 12)]
+        assert await board.size('weekly', now=monday + 86400) == 3
+        assert await board.rank(2, 'daily', now=monday + 86400) is None
+        
+        board.seed({4: 5, 5: 0})
+        assert await board.top('all') == [(4, 5)]
+    asyncio.run(play())
+
+def test_send_scheduler():
+    """Test delayed sends fire in order, cancel and survive a restart."""
+    import asyncio
+    from app.bot_framework.scheduler import SendScheduler
+    from app.bot_framework.state import MemoryStateBackend, StateStore
+    
+    backend = MemoryStateBackend()
+    sent = []
+    
+    async def send(method, kwargs):
+        sent.append((method, kwargs['text']))
+    
+    async def run():
+        store = StateStore(backend)
+        scheduler = SendScheduler(store.namespace('scheduled_sends'), send)
+        scheduler.start()
+        scheduler.schedule(0.05, 'send_message', chat_id=1, text='second')
+        scheduler.schedule(0.01, 'send_message', chat_id=1, text='first')
+        cancelled = scheduler.schedule(0.02, 'send_message', chat_id=1, text='cancelled')
+        assert scheduler.cancel(cancelled) is True
+        assert scheduler.cancel(cancelled) is False
+        scheduler.schedule(60, 'send_message', chat_id=1, text='after restart')
+        
+        await asyncio.sleep(0.1)
+        assert sent == [('send_message', 'first'), ('send_message', 'second')]
+        assert len(scheduler) == 1
+        await scheduler.stop()
+        store.flush()
+        
+        # A new process restores the pending send; overdue ones go out at once
+        restarted = StateStore(backend)
+        jobs = restarted.namespace('scheduled_sends')
+        restarted.load()
+        for job in jobs.values():
+            job['due'] -= 60
+        scheduler = SendScheduler(jobs, send, max_lateness=30)
+        scheduler.schedule(-3600, 'send_message', chat_id=1, text='too late')
+        scheduler.start()
+        await asyncio.sleep(0.01)
+        await scheduler.stop()
+        assert sent[-1] == ('send_message', 'after restart')
+        assert len(sent) == 3
+        assert len(scheduler) == 0
+    asyncio.run(run())
+
+def test_runner_stops_bot_on_sigterm():
+    """Test SIGTERM stops the runner's bot inside its event loop so state is flushed."""
+    import os
+    import signal
+    import asyncio
+    import importlib.util
+    from unittest.mock import AsyncMock
+    
+    # docker/ is not a package (and would shadow the docker SDK), so load the file
+    path = os.path.join(os.path.dirname(__file__), '..', 'docker', 'run_bot.py')
+    spec = importlib.util.spec_from_file_location('run_bot', path)
+    run_bot = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(run_bot)
+    
+    bot = MagicMock()
+    bot.start = AsyncMock()
+    bot.stop = AsyncMock()
+    bot.application.bot.set_webhook = AsyncMock()
+    env = {'BOT_TOKEN': '123:runner', 'BOT_TYPE': 'dice_mmo', 'WEBHOOK_HOST': 'example.com'}
+    with patch.dict(os.environ, env), patch.object(run_bot, 'get_redis'), \
+         patch.object(run_bot, 'StatusIndex'), patch.object(run_bot, 'HeartbeatSender') as heartbeat, \
+         patch.dict(run_bot.BOT_TYPES, {'dice_mmo': MagicMock(return_value=bot)}):
+        heartbeat.return_value.stop = AsyncMock()
+        runner = run_bot.BotRunner()
+        
+        async def run():
+            asyncio.get_running_loop().call_later(0.05, os.kill, os.getpid(), signal.SIGTERM)
+            await runner.start_bot()
+            asyncio.get_running_loop().remove_signal_handler(signal.SIGTERM)
+            asyncio.get_running_loop().remove_signal_handler(signal.SIGINT)
+        asyncio.run(run())
+    
+    bot.stop.assert_awaited_once()
+    assert runner.running is False
+    statuses = [call.args[1] for call in runner.status_index.transition.call_args_list]
+    assert statuses == ['starting', 'running', 'stopping', 'stopped']
@@ -5,7 +5,7 @@ Test suite for game bots.
 import pytest
 from datetime import datetime, timedelta
 from app.bots.number_converter_bot import NumberConverterBot
-from app.bots.dice_mmo_bot import DiceMMOBot
+from app.bots.dice_mmo_bot import DiceMMOBot, Player
 
 # Bot tokens
 NUMBER_BOT_TOKEN = "7710675546:AAHlgaVgGzkI7hrQsf7fjswLFCswWeaWtwE"
@@ -75,7 +75,9 @@ async def test_dice_mmo_bot():
         2: {"username": "Player2", "score": 20},
         3: {"username": "Player3", "score": 15}
     }
-    leaderboard = bot._get_leaderboard(limit=3)
+    for player_id, player in bot.players.items():
+        await bot.leaderboard.add(player_id, player["score"])
+    leaderboard = await bot._get_leaderboard(limit=3)
     assert len(leaderboard) == 3
     assert leaderboard[0][2] == 20  # Top score
     assert leaderboard[-1][2] == 10  # Lowest score
@@ -112,6 +114,92 @@ async def test_dice_mmo_daily_limits():
     can_roll, _ = bot._can_roll(user_id)
     assert can_roll is True
 
+@pytest.mark.asyncio
+async def test_dice_mmo_running_stats():
+    """Test DiceMMOBot incremental statistics."""
+    bot = DiceMMOBot(
+        token=DICE_MMO_TOKEN,
+        config={'max_daily_rolls': 2}
+    )
+
+    # Rolls update the totals without scanning players
+    for user_id, value in [(1, 4), (1, 6), (2, 3)]:
+        bot._record_roll(user_id, bot._get_player_data(user_id), value)
+    assert bot.stats['total_players'] == 2
+    assert bot.stats['total_score'] == 13
+    assert bot._active_today() == 2
+    assert bot._can_roll(1)[0] is False
+    assert bot._can_roll(2)[0] is True
+
+    # Yesterday's rolls expire without touching the player
+    player = bot._get_player_data(3)
+    player['rolls_today'] = 2
+    player['last_roll'] = datetime.utcnow() - timedelta(days=1)
+    assert bot._rolls_today(player, bot._today()) == 0
+    assert bot._can_roll(3)[0] is True
+    bot._record_roll(3, player, 5)
+    assert player['rolls_today'] == 1
+    assert bot._active_today() == 3
+
+    # Replacing all players rebuilds the totals
+    bot.players = {
+        1: {"username": "Player1", "score": 10, "rolls_today": 1, "last_roll": datetime.utcnow()},
+        2: {"username": "Player2", "score": 20, "rolls_today": 1, "last_roll": None}
+    }
+    assert bot.stats['total_players'] == 2
+    assert bot.stats['total_score'] == 30
+    assert bot._active_today() == 1
+
+@pytest.mark.asyncio
+async def test_dice_mmo_redis_leaderboard_seeded():
+    """Test players saved before the Redis leaderboard existed are ranked on load."""
+    fakeredis = pytest.importorskip('fakeredis')
+    from app.bot_framework.leaderboard import RedisLeaderboard
+
+    bot = DiceMMOBot(token=DICE_MMO_TOKEN)
+    client = fakeredis.aioredis.FakeRedis()
+    bot.leaderboard = RedisLeaderboard(client, 'upgrade')
+    bot.players = {
+        1: {"username": "Player1", "score": 40},
+        2: {"username": "Player2", "score": 25},
+        3: {"username": "Player3", "score": 0}
+    }
+    # Player 2 rolled after the deploy, before this restart
+    await bot.leaderboard.add(2, 5)
+
+    await bot.on_state_loaded()
+    assert await bot.leaderboard.top('all') == [(1, 40.0), (2, 25.0)]
+    assert await bot.leaderboard.rank(2) == (2, 25.0)
+
+    # Scores ahead of the saved state are kept, and seeding again changes nothing
+    await bot.leaderboard.add(1, 6)
+    await bot.on_state_loaded()
+    assert await bot.leaderboard.rank(1) == (1, 46.0)
+    assert await bot.leaderboard.size() == 2
+    await client.aclose()
+
+def test_dice_mmo_player_records():
+    """Test compact DiceMMOBot player records."""
+    last_roll = datetime(2024, 5, 1, 12, 30)
+    player = Player(score=7, rolls_today=2, last_roll=last_roll, username="alice")
+
+    # Dict-style access is kept
+    assert player['score'] == 7
+    assert player['last_roll'] == last_roll
+    player['score'] += 3
+    assert player.score == 10
+    assert dict(player) == {"score": 10, "rolls_today": 2, "last_roll": last_roll, "username": "alice"}
+    with pytest.raises(KeyError):
+        player['level'] = 1
+
+    # Records round-trip, and the old dict format still decodes
+    decoded = Player.decode(player.encode())
+    assert dict(decoded) == dict(player)
+    legacy = Player.decode('{"score": 4, "rolls_today": 1, "last_roll": "2024-05-01T12:30:00", "username": null}')
+    assert legacy.score == 4
+    assert legacy.last_roll == last_roll
+    assert legacy.username is None
+
 @pytest.mark.asyncio
 async def test_number_converter_languages():
     """Test NumberConverterBot language support."""
@@ -133,5 +221,33 @@ async def test_number_converter_languages():
     bot.user_languages[user_id] = 'invalid'
     assert bot.get_user_language(user_id) == 'invalid'  # Raw value returned
 
+@pytest.mark.asyncio
+async def test_number_converter_cache():
+    """Test NumberConverterBot conversion caching."""
+    bot = NumberConverterBot(
+        token=NUMBER_BOT_TOKEN,
+        config={'conversion_cache_size': 12}
+    )
+    
+    # Warm-up is bounded so languages do not evict each other
+    assert bot.warm_up(10) == 2 * len(bot.SUPPORTED_LANGUAGES)
+    assert bot.to_words(1.0, 'es') == 'uno'
+    assert bot.words_cache.stats()['hits'] == 1
+    
+    # Misses are converted once and then served from the cache
+    assert bot.to_words(42.0, 'en') == 'forty-two'
+    assert bot.to_words(42.0, 'en') == 'forty-two'
+    assert bot.to_words(42.0, 'de') != 'forty-two'
+    stats = bot.cache_stats()['words']
+    assert (stats['hits'], stats['misses']) == (2, 2)
+    assert stats['size'] == 12
+    
+    # Word input is normalized before lookup
+    assert bot.to_number('Forty  Two') == 42
+    assert bot.to_number('forty two') == 42
+    assert bot.cache_stats()['numbers']['hits'] == 1
+    with pytest.raises(ValueError):
+        bot.to_number('not a number')
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
\ No newline at end of file